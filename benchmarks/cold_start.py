@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark: time from a fresh interpreter to a server that can answer list_tools,
+and to the first completed tool call, for eager vs manifest-driven (lazy) tool loading.
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --importtime   # also list the slowest imports of each mode
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter; prints timings (ms since interpreter start of the probe) as JSON
+PROBE = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+from utils.server import myserver
+t_import = time.perf_counter()
+tools = asyncio.run(myserver.list_tools())
+t_list = time.perf_counter()
+asyncio.run(myserver.call_tool("get_behavior_ids", {}))
+t_call = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "list_tools_ms": (t_list - t0) * 1000,
+    "first_call_ms": (t_call - t0) * 1000,
+    "tools": len(tools),
+    "modules_loaded": len(sys.modules),
+}))
+"""
+
+
+def run_probe(mode: str) -> dict:
+    env = {**os.environ, "TOOL_LOADING": mode, "LOG_LEVEL": "WARNING", "PYTHONDONTWRITEBYTECODE": "0"}
+    started = subprocess.run([sys.executable, "-c", PROBE], cwd=REPO_ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+    return json.loads(started.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(mode: str, top: int) -> list[tuple[int, str]]:
+    env = {**os.environ, "TOOL_LOADING": mode, "LOG_LEVEL": "WARNING"}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=REPO_ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if not name.startswith("    "):  # top-level imports only (nesting is indented)
+                rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold-start time for eager vs lazy tool loading")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    run_probe("eager")  # warm the bytecode cache so both modes are measured the same way
+    print(f"{'mode':8} {'import ms':>10} {'list_tools ms':>14} {'first call ms':>14} {'modules':>8}")
+    for mode in ("eager", "lazy"):
+        samples = [run_probe(mode) for _ in range(args.runs)]
+        median = {k: statistics.median(s[k] for s in samples)
+                  for k in ("import_ms", "list_tools_ms", "first_call_ms", "modules_loaded")}
+        print(f"{mode:8} {median['import_ms']:>10.1f} {median['list_tools_ms']:>14.1f} "
+              f"{median['first_call_ms']:>14.1f} {int(median['modules_loaded']):>8}")
+    if args.importtime:
+        for mode in ("eager", "lazy"):
+            print(f"\nslowest top-level imports ({mode}, cumulative us):")
+            for cumulative, name in slowest_imports(mode, 10):
+                print(f"  {cumulative:>9}  {name}")
+
+
+if __name__ == "__main__":
+    main()
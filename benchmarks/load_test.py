@@ -0,0 +1,175 @@
+"""
+Offline load test: mock Graph API + the real MCP server over streamable-http + concurrent MCP clients.
+
+    python -m benchmarks.load_test --clients 20 --calls 25 --latency-ms 80
+    python -m benchmarks.load_test --tools get_facebook_campaigns,fetch_ad_sets --json bench_output.json
+
+Reports throughput and p50/p95/p99 latency per tool, so performance changes can be compared run to run
+(keep --seed and the mock settings fixed between the runs you compare).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+from benchmarks.mock_graph import add_config_arguments, config_from_arguments, start_mock_graph
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Tool name -> arguments, resolved against the deterministic mock data
+DEFAULT_SCENARIOS = {
+    "get_facebook_ad_accounts": {},
+    "get_facebook_business_accounts": {},
+    "get_facebook_campaigns": {"ad_account_id": "act_100000"},
+    "fetch_ad_sets": {"ad_account_id": "act_100000", "campaign_id": ""},
+    "get_facebook_ads": {"ad_account_id": "act_100001"},
+    "get_facebook_catalogs": {"business_account_id": "900000"},
+    "fetch_products_from_catalog": {"catalog_id": "700000"},
+    "search_interests": {"query": "cotton"},
+    "get_behavior_ids": {},
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def start_server(graph_url: str, port: int, extra_env: dict | None = None) -> subprocess.Popen:
+    env = {**os.environ, "FB_BASE_URL": graph_url, "FB_ACCESS_TOKEN": "bench-token", "PORT": str(port),
+           "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"), **(extra_env or {})}
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"MCP server exited during startup with code {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("MCP server did not start listening within 30s")
+
+
+async def run_client(url: str, scenarios: dict, calls: int, rng: random.Random,
+                     latencies: dict, errors: dict) -> None:
+    """One simulated MCP client: its own session, `calls` tool calls drawn from the scenario mix."""
+    names = list(scenarios)
+    async with streamablehttp_client(url, timeout=120) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for _ in range(calls):
+                name = rng.choice(names)
+                started = time.perf_counter()
+                try:
+                    result = await session.call_tool(name, scenarios[name])
+                    if result.isError:
+                        errors[name] += 1
+                except Exception:
+                    errors[name] += 1
+                latencies[name].append((time.perf_counter() - started) * 1000)
+
+
+async def run_load(url: str, scenarios: dict, clients: int, calls: int, seed: int) -> dict:
+    latencies: dict = defaultdict(list)
+    errors: dict = defaultdict(int)
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(url, scenarios, calls, random.Random(seed + i), latencies, errors)
+                           for i in range(clients)))
+    wall = time.perf_counter() - started
+    report = {"wall_seconds": round(wall, 3), "total_calls": sum(len(v) for v in latencies.values()),
+              "throughput_per_s": 0.0, "tools": {}}
+    report["throughput_per_s"] = round(report["total_calls"] / wall, 2) if wall else 0.0
+    for name in sorted(latencies):
+        samples = latencies[name]
+        report["tools"][name] = {
+            "calls": len(samples),
+            "errors": errors[name],
+            "throughput_per_s": round(len(samples) / wall, 2),
+            "mean_ms": round(statistics.fmean(samples), 2),
+            "p50_ms": round(percentile(samples, 50), 2),
+            "p95_ms": round(percentile(samples, 95), 2),
+            "p99_ms": round(percentile(samples, 99), 2),
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{report['total_calls']} calls in {report['wall_seconds']}s -> {report['throughput_per_s']} calls/s\n")
+    header = f"{'tool':34} {'calls':>6} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report["tools"].items():
+        print(f"{name:34} {row['calls']:>6} {row['errors']:>5} {row['throughput_per_s']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the MCP server against a local mock Graph API")
+    parser.add_argument("--clients", type=int, default=10, help="concurrent MCP client sessions")
+    parser.add_argument("--calls", type=int, default=20, help="tool calls per client")
+    parser.add_argument("--tools", default="", help="comma separated subset of the default scenario tools")
+    parser.add_argument("--server-url", default="",
+                        help="benchmark an already running server (its FB_BASE_URL must point at "
+                             "`python -m benchmarks.mock_graph`)")
+    parser.add_argument("--json", default="", help="also write the report as JSON to this path")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = DEFAULT_SCENARIOS
+    if args.tools:
+        wanted = [t.strip() for t in args.tools.split(",") if t.strip()]
+        unknown = [t for t in wanted if t not in DEFAULT_SCENARIOS]
+        if unknown:
+            parser.error(f"no scenario for: {', '.join(unknown)}")
+        scenarios = {t: DEFAULT_SCENARIOS[t] for t in wanted}
+
+    # A running server talks to its own mock Graph, so a local one would only report zero requests
+    mock = server = None
+    try:
+        url = args.server_url
+        if not url:
+            mock = start_mock_graph(config_from_arguments(args))
+            graph_url = f"http://127.0.0.1:{mock.server_address[1]}/v19.0/"
+            port = _free_port()
+            server = start_server(graph_url, port)
+            url = f"http://127.0.0.1:{port}/mcp"
+        report = asyncio.run(run_load(url, scenarios, args.clients, args.calls, args.seed))
+        if mock is not None:
+            report["mock"] = {"graph_url": graph_url, "requests": dict(mock.counters)}  # type: ignore[attr-defined]
+        print_report(report)
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=2))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if mock is not None:
+            mock.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""
+Local stand-in for the Facebook Graph API, used by the load-testing harness.
+
+Run it on its own with:
+    python -m benchmarks.mock_graph --port 8765 --latency-ms 80 --error-rate 0.01
+
+then point the server at it with FB_BASE_URL=http://127.0.0.1:8765/v19.0/
+"""
+import argparse
+import base64
+import calendar
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 50.0         # mean latency added to every response
+    jitter_ms: float = 20.0          # uniform +/- jitter around the mean
+    page_size: int = 100             # default page size when the caller does not send `limit`
+    ad_accounts: int = 5
+    campaigns_per_account: int = 40
+    adsets_per_account: int = 120
+    ads_per_account: int = 300
+    products_per_catalog: int = 2000
+    video_chunk_bytes: int = 1 << 20 # window size handed out by the resumable video upload
+    error_rate: float = 0.0          # fraction of requests answered with a transient 500
+    rate_limit_rate: float = 0.0     # fraction of requests answered with a 429-style throttle error
+    call_count_pct: int = 10         # value reported in the usage headers
+    seed: int = 1234
+
+
+def _targeting(rng: random.Random) -> dict:
+    """A realistically heavy targeting spec (the kind `fetch_ad_sets` returns in full)."""
+    return {
+        "geo_locations": {"countries": rng.sample(["US", "GB", "DE", "FR", "IT", "ES", "NL", "SE", "PL", "CA"], 4),
+                          "location_types": ["home", "recent"]},
+        "age_min": 18,
+        "age_max": 65,
+        "flexible_spec": [{
+            "interests": [{"id": str(6000000000000 + rng.randint(0, 10 ** 9)), "name": f"Interest {i}"}
+                          for i in range(rng.randint(5, 25))],
+            "behaviors": [{"id": str(6002714895372 + i), "name": f"Behavior {i}"} for i in range(rng.randint(0, 6))],
+        }],
+        "targeting_automation": {"advantage_audience": 0},
+    }
+
+
+# `updated_time` of every generated campaign and ad set; bump it to simulate edits
+UPDATED_TIME = "2024-01-01T00:00:00+0000"
+
+
+def _filtered(items: list, filtering: str | None) -> list:
+    """Graph `filtering` on listing edges: campaign.id / effective_status IN, updated_time GREATER_THAN.
+    Deleted objects are only listed when effective_status asks for them, like the real API."""
+    rules = json.loads(filtering) if filtering else []
+    if not any(r["field"] == "effective_status" for r in rules):
+        items = [i for i in items if i.get("status") != "DELETED"]
+    for rule in rules:
+        if rule["field"] == "campaign.id":
+            items = [i for i in items if i.get("campaign_id") in rule["value"]]
+        elif rule["field"] == "effective_status":
+            items = [i for i in items if i.get("status") in rule["value"]]
+        elif rule["field"] == "updated_time":
+            items = [i for i in items if calendar.timegm(time.strptime(i["updated_time"][:19], "%Y-%m-%dT%H:%M:%S"))
+                     > int(rule["value"])]
+    return items
+
+
+def _product_matches(product: dict, rule: dict) -> bool:
+    """Graph product `filter` rules: and/or, name i_contains, availability eq, price (minor units) lt/lte/gt/gte."""
+    if "and" in rule:
+        return all(_product_matches(product, r) for r in rule["and"])
+    if "or" in rule:
+        return any(_product_matches(product, r) for r in rule["or"])
+    (field, condition), = rule.items()
+    (operator, wanted), = condition.items()
+    value = product.get(field)
+    if field == "price":
+        value = round(float(value.strip("$")) * 100)
+    return {"eq": lambda: value == wanted, "neq": lambda: value != wanted,
+            "i_contains": lambda: str(wanted).lower() in str(value).lower(),
+            "lt": lambda: value < wanted, "lte": lambda: value <= wanted,
+            "gt": lambda: value > wanted, "gte": lambda: value >= wanted}[operator]()
+
+
+class GraphData:
+    """Deterministic synthetic Graph objects, generated once per server."""
+
+    def __init__(self, config: MockConfig):
+        rng = random.Random(config.seed)
+        self.businesses = [{"id": f"{900000 + b}", "name": f"Business {b}"} for b in range(2)]
+        self.pages = [{"id": f"{800000 + p}", "name": f"Page {p}"} for p in range(3)]
+        self.ad_accounts = [{"id": f"act_{100000 + a}", "name": f"Ad Account {a}"} for a in range(config.ad_accounts)]
+        self.catalogs = {b["id"]: [{"id": f"{700000 + int(b['id']) % 10 * 10 + c}", "name": f"Catalog {c}"} for c in range(2)]
+                         for b in self.businesses}
+        self.campaigns, self.adsets, self.ads, self.creatives = {}, {}, {}, {}
+        for acc in self.ad_accounts:
+            act = acc["id"]
+            self.campaigns[act] = [{"id": f"{act[4:]}{c:04d}", "name": f"Campaign {c}",
+                                    "status": rng.choice(["ACTIVE", "PAUSED"]), "updated_time": UPDATED_TIME,
+                                    "objective": rng.choice(["OUTCOME_SALES", "OUTCOME_TRAFFIC", "OUTCOME_LEADS"])}
+                                   for c in range(config.campaigns_per_account)]
+            self.adsets[act] = [{"id": f"{act[4:]}5{s:04d}", "name": f"Ad Set {s}", "daily_budget": "1000",
+                                 "billing_event": "IMPRESSIONS", "optimization_goal": "REACH",
+                                 "bid_strategy": "LOWEST_COST_WITHOUT_CAP", "status": "PAUSED", "updated_time": UPDATED_TIME,
+                                 "campaign_id": rng.choice(self.campaigns[act])["id"], "targeting": _targeting(rng)}
+                                for s in range(config.adsets_per_account)]
+            self.ads[act] = [{"id": f"{act[4:]}6{d:05d}", "name": f"Ad {d}", "status": "PAUSED",
+                              "adset_id": rng.choice(self.adsets[act])["id"],
+                              "campaign_id": rng.choice(self.campaigns[act])["id"],
+                              "creative": {"id": f"{act[4:]}7{d % 50:04d}"}}
+                             for d in range(config.ads_per_account)]
+            self.creatives[act] = [{"id": f"{act[4:]}7{c:04d}", "name": f"Creative {c}",
+                                    "object_story_spec": {"page_id": self.pages[0]["id"],
+                                                          "link_data": {"message": "Lorem ipsum " * 10,
+                                                                        "link": "https://example.com"}}}
+                                   for c in range(50)]
+        words = ["organic", "cotton", "shirt", "summer", "linen", "dress", "leather", "bag", "running", "shoe"]
+        self.products = {}
+        for catalogs in self.catalogs.values():
+            for cat in catalogs:
+                self.products[cat["id"]] = [{
+                    "id": f"{cat['id']}{p:06d}",
+                    "name": " ".join(rng.sample(words, 3)).title(),
+                    "description": " ".join(rng.choice(words) for _ in range(rng.randint(20, 80))),
+                    "price": f"${rng.randint(100, 20000) / 100:.2f}",
+                    "image_url": f"https://cdn.example.com/img/{cat['id']}/{p}.jpg",
+                    "url": f"https://shop.example.com/p/{p}",
+                    "availability": rng.choice(["in stock", "in stock", "out of stock"]),
+                } for p in range(config.products_per_catalog)]
+        self.interests = [{"id": str(6003000000000 + i), "name": f"{w.title()} {i}", "audience_size": rng.randint(10 ** 5, 10 ** 8)}
+                          for i, w in enumerate(words * 5)]
+        # Campaign / ad set ID -> (ad account, edge name, object), for node reads and /copies
+        self.objects = {}
+        for act in self.campaigns:
+            for edge in ("campaigns", "adsets"):
+                for obj in getattr(self, edge)[act]:
+                    self.objects[obj["id"]] = (act, edge, obj)
+
+    def children(self, object_id: str, edge: str) -> list:
+        act, kind, _ = self.objects[object_id]
+        key = "campaign_id" if kind == "campaigns" else "adset_id"
+        return [o for o in getattr(self, edge)[act] if o.get(key) == object_id]
+
+
+class MockGraphHandler(BaseHTTPRequestHandler):
+    server_version = "MockGraph/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # Set on the server instance: config, data, counters
+    @property
+    def config(self) -> MockConfig:
+        return self.server.config  # type: ignore[attr-defined]
+
+    @property
+    def data(self) -> GraphData:
+        return self.server.data  # type: ignore[attr-defined]
+
+    def log_message(self, format, *args):  # keep benchmark output clean
+        pass
+
+    # --- plumbing ---
+    def _usage_headers(self) -> dict:
+        pct = self.config.call_count_pct
+        return {
+            "x-app-usage": json.dumps({"call_count": pct, "total_cputime": pct // 2, "total_time": pct // 2}),
+            "x-business-use-case-usage": json.dumps({"0": [{"type": "ads_management", "call_count": pct,
+                                                            "total_cputime": 1, "total_time": 1,
+                                                            "estimated_time_to_regain_access": 0}]}),
+        }
+
+    def _send(self, status: int, body, extra_headers: dict | None = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in {**self._usage_headers(), **(extra_headers or {})}.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _delay(self) -> None:
+        cfg = self.config
+        delay = cfg.latency_ms + random.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _fault(self) -> bool:
+        """Inject configured transient errors. Returns True when a fault was sent."""
+        roll = random.random()
+        if roll < self.config.error_rate:
+            self._send(500, {"error": {"message": "An unexpected error has occurred.", "type": "OAuthException",
+                                       "code": 2, "is_transient": True}})
+            return True
+        if roll < self.config.error_rate + self.config.rate_limit_rate:
+            self._send(400, {"error": {"message": "User request limit reached", "type": "OAuthException",
+                                       "code": 17}}, {"Retry-After": "1"})
+            return True
+        return False
+
+    def _parts(self):
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        if parts and parts[0].startswith("v") and parts[0][1:].replace(".", "").isdigit():
+            parts = parts[1:]  # drop the API version prefix
+        return parts, {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+    def _read_form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type") or ""
+        if "json" in content_type:
+            return json.loads(raw or "{}")
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + raw)
+            return {part.get_param("name", header="content-disposition"):
+                    part.get_payload(decode=True) if part.get_filename() else part.get_payload(decode=True).decode()
+                    for part in message.get_payload()}
+        return {k: v[-1] for k, v in parse_qs(raw.decode()).items()}
+
+    def _copy(self, object_id: str, deep: bool = True) -> dict:
+        """Answer of `/{id}/copies`: new IDs for the object and (deep copy) its children."""
+        _, kind, _ = self.data.objects[object_id]
+        copied = [(kind[:-1], object_id)]
+        for edge in (("adsets", "ads") if kind == "campaigns" else ("ads",)) if deep else ():
+            copied += [(edge[:-1], child["id"]) for child in self.data.children(object_id, edge)]
+        ids = [{"ad_object_type": t, "source_id": src, "copied_id": str(random.randint(10 ** 14, 10 ** 15))}
+               for t, src in copied]
+        return {f"copied_{copied[0][0]}_id": ids[0]["copied_id"], "ad_object_ids": ids}
+
+    def _video_phase(self, account: str, form: dict) -> tuple[int, dict]:
+        """Resumable upload protocol of `advideos`: start / transfer / finish."""
+        chunk = self.config.video_chunk_bytes
+        uploads = self.server.videos  # type: ignore[attr-defined]
+        phase = form.get("upload_phase")
+        if phase == "start":
+            session = str(random.randint(10 ** 14, 10 ** 15))
+            size = int(form["file_size"])
+            uploads[session] = {"size": size, "received": {}, "video_id": str(random.randint(10 ** 14, 10 ** 15))}
+            return 200, {"upload_session_id": session, "video_id": uploads[session]["video_id"],
+                         "start_offset": "0", "end_offset": str(min(chunk, size))}
+        upload = uploads.get(form.get("upload_session_id"))
+        if upload is None:
+            return 400, {"error": {"message": "Invalid upload session", "type": "OAuthException", "code": 100}}
+        if phase == "transfer":
+            start = int(form["start_offset"])
+            upload["received"][start] = len(form["video_file_chunk"])
+            received = sum(upload["received"].values())
+            return 200, {"start_offset": str(received), "end_offset": str(min(received + chunk, upload["size"]))}
+        if phase == "finish":
+            complete = sum(upload["received"].values()) == upload["size"]
+            return (200, {"success": True}) if complete else \
+                (400, {"error": {"message": "Upload incomplete", "type": "OAuthException", "code": 6001}})
+        return 400, {"error": {"message": f"Unknown upload_phase {phase}", "type": "OAuthException", "code": 100}}
+
+    def _page(self, items: list, query: dict) -> dict:
+        """Cursor-style paging with an absolute `paging.next` URL, like the real Graph API."""
+        limit = int(query.get("limit", self.config.page_size))
+        offset = int(query.get("after", 0))
+        chunk = items[offset:offset + limit]
+        body = {"data": chunk}
+        if query.get("summary") == "true":
+            body["summary"] = {"total_count": len(items)}
+        if offset + limit < len(items):
+            next_query = {**query, "after": str(offset + limit), "limit": str(limit)}
+            host = self.headers.get("Host")
+            body["paging"] = {"cursors": {"before": str(offset), "after": str(offset + limit)},
+                              "next": f"http://{host}{urlparse(self.path).path}?{urlencode(next_query)}"}
+        return body
+
+    # --- routing ---
+    def _route_get(self, parts: list, query: dict):
+        d = self.data
+        if not parts and "ids" in query:
+            products = {p["id"]: p for items in d.products.values() for p in items}
+            return 200, {i: products[i] for i in query["ids"].split(",") if i in products}
+        if parts == ["me", "adaccounts"]:
+            return 200, self._page(d.ad_accounts, query)
+        if parts == ["me", "businesses"]:
+            return 200, self._page(d.businesses, query)
+        if parts == ["me", "accounts"]:
+            return 200, self._page(d.pages, query)
+        if parts == ["search"]:
+            q = query.get("q", "").lower()
+            matches = [i for i in d.interests if q in i["name"].lower()] or d.interests
+            return 200, {"data": matches[:int(query.get("limit", 25))]}
+        if len(parts) == 2:
+            node, edge = parts
+            if edge == "campaigns" and node in d.campaigns:
+                return 200, self._page(_filtered(d.campaigns[node], query.get("filtering")), query)
+            if edge == "adsets" and node in d.adsets:
+                return 200, self._page(_filtered(d.adsets[node], query.get("filtering")), query)
+            if edge == "ads" and node in d.ads:
+                return 200, self._page(_filtered(d.ads[node], query.get("filtering")), query)
+            if edge == "adcreatives" and node in d.creatives:
+                return 200, self._page(d.creatives[node], query)
+            if edge == "owned_product_catalogs" and node in d.catalogs:
+                return 200, self._page(d.catalogs[node], query)
+            if edge == "products" and node in d.products:
+                items = d.products[node]
+                if "filter" in query:
+                    items = [p for p in items if _product_matches(p, json.loads(query["filter"]))]
+                return 200, self._page(items, query)
+            if edge == "adimages":
+                wanted = set(json.loads(query.get("hashes", "[]")))
+                stored = self.server.images.get(node, set())  # type: ignore[attr-defined]
+                return 200, {"data": [{"hash": h} for h in sorted(stored & wanted if wanted else stored)]}
+            if edge == "paymentmethods":
+                return 200, {"data": [{"id": "pm_1"}]}
+            if edge in ("delivery_estimate", "reachestimate"):
+                return 200, {"data": [{"estimate_mau_lower_bound": 120000, "estimate_mau_upper_bound": 150000,
+                                       "estimate_ready": True}]}
+        if len(parts) == 2 and parts[1] == "requests" and parts[0] in self.server.async_sets:  # type: ignore[attr-defined]
+            return 200, {"data": self.server.async_sets[parts[0]]["requests"]}  # type: ignore[attr-defined]
+        if len(parts) == 1 and parts[0] in self.server.async_sets:  # type: ignore[attr-defined]
+            job = self.server.async_sets[parts[0]]  # type: ignore[attr-defined]
+            job["polls"] += 1
+            done = job["polls"] >= 2  # completes on the second poll
+            total = len(job["requests"])
+            return 200, {"id": parts[0], "name": job["name"], "is_completed": done, "total_count": total,
+                         "success_count": total if done else 0, "error_count": 0,
+                         "in_progress_count": 0 if done else total, "initial_count": 0}
+        if len(parts) == 1 and parts[0] in d.objects:
+            act, kind, obj = d.objects[parts[0]]
+            body = {**obj, "account_id": act[4:]}
+            for edge in ("adsets", "ads"):
+                if f"{edge}.limit(0).summary(true)" in query.get("fields", ""):
+                    body[edge] = {"data": [], "summary": {"total_count": len(d.children(parts[0], edge))}}
+            return 200, body
+        if len(parts) == 1:
+            return 200, {"id": parts[0], "currency": "USD", "name": f"Object {parts[0]}"}
+        return 404, {"error": {"message": f"Unknown path {'/'.join(parts)}", "type": "GraphMethodException", "code": 100}}
+
+    def do_GET(self):
+        self.server.counters["GET"] += 1  # type: ignore[attr-defined]
+        self._delay()
+        if self._fault():
+            return
+        parts, query = self._parts()
+        status, body = self._route_get(parts, query)
+        if status != 200:
+            self._send(status, body)
+            return
+        # ETag / If-None-Match like the Graph API: an unchanged object costs an empty 304
+        etag = '"' + hashlib.md5(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.counters["304"] += 1  # type: ignore[attr-defined]
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            for k, v in self._usage_headers().items():
+                self.send_header(k, v)
+            self.end_headers()
+            return
+        self._send(status, body, {"ETag": etag})
+
+    def do_POST(self):
+        self.server.counters["POST"] += 1  # type: ignore[attr-defined]
+        form = self._read_form()
+        self._delay()
+        if self._fault():
+            return
+        parts, _ = self._parts()
+        if not parts and "batch" in form:
+            # Batch API: answer every sub-request in one round trip
+            batch = json.loads(form["batch"]) if isinstance(form["batch"], str) else form["batch"]
+            answers = []
+            for item in batch:
+                sub_parts = [p for p in urlparse(item.get("relative_url", "")).path.split("/") if p]
+                sub_query = {k: v[-1] for k, v in parse_qs(urlparse(item.get("relative_url", "")).query).items()}
+                if item.get("method", "GET").upper() == "GET":
+                    status, body = self._route_get(sub_parts, sub_query)
+                else:
+                    status, body = 200, {"id": str(random.randint(10 ** 14, 10 ** 15))}
+                answers.append({"code": status, "headers": [], "body": json.dumps(body)})
+            self._send(200, answers)
+            return
+        if len(parts) == 2 and parts[1] == "copies" and parts[0] in self.data.objects:
+            self._send(200, self._copy(parts[0], form.get("deep_copy") == "true"))
+            return
+        if len(parts) == 2 and parts[1] == "async_batch_requests":
+            set_id = str(random.randint(10 ** 14, 10 ** 15))
+            requests_ = []
+            for item in json.loads(form["adbatch"]):
+                source = item["relative_url"].split("/")[0]
+                body = {k: v[-1] for k, v in parse_qs(item.get("body", "")).items()}
+                result = self._copy(source, body.get("deep_copy") == "true") if source in self.data.objects \
+                    else {"error": "unknown object"}
+                requests_.append({"id": str(random.randint(10 ** 14, 10 ** 15)), "status": "SUCCESS",
+                                  "result": json.dumps(result)})
+            self.server.async_sets[set_id] = {"name": form.get("name"), "polls": 0,  # type: ignore[attr-defined]
+                                              "requests": requests_}
+            self._send(200, {"id": set_id})
+            return
+        if len(parts) == 2 and parts[1] == "advideos" and "upload_phase" in form:
+            self._send(*self._video_phase(parts[0], form))
+            return
+        if len(parts) == 2 and parts[1] == "adimages" and "bytes" in form:
+            image_hash = hashlib.md5(base64.b64decode(form["bytes"])).hexdigest()
+            self.server.images.setdefault(parts[0], set()).add(image_hash)  # type: ignore[attr-defined]
+            self._send(200, {"images": {"bytes": {"hash": image_hash, "url": f"https://cdn.example.com/{image_hash}.jpg"}}})
+            return
+        self._send(200, {"id": str(random.randint(10 ** 14, 10 ** 15)), "success": True})
+
+    def do_DELETE(self):
+        self.server.counters["DELETE"] += 1  # type: ignore[attr-defined]
+        self._delay()
+        if self._fault():
+            return
+        self._send(200, {"success": True})
+
+
+def start_mock_graph(config: MockConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the mock server on a background thread and return it (`server.server_address` has the port)."""
+    config = config or MockConfig()
+    server = ThreadingHTTPServer((host, port), MockGraphHandler)
+    server.daemon_threads = True
+    server.config = config  # type: ignore[attr-defined]
+    server.data = GraphData(config)  # type: ignore[attr-defined]
+    server.counters = {"GET": 0, "POST": 0, "DELETE": 0, "304": 0}  # type: ignore[attr-defined]
+    server.images = {}  # type: ignore[attr-defined]  # ad account -> uploaded image hashes
+    server.videos = {}  # type: ignore[attr-defined]  # upload session -> resumable video upload
+    server.async_sets = {}  # type: ignore[attr-defined]  # async batch request set -> copy results
+    threading.Thread(target=server.serve_forever, name="mock-graph", daemon=True).start()
+    return server
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--page-size", type=int, default=defaults.page_size)
+    parser.add_argument("--products", type=int, default=defaults.products_per_catalog)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_arguments(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, page_size=args.page_size,
+                      products_per_catalog=args.products, error_rate=args.error_rate,
+                      rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock Graph API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    srv = start_mock_graph(config_from_arguments(args), args.host, args.port)
+    print(f"Mock Graph API listening on http://{args.host}:{srv.server_address[1]}/v19.0/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
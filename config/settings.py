@@ -4,9 +4,195 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPEN_WEATHER_KEY=os.getenv("OPEN_WEATHER_KEY")
+OPEN_WEATHER_BASE_URL = os.getenv("OPEN_WEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5/")
+# Parallel OpenWeather calls per multi-city lookup
+WEATHER_CONCURRENCY = int(os.getenv("WEATHER_CONCURRENCY", "8"))
 
 ## facebook setup
 fb_access_token = os.getenv("FB_ACCESS_TOKEN")
 fb_base_url = os.getenv("FB_BASE_URL")
 
-SERVER_NAME = "myserver"
\ No newline at end of file
+SERVER_NAME = "myserver"
+
+## logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of tool calls whose DEBUG/INFO records are emitted (warnings and errors are always kept)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Longer strings and bigger containers are summarised instead of being written out in full
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "500"))
+# Records are dropped (and counted) rather than blocking a tool call when the queue is full
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+## outbound http record / replay
+# "off", "record" (capture Graph responses to the cassette) or "replay" (serve them back, no network)
+HTTP_CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE", "off").lower()
+HTTP_CASSETTE_PATH = os.getenv("HTTP_CASSETTE_PATH", "cassettes/graph.jsonl.gz")
+# Replay timing multiplier: 1.0 reproduces the recorded latency, 0 replays without delay
+HTTP_CASSETTE_SPEED = float(os.getenv("HTTP_CASSETTE_SPEED", "1.0"))
+
+## tool registration
+# "lazy" answers list_tools from tools/manifest.json and imports a tool module on its first call,
+# "eager" imports every tool module at startup
+TOOL_LOADING = os.getenv("TOOL_LOADING", "lazy").lower()
+
+## streamable-http sessions (multi-worker)
+# "memory": sessions live in the worker that created them (single process only)
+# "stateless": no sessions, every request is self-contained (any worker, any replica)
+# "shared": session IDs are kept in SESSION_STORE so any worker can serve any session
+MCP_SESSION_MODE = os.getenv("MCP_SESSION_MODE", "memory").lower()
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").lower()   # memory | sqlite | redis
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "mcp_sessions.sqlite3")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+## cache for Graph reads
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "lru").lower()             # lru | sqlite | redis
+# How an "lru" cache hears about invalidations made by other workers: none | sqlite | redis
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "none").lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "mcp_cache.sqlite3")
+CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+
+## output shaping for listing tools
+# Results larger than this (serialised JSON) come back as a compact table plus a continuation handle.
+# RESULT_BUDGET_TOKENS, when set, wins and is converted at ~4 bytes per token.
+RESULT_BUDGET_BYTES = int(os.getenv("RESULT_BUDGET_TOKENS", "0")) * 4 or int(os.getenv("RESULT_BUDGET_BYTES", "24000"))
+
+## conditional GETs
+# Keep the ETag of GET responses and revalidate with If-None-Match; a 304 costs a header round trip only
+HTTP_CONDITIONAL_GET = os.getenv("HTTP_CONDITIONAL_GET", "true").lower() in ("1", "true", "yes")
+
+## ad images
+# Parallel image hashing/uploads per upload_ad_images call
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "6"))
+# Local image paths must lie inside this directory (relative paths are taken from it)
+AD_IMAGE_DIR = os.getenv("AD_IMAGE_DIR", "images")
+# Image downloads larger than this are refused (Facebook's own ad image limit is 30 MB)
+AD_IMAGE_MAX_BYTES = int(os.getenv("AD_IMAGE_MAX_BYTES", str(30 * 1024 * 1024)))
+
+## ad videos
+# Chunks in flight per upload_ad_video call, and where interrupted uploads keep their resume state
+VIDEO_UPLOAD_CONCURRENCY = int(os.getenv("VIDEO_UPLOAD_CONCURRENCY", "3"))
+VIDEO_UPLOAD_STATE_DIR = os.getenv("VIDEO_UPLOAD_STATE_DIR", ".uploads")
+# Video files must lie inside this directory (relative paths are taken from it)
+AD_VIDEO_DIR = os.getenv("AD_VIDEO_DIR", "videos")
+
+## deadlines
+# Every outbound request gets connect/read timeouts, capped by the remaining time of its tool call
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+TOOL_DEADLINE_SECONDS = float(os.getenv("TOOL_DEADLINE_SECONDS", "60"))
+# Per-tool overrides, "tool=seconds,tool=seconds"; uploads legitimately run for a long time
+TOOL_DEADLINES = {
+    name.strip(): float(seconds)
+    for name, seconds in (item.split("=", 1) for item in
+                          os.getenv("TOOL_DEADLINES", "upload_ad_images=900,upload_ad_video=3600").split(",") if "=" in item)
+}
+
+## circuit breakers
+# One breaker per upstream + endpoint family; opens when, within the window, enough calls failed or were slow
+BREAKERS_ENABLED = os.getenv("BREAKERS_ENABLED", "true").lower() in ("1", "true", "yes")
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+# How long an open breaker fails fast, and how many probe calls it lets through when half-open
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "2"))
+
+## audience estimates
+# Parallel delivery_estimate calls per estimate_audience_sizes call
+ESTIMATE_CONCURRENCY = int(os.getenv("ESTIMATE_CONCURRENCY", "6"))
+
+## copies
+# Deep copies with more child objects than this go through an async batch request
+COPY_SYNC_MAX_CHILDREN = int(os.getenv("COPY_SYNC_MAX_CHILDREN", "3"))
+# How long copy tools poll an async copy before handing back its request set ID
+COPY_WAIT_SECONDS = float(os.getenv("COPY_WAIT_SECONDS", "30"))
+
+## background jobs
+# Jobs running at once per worker, and how many more may wait before start_* tools refuse new ones
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "20"))
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "3600"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+# Finished jobs (and their results) are kept this long
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+## webhooks
+# App secret that signs webhook deliveries (X-Hub-Signature-256); deliveries are refused while it is unset
+FB_APP_SECRET = os.getenv("FB_APP_SECRET")
+# Token entered in the app dashboard when subscribing; echoed back in the hub.challenge handshake
+FB_WEBHOOK_VERIFY_TOKEN = os.getenv("FB_WEBHOOK_VERIFY_TOKEN")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhooks/facebook")
+# With a live subscription, campaign/ad set/catalog listings can be cached this long (0 = normal TTLs)
+WEBHOOK_CACHE_TTL_SECONDS = float(os.getenv("WEBHOOK_CACHE_TTL_SECONDS", "0"))
+
+## name index
+# How old a part of the name -> ID index may get before a lookup refreshes it (campaigns/ad sets by delta)
+NAME_INDEX_REFRESH_SECONDS = float(os.getenv("NAME_INDEX_REFRESH_SECONDS", "60"))
+# Ad accounts refreshed in parallel when a lookup spans all accounts
+NAME_INDEX_CONCURRENCY = int(os.getenv("NAME_INDEX_CONCURRENCY", "4"))
+
+## product search index
+# A catalog's local product index is rebuilt in the background once it is this old
+PRODUCT_INDEX_REFRESH_SECONDS = float(os.getenv("PRODUCT_INDEX_REFRESH_SECONDS", "3600"))
+PRODUCT_INDEX_PAGE_SIZE = int(os.getenv("PRODUCT_INDEX_PAGE_SIZE", "500"))
+# Indexes kept per worker; the least recently searched catalog's index is dropped beyond this
+PRODUCT_INDEX_MAX_CATALOGS = int(os.getenv("PRODUCT_INDEX_MAX_CATALOGS", "20"))
+
+## catalog exports
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+# Pages fetched ahead of the file writer
+EXPORT_PREFETCH_PAGES = int(os.getenv("EXPORT_PREFETCH_PAGES", "4"))
+# Largest byte range one exports:// resource read returns
+EXPORT_RANGE_MAX_BYTES = int(os.getenv("EXPORT_RANGE_MAX_BYTES", str(1024 * 1024)))
+EXPORT_RETENTION_SECONDS = float(os.getenv("EXPORT_RETENTION_SECONDS", "86400"))
+
+## admission control
+# Tool calls are admitted per class: concurrency:queue:max_wait_seconds per class, and tool=class assignments
+# (tools not listed are in class "default"; start_* tools only queue a job, so they stay "default")
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_LIMITS = {
+    name.strip(): spec.strip()
+    for name, spec in (item.split("=", 1) for item in
+                       os.getenv("ADMISSION_LIMITS", "default=32:64:2,heavy=4:8:5,bulk=2:4:10").split(",") if "=" in item)
+}
+TOOL_CLASSES = {
+    name.strip(): tool_class.strip()
+    for name, tool_class in (item.split("=", 1) for item in os.getenv("TOOL_CLASSES", ",".join([
+        "fetch_products_from_catalog=heavy", "fetch_ad_sets=heavy", "fetch_existing_creatives=heavy",
+        "get_facebook_ads=heavy", "estimate_audience_sizes=heavy", "get_weather_for_cities=heavy",
+        "get_campaigns_all_accounts=heavy", "get_ad_sets_all_accounts=heavy", "get_ads_all_accounts=heavy",
+        "upload_ad_images=bulk", "upload_ad_video=bulk", "copy_campaign=bulk", "copy_ad_set=bulk",
+        "execute_launch_plan=bulk", "resume_launch_plan=bulk",
+    ])).split(",") if "=" in item)
+}
+
+## cross-account fan-out
+# Ad accounts queried at once by the *_all_accounts tools (a quarter of it once app usage passes RATE_LIMIT_SLOW_PCT)
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+# Accounts at or above this share of their rate limit are skipped (and reported) instead of queried
+RATE_LIMIT_SKIP_PCT = float(os.getenv("RATE_LIMIT_SKIP_PCT", "95"))
+RATE_LIMIT_SLOW_PCT = float(os.getenv("RATE_LIMIT_SLOW_PCT", "75"))
+RATE_USAGE_TTL_SECONDS = float(os.getenv("RATE_USAGE_TTL_SECONDS", "300"))
+
+## profiling
+# Bearer token for the /admin/* routes (on-demand profiling); they answer 403 while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+# Longest profiling window one start request may ask for
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "900"))
+# Per-call breakdowns kept for the status report
+PROFILE_RECENT_CALLS = int(os.getenv("PROFILE_RECENT_CALLS", "200"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+## launch plans
+# Sub-requests per Graph batch call (the API takes at most 50) and batch calls in flight at once
+LAUNCH_BATCH_SIZE = min(int(os.getenv("LAUNCH_BATCH_SIZE", "50")), 50)
+LAUNCH_CONCURRENCY = int(os.getenv("LAUNCH_CONCURRENCY", "4"))
+LAUNCH_MAX_OBJECTS = int(os.getenv("LAUNCH_MAX_OBJECTS", "500"))
+# Time a rollback gets of its own, so it still runs when the launch used up the call's deadline
+LAUNCH_ROLLBACK_SECONDS = float(os.getenv("LAUNCH_ROLLBACK_SECONDS", "60"))
@@ -1,7 +1,13 @@
 import os
 from utils.server import myserver
-from tools.general.weather import get_weather_by_city
-from tools.facebook import accounts, campaigns, catalogs, products, adsets, ad_creative, catalog_creative, pages, helpers, facebook_ads
+from utils.manifest import register_tools
+
+# Registers every tool: from tools/manifest.json when TOOL_LOADING=lazy (modules load on first call),
+# otherwise by importing all tool modules.
+register_tools(myserver)
+
+# ASGI entry point for hosting (`uvicorn main:app`, see start.sh); serves the MCP endpoint at /mcp
+app = myserver.streamable_http_app()
 
 
 ## for local
@@ -11,8 +17,6 @@ if __name__ == "__main__":
     # myserver.run(transport='stdio')
     myserver.run(transport="streamable-http")
 
-# app = myserver.app # <--- ASSUMING YOUR FastMCP CLASS USES 'self.app' INTERNALLY
-
 
 ## for hosting
 #
@@ -33,4 +37,4 @@ if __name__ == "__main__":
 #     path = "/mcp"     # As per official docs for the 'streamable-http' transport
 #
 #     print(f"Starting server on {host}:{port}{path} with transport 'streamable-http'")
-#     myserver.run(transport="streamable-http", host=host, port=port, path=path)
\ No newline at end of file
+#     myserver.run(transport="streamable-http", host=host, port=port, path=path)
@@ -3,8 +3,8 @@
 # This script will be executed by Render to start your application.
 # It tells Uvicorn to run your FastMCP server.
 
-# Replace 'your_server_file_name' with the actual name of your Python file
-# (e.g., if your code is in 'app.py', use 'app')
-# 'myserver.app' refers to the FastMCP instance's underlying ASGI app.
+# 'main:app' is the ASGI app defined in main.py (the FastMCP streamable-http app, served at /mcp).
+# Tools are registered from tools/manifest.json and their modules import on first use (TOOL_LOADING=lazy).
 # $PORT is an environment variable provided by Render.
-uvicorn main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# With WEB_CONCURRENCY > 1 set MCP_SESSION_MODE=shared (or stateless) so any worker can serve any session.
+uvicorn main:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1}
@@ -1,6 +1,12 @@
 from config.settings import fb_access_token, fb_base_url
 import requests
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 
 # --- TOOL DEFINITION ---
@@ -28,19 +34,20 @@ def get_facebook_business_accounts() -> str:
     - You can give recommendations to the users based on the tool output and the user input if something could be changed or is not correct.
     - If you require the id of some entity to perform a task then you should use the corresponding tool to fetch and show users for them to select the id.
     """
-    print(f"Tool Called: get_facebook_business_accounts")
+    log.debug("fetching business accounts")
 
     url = f"{fb_base_url}me/businesses"
 
-    try:
-        response = requests.get(url, params={"access_token": fb_access_token})
+    def load():
+        response = http_client.get(url, params={"access_token": fb_access_token})
         response.raise_for_status()
-        data = response.json()
+        return response.json().get("data", [])
 
-        businesses = data.get("data", [])
+    try:
+        businesses = cache.get_or_set("businesses", "me", load)
         if not businesses:
             return "No business accounts found for this user."
-        return businesses
+        return fit_to_budget(businesses, "business accounts", ["id", "name"])
 
     except requests.exceptions.HTTPError as http_err:
         return f"Facebook API error: {http_err.response.json().get('error', {}).get('message', str(http_err))}"
@@ -59,20 +66,25 @@ def get_facebook_ad_accounts() -> str:
     Fetches Facebook Ad Accounts connected to the user and, and you should show them as a list in the output.
     Ad Account id should be used intact without omitting anything like (act_) before the numbers.
     """
-    print(f"Tool Called: get_facebook_ad_accounts")
+    log.debug("fetching ad accounts")
 
     url = f"{fb_base_url}me/adaccounts"
 
-    try:
-        response = requests.get(url, params={"access_token": fb_access_token})
+    def load():
+        response = http_client.get(url, params={"access_token": fb_access_token})
         response.raise_for_status()
-        data = response.json()
+        return response.json().get("data", [])
 
-        ad_accounts = data.get("data", [])
+    try:
+        ad_accounts = cache.get_or_set("ad_accounts", "me", load)
         if not ad_accounts:
             return "No ad accounts found for this user."
 
-        print(ad_accounts)
+        log.debug("ad accounts fetched", count=len(ad_accounts), ad_accounts=ad_accounts)
+
+        shaped = fit_to_budget(ad_accounts, "ad accounts", ["id", "name"])
+        if isinstance(shaped, str):
+            return shaped
 
         return "".join(
             [f"- {acc.get('name', 'Unnamed')} (ID: {acc['id']})" for acc in ad_accounts]
@@ -1,6 +1,10 @@
+import json
+
 import requests
 from config.settings import fb_access_token, fb_base_url
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
 
 
 @myserver.tool()
@@ -22,7 +26,7 @@ def fetch_existing_creatives(ad_account_id: str):
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         creatives = data.get('data', [])
@@ -31,7 +35,7 @@ def fetch_existing_creatives(ad_account_id: str):
 
         # Format output nicely
         creative_list = [(c['id'], c.get('name', '')) for c in creatives]
-        return creative_list
+        return fit_to_budget(creative_list, "ad creatives", ["0", "1"])
 
     except requests.exceptions.RequestException as e:
         return f"Error fetching creatives: {str(e)}"
@@ -52,7 +56,7 @@ def delete_facebook_ad_creative(creative_id: str) -> str:
     """
     try:
         url = f"{fb_base_url}{creative_id}"
-        response = requests.delete(url, params={"access_token": fb_access_token})
+        response = http_client.delete(url, params={"access_token": fb_access_token})
         response.raise_for_status()
         result = response.json()
 
@@ -64,42 +68,44 @@ def delete_facebook_ad_creative(creative_id: str) -> str:
         return f"Error deleting Ad Creative: {str(e)}"
 
 
-# @myserver.tool()
-# def start_creative_creation(
-#     ad_account_id: str,
-#     page_id: str,
-#     name: str | None = None,
-#     message: str | None = None,
-#     link: str | None = None,
-#     cta_type: str | None = None,
-# ) -> str:
-#     """
-#     Initiates ad creative creation by saving required data to session and prompting for image upload.
-#     Don't call this tool before collecting all the below parameters and remember this rule for every other tool.
-#
-#     Parameters:
-#     - ad_account_id: Facebook Ad Account ID
-#     - page_id: Facebook Page ID that owns the ad.
-#     - name: Name of the creative (e.g., "Summer Sale Ad").
-#     - message: The text shown above the ad creative.
-#     - link: URL the ad should link to.
-#     - cta_type: Call-to-action type (e.g., "SHOP_NOW", "LEARN_MORE").
-#
-#     Returns:
-#     - Message prompting image upload or error if any field is missing.
-#     """
-#     fields = {
-#         "ad_account_id": ad_account_id,
-#         "page_id": page_id,
-#         "name": name,
-#         "message": message,
-#         "link": link,
-#         "cta_type": cta_type
-#     }
-#
-#     missing = [k for k, v in fields.items() if not v]
-#     if missing:
-#         return f"Missing required creative fields: {', '.join(missing)}."
-#     else:
-#         st.session_state.pending_creative = fields
-#         return "Creative details saved. Please upload an image to complete the process."
\ No newline at end of file
+@myserver.tool()
+def create_image_ad_creative(
+    ad_account_id: str,
+    page_id: str,
+    name: str,
+    message: str,
+    link: str,
+    image_hash: str,
+    cta_type: str | None = None,
+) -> str:
+    """
+    Create a link ad creative from an uploaded image.
+    Get `image_hash` from `upload_ad_images` first. Don't call this tool before collecting all the below parameters.
+
+    Parameters:
+    - ad_account_id: Facebook Ad Account ID
+    - page_id: Facebook Page ID that owns the ad.
+    - name: Name of the creative (e.g., "Summer Sale Ad").
+    - message: The text shown above the ad creative.
+    - link: URL the ad should link to.
+    - image_hash: Hash of an image uploaded to this ad account.
+    - cta_type: Call-to-action type (e.g., "SHOP_NOW", "LEARN_MORE"), optional.
+
+    Returns:
+    - The new creative ID or an error message.
+    """
+    link_data = {"message": message, "link": link, "image_hash": image_hash}
+    if cta_type:
+        link_data["call_to_action"] = {"type": cta_type, "value": {"link": link}}
+    data = {
+        "name": name,
+        "object_story_spec": json.dumps({"page_id": page_id, "link_data": link_data}),
+        "access_token": fb_access_token,
+    }
+
+    try:
+        response = http_client.post(f"{fb_base_url}{ad_account_id}/adcreatives", data=data)
+        response.raise_for_status()
+        return f"Ad Creative created with ID: {response.json().get('id')}"
+    except requests.exceptions.RequestException as e:
+        return f"Error creating ad creative: {str(e)}"
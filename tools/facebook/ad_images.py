@@ -0,0 +1,207 @@
+import base64
+import contextvars
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from config.settings import fb_access_token, fb_base_url, AD_IMAGE_DIR, AD_IMAGE_MAX_BYTES, IMAGE_UPLOAD_CONCURRENCY
+from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+# Facebook identifies an ad image by the MD5 of its bytes, so the hash is known before uploading
+HASH_CHUNK_BYTES = 1 << 20
+# Hashes per `adimages?hashes=` lookup
+LOOKUP_BATCH = 50
+MAX_REDIRECTS = 5
+
+
+def _is_url(source: str) -> bool:
+    # Any scheme counts as a URL, so "ftp://..." is refused instead of being looked up as a file
+    return "://" in source
+
+
+def _local_path(source: str) -> str:
+    """The real path of a local image, which must lie inside AD_IMAGE_DIR."""
+    root = os.path.realpath(AD_IMAGE_DIR)
+    path = os.path.realpath(os.path.join(root, os.path.expanduser(source)))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"local images must be inside the image directory ({AD_IMAGE_DIR})")
+    return path
+
+
+def _check_url(url: str) -> None:
+    """Only http(s) URLs whose host resolves to public addresses may be fetched."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("only http:// and https:// image URLs are accepted")
+    for *_, sockaddr in socket.getaddrinfo(parts.hostname, parts.port or None, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"{parts.hostname} resolves to a private or reserved address")
+
+
+def _body(response: requests.Response) -> bytes:
+    """The streamed body, refused as soon as it goes over AD_IMAGE_MAX_BYTES."""
+    if int(response.headers.get("Content-Length") or 0) > AD_IMAGE_MAX_BYTES:
+        raise ValueError(f"the image is larger than {AD_IMAGE_MAX_BYTES} bytes")
+    content = bytearray()
+    for chunk in response.iter_content(HASH_CHUNK_BYTES):
+        content += chunk
+        if len(content) > AD_IMAGE_MAX_BYTES:
+            raise ValueError(f"the image is larger than {AD_IMAGE_MAX_BYTES} bytes")
+    return bytes(content)
+
+
+def _download(url: str) -> bytes:
+    # Redirects are followed by hand so every hop is checked
+    for _ in range(MAX_REDIRECTS + 1):
+        _check_url(url)
+        with http_client.get(url, timeout=60, allow_redirects=False, revalidate=False, stream=True) as response:
+            if not response.is_redirect:
+                response.raise_for_status()
+                return _body(response)
+            url = urljoin(url, response.headers["location"])
+    raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+
+def _read(source: str) -> bytes:
+    if _is_url(source):
+        return _download(source)
+    with open(_local_path(source), "rb") as f:
+        return f.read()
+
+
+def _hash(ad_account_id: str, source: str) -> tuple[str, bytes | None]:
+    """
+    MD5 of the image. Downloaded bytes are kept for the upload unless the account is already known to
+    have the image; local files are re-read only if needed.
+    """
+    if _is_url(source):
+        content = _download(source)
+        image_hash = hashlib.md5(content).hexdigest()
+        if cache.get("ad_images", f"{ad_account_id}:{image_hash}"):
+            return image_hash, None
+        return image_hash, content
+    digest = hashlib.md5()
+    with open(_local_path(source), "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest(), None
+
+
+def _existing_hashes(ad_account_id: str, hashes: list[str]) -> set[str]:
+    """Hashes the account already has, from the cache first and `adimages?hashes=` for the rest."""
+    known = {h for h in hashes if cache.get("ad_images", f"{ad_account_id}:{h}")}
+    unknown = [h for h in hashes if h not in known]
+    url = f"{fb_base_url}{ad_account_id}/adimages"
+    for start in range(0, len(unknown), LOOKUP_BATCH):
+        params = {
+            "access_token": fb_access_token,
+            "hashes": json.dumps(unknown[start:start + LOOKUP_BATCH]),
+            "fields": "hash",
+        }
+        response = http_client.get(url, params=params)
+        response.raise_for_status()
+        for image in response.json().get("data", []):
+            known.add(image["hash"])
+            cache.set("ad_images", f"{ad_account_id}:{image['hash']}", True)
+    return known
+
+
+def _upload(ad_account_id: str, source: str, content: bytes | None) -> str:
+    content = content if content is not None else _read(source)
+    data = {
+        "access_token": fb_access_token,
+        "bytes": base64.b64encode(content).decode(),
+        "name": os.path.basename(source.split("?")[0]) or "image",
+    }
+    response = http_client.post(f"{fb_base_url}{ad_account_id}/adimages", data=data)
+    response.raise_for_status()
+    images = response.json().get("images", {})
+    image_hash = next(iter(images.values()))["hash"]
+    cache.set("ad_images", f"{ad_account_id}:{image_hash}", True)
+    return image_hash
+
+
+@myserver.tool()
+def upload_ad_images(ad_account_id: str, images: list[str]) -> dict:
+    """
+    Upload images to a Facebook ad account and return their image hashes for creative creation.
+
+    Images the account already has (same content) are not uploaded again, so it is cheap to pass the
+    full set of images on every creative refresh. Pass the returned `image_hash` values to
+    `create_image_ad_creative`.
+
+    Parameters:
+    - ad_account_id: Facebook Ad Account ID (e.g., "act_123456")
+    - images: local file paths (inside the server's image directory) and/or public http(s) URLs of the images
+
+    Returns:
+    - A dict with counts (`uploaded`, `existing`, `failed`) and one entry per image with
+      `source`, `image_hash` and `status` ("uploaded", "existing" or "failed" with an `error`)
+    """
+    log.debug("uploading ad images", ad_account_id=ad_account_id, images=len(images))
+    sources = list(dict.fromkeys(images))
+    results = {source: {"source": source, "image_hash": None, "status": "failed"} for source in sources}
+
+    with ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_CONCURRENCY) as pool:
+        # Hash (and download) in parallel; one unreadable image does not stop the others. Only the first
+        # download of each content is kept, since identical images need one upload at most
+        hashed, to_upload = {}, {}
+        futures = [(s, pool.submit(contextvars.copy_context().run, _hash, ad_account_id, s)) for s in sources]
+        for source, future in futures:
+            try:
+                image_hash, content = future.result()
+            except (OSError, ValueError, requests.exceptions.RequestException) as e:
+                results[source]["error"] = f"Could not read image: {str(e)}"
+                continue
+            hashed[source] = image_hash
+            results[source]["image_hash"] = image_hash
+            to_upload.setdefault(image_hash, (source, content))
+        futures.clear()  # the futures hold every download
+
+        try:
+            existing = _existing_hashes(ad_account_id, sorted(to_upload))
+        except requests.exceptions.RequestException as e:
+            return {"error": f"Error looking up existing ad images: {str(e)}"}
+
+        for source, image_hash in hashed.items():
+            if image_hash in existing:
+                results[source]["status"] = "existing"
+                to_upload.pop(image_hash, None)
+        # Each worker runs in a copy of this call's context, so the deadline and cancel token apply
+        uploads = {h: pool.submit(contextvars.copy_context().run, _upload, ad_account_id, source, content)
+                   for h, (source, content) in to_upload.items()}
+        del to_upload
+        failures = {}
+        for image_hash, future in uploads.items():
+            try:
+                future.result()
+            except (OSError, ValueError, requests.exceptions.RequestException, KeyError, StopIteration) as e:
+                failures[image_hash] = f"Upload failed: {str(e)}"
+
+    for source, image_hash in hashed.items():
+        if image_hash in failures:
+            results[source]["error"] = failures[image_hash]
+        elif image_hash in uploads:
+            results[source]["status"] = "uploaded"
+
+    rows = list(results.values())
+    return {
+        "uploaded": sum(r["status"] == "uploaded" for r in rows),
+        "existing": sum(r["status"] == "existing" for r in rows),
+        "failed": sum(r["status"] == "failed" for r in rows),
+        "images": fit_to_budget(rows, "images", ["source", "image_hash", "status"]),
+    }
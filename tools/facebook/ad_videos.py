@@ -0,0 +1,225 @@
+"""
+Resumable ad video upload (Graph `advideos` with upload_phase=start / transfer / finish).
+
+The file is read through a memory map, so only the chunks in flight are in memory. Chunks go up with
+bounded parallelism, sized like the latest window Facebook handed out; every acknowledged byte range
+is written to a small state file, and calling the tool again for the same file continues the same
+upload session instead of starting over. Once everything is sent, the window Facebook asks for next is
+followed until it reports the file complete.
+"""
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from typing import Iterator, List, Tuple
+
+import requests
+from mcp.server.fastmcp import Context
+from config.settings import fb_access_token, fb_base_url, AD_VIDEO_DIR, VIDEO_UPLOAD_CONCURRENCY, VIDEO_UPLOAD_STATE_DIR
+from utils.server import myserver
+from utils import deadline, http_client
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+CHUNK_RETRIES = 3
+# Windows Facebook may still ask for after all chunks were sent (re-sends of bytes it did not keep)
+MAX_FOLLOW_UP_WINDOWS = 100
+
+_save_lock = threading.Lock()
+
+
+def _local_path(file_path: str) -> str:
+    """The real path of a video file, which must lie inside AD_VIDEO_DIR."""
+    root = os.path.realpath(AD_VIDEO_DIR)
+    path = os.path.realpath(os.path.join(root, os.path.expanduser(file_path)))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"video files must be inside the video directory ({AD_VIDEO_DIR})")
+    return path
+
+
+def _state_path(ad_account_id: str, path: str, stat: os.stat_result) -> str:
+    # A changed file (size or mtime) gets a new upload session
+    key = f"{ad_account_id}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(VIDEO_UPLOAD_STATE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def _load_state(state_path: str) -> dict | None:
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("done") and isinstance(state["done"][0], int):
+        # State files written before ranges were tracked list chunk starts of a fixed chunk size
+        state["done"] = [[s, min(s + state["chunk_size"], state["file_size"])] for s in state["done"]]
+    return state
+
+
+def _save_state(state_path: str, state: dict) -> None:
+    """Write the state atomically; a failed write only costs resumability, never the upload."""
+    try:
+        with _save_lock:
+            os.makedirs(VIDEO_UPLOAD_STATE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=VIDEO_UPLOAD_STATE_DIR, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp, state_path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+    except OSError as e:
+        log.warning("could not save video upload state", state_path=state_path, error=str(e))
+
+
+def _gaps(done: List[List[int]], size: int) -> List[Tuple[int, int]]:
+    """Byte ranges of [0, size) not covered by the acknowledged ranges."""
+    gaps, position = [], 0
+    for start, end in sorted(done):
+        if start > position:
+            gaps.append((position, start))
+        position = max(position, end)
+    if position < size:
+        gaps.append((position, size))
+    return gaps
+
+
+def _acknowledged(done: List[List[int]]) -> int:
+    return sum(end - start for start, end in done)
+
+
+def _post_phase(ad_account_id: str, data: dict, files: dict | None = None) -> dict:
+    response = http_client.post(f"{fb_base_url}{ad_account_id}/advideos",
+                                data={**data, "access_token": fb_access_token}, files=files, timeout=300)
+    response.raise_for_status()
+    return response.json()
+
+
+def _transfer(ad_account_id: str, session_id: str, view: mmap.mmap, start: int, end: int) -> Tuple[int, int]:
+    """Send one chunk; returns the next window (start_offset, end_offset) Facebook asks for."""
+    files = {"video_file_chunk": ("chunk", view[start:end], "application/octet-stream")}
+    for attempt in range(1, CHUNK_RETRIES + 1):
+        try:
+            answer = _post_phase(ad_account_id, {"upload_phase": "transfer", "upload_session_id": session_id,
+                                                 "start_offset": start}, files)
+            return int(answer["start_offset"]), int(answer["end_offset"])
+        except (deadline.DeadlineExceeded, deadline.CallCancelled):
+            raise
+        except requests.exceptions.RequestException as e:
+            if attempt == CHUNK_RETRIES:
+                raise
+            log.warning("video chunk failed, retrying", start_offset=start, attempt=attempt, error=str(e))
+
+
+@myserver.tool()
+async def upload_ad_video(ad_account_id: str, file_path: str, title: str | None = None, ctx: Context = None) -> str:
+    """
+    Upload a video file (any size, e.g. several hundred MB) to a Facebook ad account.
+
+    If an upload fails or is interrupted, call this tool again with the same arguments: it resumes from
+    the last chunk Facebook acknowledged instead of starting over. Progress is reported while uploading.
+
+    Parameters:
+    - ad_account_id: Facebook Ad Account ID (e.g., "act_123456")
+    - file_path: Path of the video file on the server (inside the server's video directory)
+    - title: Optional video title
+
+    Returns:
+    - The new video ID (usable in video ad creatives) or an error message.
+    """
+    try:
+        file_path = _local_path(file_path)
+        stat = os.stat(file_path)
+    except (OSError, ValueError) as e:
+        return f"Error reading video file: {str(e)}"
+    if stat.st_size == 0:
+        return "Error reading video file: the file is empty."
+
+    state_path = _state_path(ad_account_id, file_path, stat)
+    state = _load_state(state_path)
+    try:
+        if state is None:
+            started = await asyncio.to_thread(_post_phase, ad_account_id,
+                                              {"upload_phase": "start", "file_size": stat.st_size})
+            state = {
+                "video_id": started["video_id"],
+                "upload_session_id": started["upload_session_id"],
+                # Size of the latest window Facebook handed out; later answers may change it
+                "chunk_size": int(started["end_offset"]) - int(started["start_offset"]),
+                "file_size": stat.st_size,
+                "done": [],
+            }
+            await asyncio.to_thread(_save_state, state_path, state)
+        else:
+            log.info("resuming video upload", video_id=state["video_id"], bytes_done=_acknowledged(state["done"]))
+
+        limit = asyncio.Semaphore(VIDEO_UPLOAD_CONCURRENCY)
+        last_window: Tuple[int, int] | None = None
+
+        def windows() -> Iterator[Tuple[int, int]]:
+            # Sized when handed out, so a new window size from Facebook applies to the chunks after it
+            for gap_start, gap_end in _gaps(state["done"], stat.st_size):
+                position = gap_start
+                while position < gap_end:
+                    end = min(position + max(state["chunk_size"], 1), gap_end)
+                    yield position, end
+                    position = end
+
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+
+            async def send(start: int, end: int) -> None:
+                nonlocal last_window
+                next_start, next_end = await asyncio.to_thread(
+                    _transfer, ad_account_id, state["upload_session_id"], view, start, end)
+                state["done"].append([start, end])
+                if next_end > next_start:
+                    state["chunk_size"] = next_end - next_start
+                # Answers to parallel chunks arrive in any order; Facebook's next offset only moves forward
+                if last_window is None or next_start >= last_window[0]:
+                    last_window = (next_start, next_end)
+                # A snapshot: other chunks keep appending to `done` while this one is written
+                await asyncio.to_thread(_save_state, state_path, {**state, "done": list(state["done"])})
+                if ctx is not None:
+                    await ctx.report_progress(min(_acknowledged(state["done"]), stat.st_size), stat.st_size)
+
+            async def worker(pending: Iterator[Tuple[int, int]]) -> None:
+                for start, end in pending:
+                    async with limit:
+                        await send(start, end)
+
+            pending = windows()
+            tasks = [asyncio.create_task(worker(pending)) for _ in range(VIDEO_UPLOAD_CONCURRENCY)]
+            try:
+                await asyncio.gather(*tasks)
+                # Everything was sent once; Facebook's answer to the last transfer says what it still needs
+                for _ in range(MAX_FOLLOW_UP_WINDOWS):
+                    if last_window is None or last_window[0] >= min(last_window[1], stat.st_size):
+                        break
+                    start, end = last_window[0], min(last_window[1], stat.st_size)
+                    state["done"] = [[s, e] for s, e in state["done"] if e <= start or s >= end]
+                    last_window = None
+                    await send(start, end)
+            finally:
+                # On failure or cancellation let in-flight chunks settle before the map is closed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        data = {"upload_phase": "finish", "upload_session_id": state["upload_session_id"]}
+        if title:
+            data["title"] = title
+        await asyncio.to_thread(_post_phase, ad_account_id, data)
+    except (requests.exceptions.RequestException, OSError, KeyError, ValueError) as e:
+        done_bytes = _acknowledged(state["done"]) if state else 0
+        return (f"Error uploading video ({done_bytes} of {stat.st_size} bytes acknowledged): {str(e)}. "
+                f"Call this tool again with the same arguments to resume.")
+
+    try:
+        os.remove(state_path)
+    except OSError:
+        pass
+    return f"Video uploaded with ID: {state['video_id']}"
@@ -1,7 +1,62 @@
+import contextvars
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from config.settings import fb_access_token, fb_base_url
+from config.settings import fb_access_token, fb_base_url, ESTIMATE_CONCURRENCY
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+
+def build_targeting_spec(countries: list, age_min: int, age_max: int,
+                         interests: list = None, behaviors: list = None) -> dict:
+    """Targeting spec as `create_ad_set` sends it."""
+    # Normalize country codes
+    countries = ['GB' if c.upper() == 'UK' else c.upper() for c in countries]
+
+    # Build targeting spec
+    targeting_spec = {
+        'geo_locations': {'countries': countries},
+        'age_min': age_min,
+        'age_max': age_max
+    }
+
+    # Build flexible spec if needed
+    flexible_spec = []
+    if interests:
+        flexible_spec.append({'interests': interests})
+    if behaviors:
+        if flexible_spec:
+            flexible_spec[0]['behaviors'] = behaviors
+        else:
+            flexible_spec.append({'behaviors': behaviors})
+    if flexible_spec:
+        targeting_spec['flexible_spec'] = flexible_spec  # type: ignore
+    return targeting_spec
+
+
+def canonical_targeting(spec: dict) -> tuple[dict, str]:
+    """
+    Canonical form of a targeting spec and its hash: countries and interest/behavior IDs sorted and
+    de-duplicated, display names dropped (they don't change the audience), keys sorted.
+    """
+    def ids(items: list) -> list:
+        return [{"id": i} for i in sorted({str(item["id"] if isinstance(item, dict) else item) for item in items})]
+
+    canonical = json.loads(json.dumps(spec))
+    geo = canonical.get("geo_locations", {})
+    if "countries" in geo:
+        geo["countries"] = sorted(set(geo["countries"]))
+    for group in canonical.get("flexible_spec", []):
+        for key in list(group):
+            group[key] = ids(group[key])
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return canonical, hashlib.sha1(text.encode()).hexdigest()
 
 
 @myserver.tool()
@@ -10,7 +65,7 @@ def fetch_ad_sets(ad_account_id: str, campaign_id: str) -> str:
     Fetch all ad sets for a given Facebook ad account using the get_facebook_ad_accounts tool and asking user for confirmation.
     Filters by a specific campaign ID by asking the user first.
     """
-    print("Fetch ad sets called")
+    log.debug("fetching ad sets", ad_account_id=ad_account_id, campaign_id=campaign_id)
     base_url = f"{fb_base_url}{ad_account_id}/adsets"
     params = {
         "fields": "name,id,daily_budget,billing_event,optimization_goal,bid_strategy,status,targeting",
@@ -20,10 +75,13 @@ def fetch_ad_sets(ad_account_id: str, campaign_id: str) -> str:
     if campaign_id:
         params["filtering"] = f'[{{"field":"campaign.id","operator":"IN","value":["{campaign_id}"]}}]'
 
-    try:
-        response = requests.get(base_url, params=params)
+    def load():
+        response = http_client.get(base_url, params=params)
         response.raise_for_status()
-        ad_sets = response.json().get("data", [])
+        return response.json().get("data", [])
+
+    try:
+        ad_sets = cache.get_or_set("adsets", f"{ad_account_id}:{campaign_id or ''}", load)
 
         if not ad_sets:
             return "No ad sets found for this account or campaign."
@@ -33,7 +91,8 @@ def fetch_ad_sets(ad_account_id: str, campaign_id: str) -> str:
         #     for ad in ad_sets
         # ]
         # return "Here are the ad sets:\n" + "\n".join(summaries)
-        return ad_sets
+        # Targeting makes ad sets heavy: over budget they come back as a table without it
+        return fit_to_budget(ad_sets, "ad sets", ["id", "name", "status", "daily_budget", "optimization_goal"])
 
     except requests.exceptions.RequestException as e:
         return f"Error fetching ad sets: {str(e)}"
@@ -59,6 +118,7 @@ def create_ad_set(
 
     DO NOT hardcode ad account IDs, campaign IDs, interest or behavior IDs directly.
     Instead:
+    - If the user names the ad account or campaign, use 'resolve_facebook_ids' to get both IDs in one call.
     - Use the 'get_facebook_ad_accounts' tool and select the first or most relevant ad account.
     - Use the 'get_facebook_campaigns' tool to get a campaign from that account.
     - Use the 'search_interests' tool to get interest objects (with id and name) from keywords.
@@ -84,7 +144,7 @@ def create_ad_set(
     - ID of the created ad set or an error message if failed.
     """
 
-    print("create ad set called")
+    log.debug("creating ad set", ad_account_id=ad_account_id, campaign_id=campaign_id, name=name)
 
     # Validate required fields
     required_fields = {
@@ -106,27 +166,7 @@ def create_ad_set(
     if missing:
         return f"Missing required fields for ad set: {', '.join(missing)}."
     else:
-        # Normalize country codes
-        countries = ['GB' if c.upper() == 'UK' else c.upper() for c in countries]
-
-        # Build targeting spec
-        targeting_spec = {
-            'geo_locations': {'countries': countries},
-            'age_min': age_min,
-            'age_max': age_max
-        }
-
-        # Build flexible spec if needed
-        flexible_spec = []
-        if interests:
-            flexible_spec.append({'interests': interests})
-        if behaviors:
-            if flexible_spec:
-                flexible_spec[0]['behaviors'] = behaviors
-            else:
-                flexible_spec.append({'behaviors': behaviors})
-        if flexible_spec:
-            targeting_spec['flexible_spec'] = flexible_spec  # type: ignore
+        targeting_spec = build_targeting_spec(countries, age_min, age_max, interests, behaviors)
 
         # Ensure daily budget meets minimum
         if daily_budget < 1000:
@@ -147,8 +187,9 @@ def create_ad_set(
         }
 
         try:
-            response = requests.post(url, data=payload)
+            response = http_client.post(url, data=payload)
             response.raise_for_status()
+            cache.invalidate("adsets")
             return response.json().get('id')
         except requests.exceptions.HTTPError as http_err:
             return f"HTTP error occurred: {http_err} - {response.text}"
@@ -159,6 +200,102 @@ def create_ad_set(
 
 
 
+def _delivery_estimate(ad_account_id: str, spec: dict, optimization_goal: str) -> dict:
+    response = http_client.get(f"{fb_base_url}{ad_account_id}/delivery_estimate", params={
+        "targeting_spec": json.dumps(spec),
+        "optimization_goal": optimization_goal,
+        "access_token": fb_access_token,
+    })
+    response.raise_for_status()
+    estimate = (response.json().get("data") or [{}])[0]
+    return {
+        "estimate_mau_lower_bound": estimate.get("estimate_mau_lower_bound"),
+        "estimate_mau_upper_bound": estimate.get("estimate_mau_upper_bound"),
+        "estimate_ready": estimate.get("estimate_ready"),
+    }
+
+
+def _check_variant(variant: dict) -> None:
+    """Reject targeting Graph would refuse anyway, before spending a call on it."""
+    countries = variant.get("countries")
+    if not isinstance(countries, list) or not countries or not all(isinstance(c, str) for c in countries):
+        raise ValueError("countries must be a non-empty list of country codes, e.g. [\"US\", \"GB\"]")
+    ages = (variant.get("age_min"), variant.get("age_max"))
+    if not all(isinstance(a, int) and not isinstance(a, bool) and 13 <= a <= 65 for a in ages):
+        raise ValueError("age_min and age_max must be whole numbers between 13 and 65")
+    if ages[0] > ages[1]:
+        raise ValueError(f"age_min {ages[0]} is above age_max {ages[1]}")
+
+
+@myserver.tool()
+def estimate_audience_sizes(ad_account_id: str, variants: list[dict], optimization_goal: str = "REACH") -> list[dict]:
+    """
+    Compare the estimated audience size of several targeting variants before creating an ad set.
+
+    Each variant takes the same targeting fields as `create_ad_set`; identical variants (in any order
+    or spelling, e.g. "UK" vs "GB") are only estimated once, and recent estimates are reused.
+
+    Parameters:
+    - ad_account_id: ID of the ad account (get this from 'get_facebook_ad_accounts')
+    - variants: list of dicts with `countries`, `age_min`, `age_max` and optionally `interests`,
+      `behaviors` (as for `create_ad_set`) and a `label` to tell the variants apart
+    - optimization_goal: optimization goal the estimate is for, e.g. "REACH" or "LINK_CLICKS"
+
+    Returns:
+    - One dict per variant, in the given order, with `label`, `spec_hash`, `estimate_mau_lower_bound`,
+      `estimate_mau_upper_bound` and `estimate_ready`, or `label` and `error`.
+    """
+    log.debug("estimating audience sizes", ad_account_id=ad_account_id, variants=len(variants))
+
+    hashed = []
+    for index, variant in enumerate(variants):
+        label = f"variant {index + 1}"
+        try:
+            if not isinstance(variant, dict):
+                raise ValueError("a variant must be an object with countries, age_min and age_max")
+            label = variant.get("label") or label
+            _check_variant(variant)
+            spec = build_targeting_spec(variant["countries"], variant["age_min"], variant["age_max"],
+                                        variant.get("interests"), variant.get("behaviors"))
+            spec, spec_hash = canonical_targeting(spec)
+        except ValueError as e:
+            hashed.append((label, None, f"Invalid variant: {e}"))
+            continue
+        except (KeyError, TypeError, AttributeError) as e:
+            hashed.append((label, None, f"Invalid variant: missing or malformed {e}"))
+            continue
+        hashed.append((label, spec_hash, spec))
+
+    specs = {h: spec for _, h, spec in hashed if h is not None}
+    estimates = {}
+    for spec_hash in specs:
+        cached = cache.get("audience_estimates", f"{ad_account_id}:{optimization_goal}:{spec_hash}")
+        if cached is not None:
+            estimates[spec_hash] = cached
+
+    missing = [h for h in specs if h not in estimates]
+    with ThreadPoolExecutor(max_workers=ESTIMATE_CONCURRENCY) as pool:
+        futures = {h: pool.submit(contextvars.copy_context().run, _delivery_estimate,
+                                  ad_account_id, specs[h], optimization_goal) for h in missing}
+        for spec_hash, future in futures.items():
+            try:
+                estimates[spec_hash] = future.result()
+                # A not-ready estimate is provisional: ask again next time instead of serving it from the cache
+                if estimates[spec_hash].get("estimate_ready"):
+                    cache.set("audience_estimates", f"{ad_account_id}:{optimization_goal}:{spec_hash}",
+                              estimates[spec_hash])
+            except requests.exceptions.RequestException as e:
+                estimates[spec_hash] = {"error": f"Error fetching estimate: {str(e)}"}
+
+    results = []
+    for label, spec_hash, spec in hashed:
+        if spec_hash is None:
+            results.append({"label": label, "error": spec})
+        else:
+            results.append({"label": label, "spec_hash": spec_hash[:12], **estimates[spec_hash]})
+    return results
+
+
 @myserver.tool()
 def delete_facebook_ad_set(ad_set_id: str) -> str:
     """
@@ -172,11 +309,12 @@ def delete_facebook_ad_set(ad_set_id: str) -> str:
     """
     try:
         url = f"{fb_base_url}{ad_set_id}"
-        response = requests.delete(url, params={"access_token": fb_access_token})
+        response = http_client.delete(url, params={"access_token": fb_access_token})
         response.raise_for_status()
         result = response.json()
 
         if result.get("success"):
+            cache.invalidate("adsets")
             return f"Ad Set `{ad_set_id}` deleted successfully."
         else:
             return f"Failed to delete Ad Set `{ad_set_id}`. Response: {result}"
@@ -1,28 +1,38 @@
 import requests
 from config.settings import fb_access_token, fb_base_url
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 
 @myserver.tool()
 def get_facebook_campaigns(ad_account_id: str) -> str:
     """Fetch campaigns from a Facebook Ad Account using the get_facebook_ad_accounts tool to get the ad account id and asking the user to select the account
     to get the campaigns from.
+    If the user names a campaign or account and you only need its ID, use 'resolve_facebook_ids' instead.
     """
 
-    print(f"get campaigns tool called with ad_account_id: {ad_account_id}")
+    log.debug("fetching campaigns", ad_account_id=ad_account_id)
     url = f"{fb_base_url}{ad_account_id}/campaigns"
     params = {
         'access_token': fb_access_token,
         'fields': 'id,name,status,objective',
     }
-    try:
-        response = requests.get(url, params=params)
+    def load():
+        response = http_client.get(url, params=params)
         response.raise_for_status()
-        data = response.json().get('data', [])
+        return response.json().get('data', [])
+
+    try:
+        data = cache.get_or_set("campaigns", ad_account_id, load)
 
         if not data:
             return "No campaigns found for this ad account."
-        return data
+        return fit_to_budget(data, "campaigns", ["id", "name", "status", "objective"])
 
     except requests.exceptions.RequestException as e:
         return f"Error fetching campaigns: {str(e)}"
@@ -40,7 +50,7 @@ def create_fb_campaign(ad_account_id: str, campaign_name: str, objective: str) -
     ]
     Carefully check the tools if they can provide any required info and then ask the user for any of the required info or confirmations.
     """
-    print(f"create campaigns tool called with ad_account_id: {ad_account_id}, campaign_name: {campaign_name}, objective: {objective}")
+    log.debug("creating campaign", ad_account_id=ad_account_id, campaign_name=campaign_name, objective=objective)
     url = f'{fb_base_url}{ad_account_id}/campaigns'
     campaign_data = {
         'name': campaign_name,
@@ -51,8 +61,9 @@ def create_fb_campaign(ad_account_id: str, campaign_name: str, objective: str) -
     }
 
     try:
-        response = requests.post(url, data=campaign_data)
+        response = http_client.post(url, data=campaign_data)
         response.raise_for_status()
+        cache.invalidate("campaigns", ad_account_id)
         return f"Campaign created with ID: {response.json().get('id')}"
     except requests.exceptions.RequestException as e:
         return f"Error creating campaign: {str(e)}"
@@ -72,11 +83,13 @@ def delete_facebook_campaign(campaign_id: str) -> str:
     """
     try:
         url = f"{fb_base_url}{campaign_id}"
-        response = requests.delete(url, params={"access_token": fb_access_token})
+        response = http_client.delete(url, params={"access_token": fb_access_token})
         response.raise_for_status()
         result = response.json()
 
         if result.get("success"):
+            # The owning account is not known here, so drop every cached campaign (and ad set) listing
+            cache.invalidate_many([("campaigns", None), ("adsets", None)])
             return f"✅ Campaign with ID `{campaign_id}` deleted successfully."
         else:
             return f"❌ Failed to delete campaign `{campaign_id}`. Response: {result}"
@@ -1,6 +1,7 @@
 import requests
 from config.settings import fb_access_token, fb_base_url
 from utils.server import myserver
+from utils import http_client
 
 
 @myserver.tool()
@@ -51,7 +52,7 @@ def create_catalog_creative(
 
     # Make the request
     try:
-        response = requests.post(url, data=payload)
+        response = http_client.post(url, data=payload)
         response.raise_for_status()
         creative_id = response.json().get("id")
         return f"Catalog creative created successfully with ID: `{creative_id}`"
@@ -1,28 +1,35 @@
 import requests
 from config.settings import fb_base_url, fb_access_token
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 
 @myserver.tool()
 def get_facebook_catalogs(business_account_id: str) -> str:
     """Fetches the product catalogs for a specific business account which can get by using the get_facebook_business_accounts tool
     and shows them to the user with their name and id."""
-    print(f"Tool Called: get_facebook_catalogs")
+    log.debug("fetching catalogs", business_account_id=business_account_id)
     url = f"{fb_base_url}{business_account_id}/owned_product_catalogs"
 
-    try:
-        response = requests.get(url, params={"access_token": fb_access_token})
+    def load():
+        response = http_client.get(url, params={"access_token": fb_access_token})
         response.raise_for_status()
-        data = response.json()
+        return response.json().get("data", [])
 
-        catalogs = data.get("data", [])
+    try:
+        catalogs = cache.get_or_set("catalogs", business_account_id, load)
         if not catalogs:
             return "No product catalogs found for this business account."
 
         # return "Here are the product catalogs:\n" + "\n".join(
         #     [f"- {cat.get('name', 'Unnamed')} (ID: {cat['id']})" for cat in catalogs]
         # )
-        return catalogs
+        return fit_to_budget(catalogs, "catalogs", ["id", "name"])
 
     except requests.exceptions.HTTPError as http_err:
         return f"Facebook API error: {http_err.response.json().get('error', {}).get('message', str(http_err))}"
@@ -45,8 +52,9 @@ def create_facebook_catalog(business_id: str, catalog_name: str) -> str:
     }
 
     try:
-        response = requests.post(url, data=data)
+        response = http_client.post(url, data=data)
         response.raise_for_status()
+        cache.invalidate("catalogs", business_id)
         return f"Catalog created with ID: {response.json().get('id')}"
     except requests.exceptions.RequestException as e:
         return f"Error creating catalog: {str(e)}"
@@ -67,11 +75,12 @@ def delete_facebook_catalog(catalog_id: str) -> str:
     """
     try:
         url = f"{fb_base_url}{catalog_id}"
-        response = requests.delete(url, params={"access_token": fb_access_token})
+        response = http_client.delete(url, params={"access_token": fb_access_token})
         response.raise_for_status()
         result = response.json()
 
         if result.get("success"):
+            cache.invalidate("catalogs")
             return f"Catalog with ID `{catalog_id}` deleted successfully."
         else:
             return f"Failed to delete catalog `{catalog_id}`. Response: {result}"
@@ -0,0 +1,213 @@
+"""
+Server-side copies of campaigns and ad sets through the Graph `/{id}/copies` edge.
+
+Small trees are copied synchronously in one call. A deep copy with more children than the Graph
+API copies synchronously runs as an async batch request instead: the tool polls it while the call's
+time budget allows and otherwise returns the request-set ID for `get_copy_status`.
+"""
+import json
+import time
+from urllib.parse import urlencode
+
+import requests
+from config.settings import fb_access_token, fb_base_url, COPY_SYNC_MAX_CHILDREN, COPY_WAIT_SECONDS
+from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import deadline, http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+STATUS_OPTIONS = ("PAUSED", "ACTIVE", "INHERITED_FROM_SOURCE")
+RENAME_STRATEGIES = ("DEEP_RENAME", "ONLY_TOP_LEVEL_RENAME", "NO_RENAME")
+
+
+def _copy_options(deep_copy: bool, status_option: str, rename_strategy: str, rename_suffix: str | None) -> dict:
+    rename = {"rename_strategy": rename_strategy}
+    if rename_strategy != "NO_RENAME" and rename_suffix:
+        rename["rename_suffix"] = rename_suffix
+    return {
+        "deep_copy": "true" if deep_copy else "false",
+        "status_option": status_option,
+        "rename_options": json.dumps(rename),
+    }
+
+
+def _tree_size(object_id: str, edges: str) -> tuple[str, int]:
+    """Owning ad account and the number of child objects a deep copy would duplicate."""
+    fields = ",".join(["account_id"] + [f"{edge}.limit(0).summary(true)" for edge in edges.split(",")])
+    response = http_client.get(f"{fb_base_url}{object_id}", params={"fields": fields, "access_token": fb_access_token})
+    response.raise_for_status()
+    data = response.json()
+    children = sum(data.get(edge, {}).get("summary", {}).get("total_count", 0) for edge in edges.split(","))
+    return f"act_{data['account_id']}" if "account_id" in data else "", children
+
+
+def _start_async_copy(ad_account_id: str, object_id: str, options: dict, name: str) -> str:
+    batch = [{"name": name, "relative_url": f"{object_id}/copies", "body": urlencode(options)}]
+    response = http_client.post(f"{fb_base_url}{ad_account_id}/async_batch_requests", data={
+        "name": name,
+        "adbatch": json.dumps(batch),
+        "access_token": fb_access_token,
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def _async_status(request_set_id: str) -> dict:
+    response = http_client.get(f"{fb_base_url}{request_set_id}", params={
+        "fields": "id,name,is_completed,total_count,initial_count,in_progress_count,success_count,error_count",
+        "access_token": fb_access_token,
+    })
+    response.raise_for_status()
+    status = response.json()
+    if status.get("is_completed"):
+        response = http_client.get(f"{fb_base_url}{request_set_id}/requests", params={
+            "fields": "id,status,result", "access_token": fb_access_token})
+        response.raise_for_status()
+        status["results"] = response.json().get("data", [])
+    return status
+
+
+def _wait(request_set_id: str) -> dict:
+    """Poll an async copy until it completes or the wait budget (or the call's deadline) runs out."""
+    waited_until = time.monotonic() + COPY_WAIT_SECONDS
+    interval = 1.0
+    status = _async_status(request_set_id)
+    while not status.get("is_completed") and time.monotonic() + interval < waited_until \
+            and deadline.has_time_for(interval + 2):
+        time.sleep(interval)
+        interval = min(interval * 1.5, 10.0)
+        status = _async_status(request_set_id)
+    return status
+
+
+def _summarize(result: dict) -> dict:
+    """Copy result with a count per object type; long ID lists are shaped to the result budget."""
+    ids = result.get("ad_object_ids", [])
+    counts: dict = {}
+    for item in ids:
+        counts[item.get("ad_object_type")] = counts.get(item.get("ad_object_type"), 0) + 1
+    summary = {k: v for k, v in result.items() if k != "ad_object_ids"}
+    summary["copied_objects"] = counts
+    summary["ad_object_ids"] = fit_to_budget(ids, "copied objects", ["ad_object_type", "source_id", "copied_id"])
+    return summary
+
+
+def _report(kind: str, request_set_id: str, status: dict) -> dict | str:
+    if not status.get("is_completed"):
+        return (f"The {kind} copy is still running in the background (request set {request_set_id}, "
+                f"{status.get('success_count', 0)} of {status.get('total_count', '?')} done). "
+                f"Call `get_copy_status` with request_set_id=\"{request_set_id}\" to check on it.")
+    return {
+        "request_set_id": request_set_id,
+        "success_count": status.get("success_count"),
+        "error_count": status.get("error_count"),
+        "results": [_summarize(json.loads(r["result"]) if isinstance(r.get("result"), str) else r.get("result") or {})
+                    | {"status": r.get("status")} for r in status.get("results", [])],
+    }
+
+
+def _copy(kind: str, object_id: str, edges: str, options: dict, extra: dict) -> dict | str:
+    ad_account_id, children = "", 0
+    if options["deep_copy"] == "true":
+        ad_account_id, children = _tree_size(object_id, edges)
+    if children > COPY_SYNC_MAX_CHILDREN and ad_account_id:
+        log.info("copying asynchronously", kind=kind, object_id=object_id, children=children)
+        request_set_id = _start_async_copy(ad_account_id, object_id, {**options, **extra}, f"copy {kind} {object_id}")
+        return _report(kind, request_set_id, _wait(request_set_id))
+
+    response = http_client.post(f"{fb_base_url}{object_id}/copies",
+                                data={**options, **extra, "access_token": fb_access_token})
+    response.raise_for_status()
+    return _summarize(response.json())
+
+
+@myserver.tool()
+def copy_campaign(campaign_id: str, deep_copy: bool = True, status_option: str = "PAUSED",
+                  rename_strategy: str = "DEEP_RENAME", rename_suffix: str = " - Copy") -> dict | str:
+    """
+    Duplicate a campaign on Facebook's side, including its ad sets and ads when deep_copy is true.
+    Use this instead of re-creating a campaign object by object. Ask the user before copying.
+
+    Parameters:
+    - campaign_id: ID of the campaign to copy (from 'get_facebook_campaigns')
+    - deep_copy: also copy the campaign's ad sets and ads (default true)
+    - status_option: status of the copies, one of "PAUSED", "ACTIVE", "INHERITED_FROM_SOURCE"
+    - rename_strategy: "DEEP_RENAME" (rename every copied object), "ONLY_TOP_LEVEL_RENAME" or "NO_RENAME"
+    - rename_suffix: text appended to the names of renamed copies
+
+    Returns:
+    - The Graph copy result (`copied_campaign_id` and the IDs of all copied objects), or, for a
+      large campaign that is still copying, a message with a request set ID for `get_copy_status`.
+    """
+    if status_option not in STATUS_OPTIONS:
+        return f"status_option must be one of: {', '.join(STATUS_OPTIONS)}."
+    if rename_strategy not in RENAME_STRATEGIES:
+        return f"rename_strategy must be one of: {', '.join(RENAME_STRATEGIES)}."
+    try:
+        result = _copy("campaign", campaign_id, "adsets,ads",
+                       _copy_options(deep_copy, status_option, rename_strategy, rename_suffix), {})
+        cache.invalidate_many([("campaigns", None), ("adsets", None)])
+        return result
+    except requests.exceptions.HTTPError as http_err:
+        return f"Error copying campaign: {http_err} - {http_err.response.text}"
+    except requests.exceptions.RequestException as e:
+        return f"Error copying campaign: {str(e)}"
+
+
+@myserver.tool()
+def copy_ad_set(ad_set_id: str, campaign_id: str | None = None, deep_copy: bool = True,
+                status_option: str = "PAUSED", rename_strategy: str = "DEEP_RENAME",
+                rename_suffix: str = " - Copy") -> dict | str:
+    """
+    Duplicate an ad set on Facebook's side, including its ads when deep_copy is true.
+    Ask the user before copying.
+
+    Parameters:
+    - ad_set_id: ID of the ad set to copy (from 'fetch_ad_sets')
+    - campaign_id: campaign to put the copy in; leave empty to copy into the same campaign
+    - deep_copy: also copy the ad set's ads (default true)
+    - status_option: status of the copies, one of "PAUSED", "ACTIVE", "INHERITED_FROM_SOURCE"
+    - rename_strategy: "DEEP_RENAME", "ONLY_TOP_LEVEL_RENAME" or "NO_RENAME"
+    - rename_suffix: text appended to the names of renamed copies
+
+    Returns:
+    - The Graph copy result (`copied_adset_id` and the IDs of all copied objects), or a message with
+      a request set ID for `get_copy_status` when a large copy is still running.
+    """
+    if status_option not in STATUS_OPTIONS:
+        return f"status_option must be one of: {', '.join(STATUS_OPTIONS)}."
+    if rename_strategy not in RENAME_STRATEGIES:
+        return f"rename_strategy must be one of: {', '.join(RENAME_STRATEGIES)}."
+    try:
+        result = _copy("ad set", ad_set_id, "ads",
+                       _copy_options(deep_copy, status_option, rename_strategy, rename_suffix),
+                       {"campaign_id": campaign_id} if campaign_id else {})
+        cache.invalidate("adsets")
+        return result
+    except requests.exceptions.HTTPError as http_err:
+        return f"Error copying ad set: {http_err} - {http_err.response.text}"
+    except requests.exceptions.RequestException as e:
+        return f"Error copying ad set: {str(e)}"
+
+
+@myserver.tool()
+def get_copy_status(request_set_id: str) -> dict | str:
+    """
+    Check on a campaign or ad set copy that `copy_campaign` / `copy_ad_set` left running in the background.
+
+    Parameters:
+    - request_set_id: the request set ID the copy tool returned
+
+    Returns:
+    - The copy result once it is complete, otherwise a progress message.
+    """
+    try:
+        status = _async_status(request_set_id)
+        if status.get("is_completed"):
+            cache.invalidate_many([("campaigns", None), ("adsets", None)])
+        return _report("campaign/ad set", request_set_id, status)
+    except requests.exceptions.RequestException as e:
+        return f"Error checking copy status: {str(e)}"
@@ -2,6 +2,8 @@ import json
 from config.settings import fb_base_url, fb_access_token
 import requests
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
 
 
 @myserver.tool()
@@ -31,13 +33,17 @@ def get_facebook_ads(ad_account_id: str, ad_set_id: str = None, campaign_id: str
         if campaign_id:
             params["campaign_id"] = campaign_id
 
-        response = requests.get(base_url, params=params)
+        response = http_client.get(base_url, params=params)
         response.raise_for_status()
         ads = response.json().get("data", [])
 
         if not ads:
             return "No ads found for the given ad account."
 
+        shaped = fit_to_budget(ads, "ads", ["id", "name", "status", "adset_id", "creative.id"])
+        if isinstance(shaped, str):
+            return shaped
+
         result_lines = []
         for ad in ads:
             creative_id = ad.get("creative", {}).get("id", "N/A")
@@ -64,6 +70,7 @@ def create_facebook_ad(
 ) -> str:
     """
     Creates a Facebook ad in the specified ad account.
+    If the user names the ad account or ad set, use 'resolve_facebook_ids' to get their IDs.
 
     Parameters:
     - ad_account_id: Facebook Ad Account ID
@@ -82,7 +89,7 @@ def create_facebook_ad(
     try:
         # Check for existing payment methods
         payment_methods_url = f"{fb_base_url}{ad_account_id}/paymentmethods"
-        payment_check = requests.get(payment_methods_url, params={"access_token": fb_access_token})
+        payment_check = http_client.get(payment_methods_url, params={"access_token": fb_access_token})
         has_payment_method = (
             payment_check.status_code == 200 and payment_check.json().get("data")
         )
@@ -90,7 +97,7 @@ def create_facebook_ad(
         # If no payment method, attempt manual setup
         if not has_payment_method:
             account_url = f"{fb_base_url}{ad_account_id}?fields=currency"
-            account_info = requests.get(account_url, params={"access_token": fb_access_token})
+            account_info = http_client.get(account_url, params={"access_token": fb_access_token})
             account_info.raise_for_status()
             currency = account_info.json().get("currency", "USD")
 
@@ -101,7 +108,7 @@ def create_facebook_ad(
                 "access_token": fb_access_token,
             }
             setup_url = f"{fb_base_url}{ad_account_id}/paymentmethods"
-            setup_response = requests.post(setup_url, data=setup_data)
+            setup_response = http_client.post(setup_url, data=setup_data)
 
             if setup_response.status_code != 200:
                 return f"Failed to create manual payment method: {setup_response.text}"
@@ -123,7 +130,7 @@ def create_facebook_ad(
 
         # Make the ad creation call
         ad_url = f"{fb_base_url}{ad_account_id}/ads"
-        ad_response = requests.post(ad_url, data=ad_payload)
+        ad_response = http_client.post(ad_url, data=ad_payload)
         ad_response.raise_for_status()
 
         ad_id = ad_response.json().get("id")
@@ -146,7 +153,7 @@ def delete_facebook_ad(ad_id: str) -> str:
     """
     try:
         url = f"{fb_base_url}{ad_id}"
-        response = requests.delete(url, params={"access_token": fb_access_token})
+        response = http_client.delete(url, params={"access_token": fb_access_token})
         response.raise_for_status()
         result = response.json()
 
@@ -0,0 +1,187 @@
+"""
+Cross-account listings: campaigns, ad sets or ads of every ad account (or a chosen set) in one call.
+
+Accounts are queried concurrently (FANOUT_CONCURRENCY, reduced when the app nears its rate limit).
+Accounts close to their own limit are skipped rather than pushed over it, and a throttled or failing
+account is reported next to the merged results instead of failing the whole call. An account that
+reaches its limit partway keeps the rows read so far, reported as partial.
+"""
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+from config.settings import (fb_access_token, fb_base_url, FANOUT_CONCURRENCY, RATE_LIMIT_SKIP_PCT,
+                             RATE_LIMIT_SLOW_PCT)
+from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import deadline, http_client, rate_limits
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+# Pause between pages of an account that is close to its rate limit
+SLOW_PAGE_PAUSE = 1.0
+# How long a throttled account is left alone when Facebook doesn't say
+THROTTLE_BACKOFF_SECONDS = 60
+
+
+class AccountSkipped(Exception):
+    def __init__(self, message: str, rows: List[Dict[str, Any]] | None = None):
+        super().__init__(message)
+        self.rows = rows or []  # read before the account was skipped
+
+
+def _pages(url: str, params: Dict[str, Any] | None, ad_account_id: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    while url:
+        response = http_client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        rows.extend(data.get("data", []))
+        url, params = data.get("paging", {}).get("next"), None  # the next URL carries all parameters
+        if url:
+            pct, regain = rate_limits.usage(ad_account_id)
+            if regain > 0 or pct >= RATE_LIMIT_SKIP_PCT:
+                raise AccountSkipped(f"stopped after {len(rows)} rows (kept in the results): the account "
+                                     f"reached {pct:.0f}% of its rate limit", rows)
+            if pct >= RATE_LIMIT_SLOW_PCT:
+                time.sleep(SLOW_PAGE_PAUSE)
+    return rows
+
+
+def _accounts(ad_account_ids: List[str] | None) -> List[Dict[str, Any]]:
+    if ad_account_ids:
+        return [{"id": a if a.startswith("act_") else f"act_{a}", "name": None} for a in ad_account_ids]
+    return _pages(f"{fb_base_url}me/adaccounts", {"fields": "id,name", "limit": 500, "access_token": fb_access_token},
+                  "")
+
+
+def _error_message(error: Exception, ad_account_id: str) -> str:
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        try:
+            details = error.response.json().get("error", {})
+        except ValueError:
+            details = {}
+        if details.get("code") in rate_limits.THROTTLE_CODES or error.response.status_code == 429:
+            retry = rate_limits.usage(ad_account_id)[1] or THROTTLE_BACKOFF_SECONDS
+            rate_limits.throttled(ad_account_id, retry)
+            return f"rate limited by Facebook, retry in about {retry:.0f} s"
+        return f"{error.response.status_code}: {details.get('message') or error.response.text[:200]}"
+    return str(error)
+
+
+def _fan_out(edge: str, fields: str, status: str | None, ad_account_ids: List[str] | None,
+             kind: str, columns: List[str]) -> Dict[str, Any] | str:
+    try:
+        accounts = _accounts(ad_account_ids)
+    except requests.exceptions.RequestException as e:
+        return f"Error listing ad accounts: {str(e)}"
+    if not accounts:
+        return "No ad accounts found for this user."
+
+    params: Dict[str, Any] = {"fields": fields, "limit": 500, "access_token": fb_access_token}
+    if status:
+        params["filtering"] = json.dumps([{"field": "effective_status", "operator": "IN", "value": [status.upper()]}])
+
+    def query(account: Dict[str, Any]) -> List[Dict[str, Any]]:
+        pct, regain = rate_limits.usage(account["id"])
+        if regain > 0 or pct >= RATE_LIMIT_SKIP_PCT:
+            raise AccountSkipped(f"skipped: the account is at {pct:.0f}% of its rate limit"
+                                 + (f", retry in about {regain:.0f} s" if regain else ""))
+        if not deadline.has_time_for(2):
+            raise AccountSkipped("skipped: the call ran out of time")
+        return _pages(f"{fb_base_url}{account['id']}/{edge}", dict(params), account["id"])
+
+    concurrency = FANOUT_CONCURRENCY
+    if rate_limits.usage("app")[0] >= RATE_LIMIT_SLOW_PCT:
+        concurrency = max(1, FANOUT_CONCURRENCY // 4)
+    started = time.monotonic()
+    rows: List[Dict[str, Any]] = []
+    failures: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [(account, pool.submit(contextvars.copy_context().run, query, account)) for account in accounts]
+        for account, future in futures:
+            try:
+                account_rows = future.result()
+            except (AccountSkipped, requests.exceptions.RequestException) as e:
+                failure = {"ad_account_id": account["id"], "ad_account_name": account["name"],
+                           "error": _error_message(e, account["id"])}
+                account_rows = getattr(e, "rows", None)
+                if account_rows:
+                    failure["partial"] = True
+                failures.append(failure)
+            rows.extend({**row, "ad_account_id": account["id"], "ad_account_name": account["name"]}
+                        for row in account_rows or [])
+    partial = sum(bool(f.get("partial")) for f in failures)
+    log.info("fan-out finished", edge=edge, accounts=len(accounts), failed=len(failures) - partial, partial=partial,
+             rows=len(rows), seconds=round(time.monotonic() - started, 2))
+    return {
+        "accounts_queried": len(accounts),
+        "accounts_failed": len(failures) - partial,
+        "accounts_partial": partial,
+        "total": len(rows),
+        "results": fit_to_budget(rows, kind, columns),
+        "failures": failures,
+    }
+
+
+@myserver.tool()
+def get_campaigns_all_accounts(status: str = None, ad_account_ids: list[str] = None) -> dict | str:
+    """
+    List campaigns across all of the user's ad accounts in one call, e.g. "all active campaigns across
+    every account". Use this instead of calling 'get_facebook_campaigns' once per account.
+
+    Parameters:
+    - status: optional effective status filter, e.g. "ACTIVE", "PAUSED", "ARCHIVED"
+    - ad_account_ids: optional, only these ad accounts (default: every account the user can access)
+
+    Returns:
+    - `results`: one table of campaigns with their ad_account_id and ad_account_name,
+      `failures`: accounts that could not be queried (e.g. rate limited) with the reason; an entry with
+      `partial: true` was stopped partway and the rows read before that are in `results`,
+      and the counts `accounts_queried`, `accounts_failed`, `accounts_partial` and `total`.
+    """
+    log.debug("fetching campaigns across accounts", status=status)
+    return _fan_out("campaigns", "id,name,status,effective_status,objective,daily_budget,lifetime_budget", status,
+                    ad_account_ids, "campaigns", ["ad_account_id", "id", "name", "effective_status", "objective"])
+
+
+@myserver.tool()
+def get_ad_sets_all_accounts(status: str = None, ad_account_ids: list[str] = None) -> dict | str:
+    """
+    List ad sets across all of the user's ad accounts in one call.
+    Use this instead of calling 'fetch_ad_sets' once per account.
+
+    Parameters:
+    - status: optional effective status filter, e.g. "ACTIVE", "PAUSED", "CAMPAIGN_PAUSED"
+    - ad_account_ids: optional, only these ad accounts (default: every account the user can access)
+
+    Returns:
+    - `results`: one table of ad sets (with campaign_id, ad_account_id and ad_account_name),
+      `failures`: accounts that could not be queried with the reason, and the counts.
+    """
+    log.debug("fetching ad sets across accounts", status=status)
+    return _fan_out("adsets", "id,name,status,effective_status,campaign_id,daily_budget,optimization_goal", status,
+                    ad_account_ids, "ad sets", ["ad_account_id", "id", "name", "effective_status", "campaign_id"])
+
+
+@myserver.tool()
+def get_ads_all_accounts(status: str = None, ad_account_ids: list[str] = None) -> dict | str:
+    """
+    List ads across all of the user's ad accounts in one call.
+    Use this instead of calling 'get_facebook_ads' once per account.
+
+    Parameters:
+    - status: optional effective status filter, e.g. "ACTIVE", "PAUSED", "ADSET_PAUSED", "DISAPPROVED"
+    - ad_account_ids: optional, only these ad accounts (default: every account the user can access)
+
+    Returns:
+    - `results`: one table of ads (with adset_id, campaign_id, creative, ad_account_id and ad_account_name),
+      `failures`: accounts that could not be queried with the reason, and the counts.
+    """
+    log.debug("fetching ads across accounts", status=status)
+    return _fan_out("ads", "id,name,status,effective_status,adset_id,campaign_id,creative", status,
+                    ad_account_ids, "ads", ["ad_account_id", "id", "name", "effective_status", "adset_id"])
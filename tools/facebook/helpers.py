@@ -1,6 +1,11 @@
 import requests
 from config.settings import fb_access_token, fb_base_url
 from utils.server import myserver
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 
 @myserver.tool()
@@ -18,7 +23,7 @@ def search_interests(query: str) -> list:
     - A list of matching interest dicts with `id` and `name`
     """
 
-    print("Search interest called")
+    log.debug("searching interests", query=query)
 
     url = f'{fb_base_url}search'
     params = {
@@ -28,10 +33,14 @@ def search_interests(query: str) -> list:
         'limit': 5
     }
 
-    try:
-        response = requests.get(url, params=params)
+    def load():
+        response = http_client.get(url, params=params)
         response.raise_for_status()
         return response.json().get('data', [])
+
+    try:
+        # Same keyword, different spelling/casing -> same cache entry
+        return cache.get_or_set("interests", " ".join(query.lower().split()), load)
     except requests.exceptions.RequestException as e:
         return [{"error": f"Error searching interests: {str(e)}"}]
 
@@ -48,7 +57,6 @@ def get_behavior_ids() -> dict:
     Returns:
     - A dictionary where keys are behavior names and values are their corresponding Facebook behavior IDs.
     """
-    print("Get behaviour ids called")
 
     return {
         "Small Business Owners": "6071631541183",
@@ -0,0 +1,116 @@
+"""
+Launch plans: create a campaign with its ad sets, catalog creatives and ads in one call.
+See utils/launch.py for validation, the dependency levels and batching.
+"""
+from collections import Counter
+
+from utils.server import myserver
+from utils import launch
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+
+@myserver.tool()
+def validate_launch_plan(plan: dict) -> dict | str:
+    """
+    Check a launch plan locally, without creating anything or calling Facebook: enums, budgets,
+    age ranges, country codes and references between the plan's objects.
+    Returns the objects per kind and per creation level (each level is created at once), or every problem found.
+    The plan format is described in 'execute_launch_plan'.
+    """
+    try:
+        _, nodes = launch.parse(plan)
+        plan_levels = launch.levels(nodes)
+    except launch.PlanError as e:
+        return str(e)
+    return {"valid": True, "objects": dict(Counter(n.kind for n in nodes)),
+            "levels": [dict(Counter(n.kind for n in level)) for level in plan_levels],
+            "batch_calls": launch.batch_calls(plan_levels)}
+
+
+@myserver.tool()
+def execute_launch_plan(plan: dict, on_failure: str = "rollback") -> dict | str:
+    """
+    Create a whole launch in one call: campaigns, their ad sets, catalog creatives and ads.
+    Use this instead of calling 'create_fb_campaign', 'create_ad_set', 'create_catalog_creative' and
+    'create_facebook_ad' one object at a time whenever more than a couple of objects are needed.
+
+    Collect the details from the user first (use 'resolve_facebook_ids', 'search_interests' and
+    'get_behaviour_ids' for IDs), and confirm the plan with the user before executing it.
+
+    Plan format (every object has a unique `key`; `campaign`, `ad_set` and `creative` refer to a key of
+    the plan or to the ID of an existing object):
+    {
+      "ad_account_id": "act_123",
+      "campaigns": [{"key": "c1", "name": "Summer sale", "objective": "OUTCOME_SALES"}],
+      "ad_sets": [{"key": "s1", "campaign": "c1", "name": "US 18-35", "daily_budget": 2000,
+                   "billing_event": "IMPRESSIONS", "optimization_goal": "LINK_CLICKS",
+                   "bid_strategy": "LOWEST_COST_WITHOUT_CAP", "countries": ["US"], "age_min": 18, "age_max": 35,
+                   "interests": [{"id": "6003139266461", "name": "Shoes"}]}],
+      "creatives": [{"key": "cr1", "name": "DPA creative", "catalog_id": "123", "product_set_id": "default",
+                     "template_url": "https://shop.example.com/p/{{product.retailer_id}}"}],
+      "ads": [{"key": "a1", "ad_set": "s1", "creative": "cr1", "name": "Ad 1", "is_catalog_ad": true}]
+    }
+    - campaigns: name, objective (OUTCOME_AWARENESS, OUTCOME_TRAFFIC, OUTCOME_ENGAGEMENT, OUTCOME_LEADS,
+      OUTCOME_APP_PROMOTION, OUTCOME_SALES, OUTCOME_LOCAL_AWARENESS, OUTCOME_VIDEO_VIEWS), status
+    - ad_sets: campaign, name, daily_budget (cents, min 1000), billing_event, optimization_goal, bid_strategy,
+      countries (ISO codes), age_min/age_max (13-65), optional interests/behaviors, status
+    - creatives: name, catalog_id, product_set_id (default "default"), template_url
+    - ads: ad_set, creative, name, is_catalog_ad, status
+    Status defaults to "PAUSED" everywhere.
+
+    Parameters:
+    - plan: the launch plan
+    - on_failure: "rollback" (default) deletes everything this launch created when any object fails;
+      "keep" keeps it, so 'resume_launch_plan' can finish the launch after the problem is fixed
+
+    Returns:
+    - launch_id, status ("succeeded", "failed" or "rolled_back"), the created IDs per plan key,
+      errors per plan key, and the keys still pending.
+    """
+    if on_failure not in ("rollback", "keep"):
+        return "on_failure must be 'rollback' or 'keep'."
+    try:
+        account, nodes = launch.parse(plan)
+        launch.levels(nodes)
+    except launch.PlanError as e:
+        return str(e)
+    state = launch.new_state(plan, account)
+    log.info("executing launch plan", launch_id=state["id"], ad_account_id=account, objects=len(nodes))
+    return launch.run(state, nodes, rollback_on_failure=on_failure == "rollback")
+
+
+@myserver.tool()
+def resume_launch_plan(launch_id: str, plan: dict = None, on_failure: str = "keep") -> dict | str:
+    """
+    Continue a launch that failed with on_failure="keep": objects it already created are kept and
+    not created again, the rest are created.
+
+    Parameters:
+    - launch_id: from 'execute_launch_plan'
+    - plan: optional corrected plan (same keys); by default the original plan is retried as is,
+      which is right for temporary errors such as rate limits. Objects already created are not updated.
+    - on_failure: "keep" (default) or "rollback" (deletes everything the launch created so far)
+
+    Returns:
+    - The same summary as 'execute_launch_plan'.
+    """
+    if on_failure not in ("rollback", "keep"):
+        return "on_failure must be 'rollback' or 'keep'."
+    state = launch.load(launch_id)
+    if state is None:
+        return f"Unknown or expired launch '{launch_id}'."
+    if state["status"] in (launch.SUCCEEDED, launch.ROLLED_BACK):
+        return f"Launch '{launch_id}' is {state['status'].replace('_', ' ')}; there is nothing to resume."
+    try:
+        account, nodes = launch.parse(plan or state["plan"])
+        launch.levels(nodes)
+    except launch.PlanError as e:
+        return str(e)
+    if account != state["ad_account_id"]:
+        return f"Launch '{launch_id}' was for {state['ad_account_id']}; the plan is for {account}."
+    if plan:
+        state["plan"] = plan
+    log.info("resuming launch plan", launch_id=launch_id, created=len(state["created"]), objects=len(nodes))
+    return launch.run(state, nodes, rollback_on_failure=on_failure == "rollback")
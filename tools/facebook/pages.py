@@ -1,6 +1,9 @@
 import requests
 from config.settings import fb_access_token, fb_base_url
 from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils import http_client
+from utils.cache import cache
 
 
 @myserver.tool()
@@ -18,16 +21,18 @@ def fetch_facebook_page_ids():
         "fields": "id,name"
     }
 
-    try:
-        response = requests.get(url, params=params)
+    def load():
+        response = http_client.get(url, params=params)
         response.raise_for_status()
-        data = response.json()
-        pages = data.get("data", [])
+        return response.json().get("data", [])
+
+    try:
+        pages = cache.get_or_set("pages", "me", load)
 
         if not pages:
             return "No Facebook pages found for this user."
 
-        return [(page["id"], page["name"]) for page in pages]
+        return fit_to_budget([(page["id"], page["name"]) for page in pages], "pages", ["0", "1"])
 
     except requests.exceptions.RequestException as e:
         return f"Error fetching Facebook pages: {str(e)}"
@@ -1,8 +1,16 @@
 import json
+import time
 from typing import Any, Dict, Union, List
 import requests
+from mcp.server.fastmcp import Context
 from config.settings import fb_base_url, fb_access_token
 from utils.server import myserver
+from utils.jobs import manager
+from utils.shaping import fit_to_budget
+from utils import deadline, exports, http_client, product_index
+from utils.logger import get_logger
+
+log = get_logger(__name__)
 
 
 @myserver.tool()
@@ -10,8 +18,10 @@ def fetch_products_from_catalog(catalog_id: str) -> str:
     """
     Fetches all products from a Facebook catalog by catalog ID.
     Products will be shown to the user with their name, description, price, and image URL.
+    To find particular products use `search_catalog_products`; for the whole catalog as a file use
+    `start_export_catalog_products`.
     """
-    print(f"Tool Called: fetch_products_from_catalog with catalog_id: {catalog_id}")
+    log.debug("fetching catalog products", catalog_id=catalog_id)
 
     products: List[Dict[str, Any]] = []
     base_url = f"{fb_base_url}{catalog_id}/products"
@@ -35,9 +45,11 @@ def fetch_products_from_catalog(catalog_id: str) -> str:
             error_payload["error"]["data"] = data
         return json.dumps(error_payload)
 
+    truncated = False
     try:
         while True:
-            response = requests.get(base_url, params=params)
+            page_started = time.monotonic()
+            response = http_client.get(base_url, params=params)
             response.raise_for_status()  # Raises HTTPError for bad responses (4xx or 5xx)
             data: Dict[str, Any] = response.json()
 
@@ -54,6 +66,10 @@ def fetch_products_from_catalog(catalog_id: str) -> str:
             next_page = data.get('paging', {}).get('next')
             if not next_page:
                 break  # No more pages
+            # Keep what we have rather than start a page that would run past the call's deadline
+            if not deadline.has_time_for(2 * (time.monotonic() - page_started)):
+                truncated = True
+                break
 
             base_url = next_page  # Use the full URL for the next page
 
@@ -70,11 +86,21 @@ def fetch_products_from_catalog(catalog_id: str) -> str:
             }
             return json.dumps(success_payload_no_products)
 
-        # Transform each product dictionary into the nested 'text' format
-        content_array: List[Dict[str, str]] = [
-            {"type": "text", "text": json.dumps(product_dict)}
-            for product_dict in products
-        ]
+        shaped = fit_to_budget(products, "products", ["id", "name", "price", "availability"])
+        if isinstance(shaped, str):
+            # Over the output budget: a compact table plus a continuation handle instead of every product
+            content_array: List[Dict[str, str]] = [{"type": "text", "text": shaped}]
+        else:
+            # Transform each product dictionary into the nested 'text' format
+            content_array = [
+                {"type": "text", "text": json.dumps(product_dict)}
+                for product_dict in products
+            ]
+
+        if truncated:
+            content_array.append({"type": "text", "text": (
+                f"Only the first {len(products)} products were fetched before the time limit; "
+                f"the catalog has more.")})
 
         # Construct the final JSON-RPC success response
         final_success_payload: Dict[str, Any] = {
@@ -176,6 +202,156 @@ def fetch_products_from_catalog(catalog_id: str) -> str:
 
 
 
+def _crawl_catalog(job, catalog_id: str) -> list:
+    """Job body: every product of the catalog, page by page."""
+    url = f"{fb_base_url}{catalog_id}/products"
+    params = {
+        'access_token': fb_access_token,
+        'fields': 'id,name,description,price,image_url,url,availability',
+        'limit': 100,
+        'summary': 'true',
+    }
+    products: List[Dict[str, Any]] = []
+    while url:
+        response = http_client.get(url, params=params, revalidate=False)
+        response.raise_for_status()
+        data = response.json()
+        products.extend(data.get('data', []))
+        job.progress(len(products), data.get('summary', {}).get('total_count'), f"{len(products)} products fetched")
+        url, params = data.get('paging', {}).get('next'), None  # the next URL carries all parameters
+    return products
+
+
+@myserver.tool()
+async def start_fetch_catalog_products(catalog_id: str, ctx: Context = None) -> str:
+    """
+    Start fetching every product of a large catalog in the background and return a job ID immediately.
+    Prefer this over `fetch_products_from_catalog` for catalogs with thousands of products.
+    Follow up with `get_job_status` and, once it succeeded, `get_job_result`.
+
+    Parameters:
+    - catalog_id: ID of the Facebook catalog (from 'get_facebook_catalogs')
+    """
+    job_id = manager().submit("fetch_catalog_products", _crawl_catalog, {"catalog_id": catalog_id}, ctx=ctx,
+                              result_kind="products", result_columns=["id", "name", "price", "availability"])
+    if job_id is None:
+        return "Too many background jobs are running; try again in a minute."
+    return f"Started job {job_id}. Check it with `get_job_status` (job_id=\"{job_id}\")."
+
+
+@myserver.tool()
+def search_catalog_products(catalog_id: str, query: str = "", availability: str = None,
+                            min_price: float = None, max_price: float = None, limit: int = 20) -> dict | str:
+    """
+    Search a catalog's products by words in their name or description and/or by price and availability,
+    e.g. "out-of-stock items under $20" -> availability="out of stock", max_price=20.
+    Use this instead of `fetch_products_from_catalog` whenever the user looks for particular products.
+
+    Parameters:
+    - catalog_id: ID of the Facebook catalog (from 'get_facebook_catalogs')
+    - query: words to look for (optional)
+    - availability: optional, one of "in stock", "out of stock", "preorder", "available for order",
+      "discontinued", "pending", "mark_as_sold"
+    - min_price / max_price: optional price range in the catalog's currency (e.g. 19.99)
+    - limit: maximum number of products to return (default 20)
+
+    Returns:
+    - `total_matches` and the best `products` (id, name, price, availability, retailer_id, image_url, url).
+      `source` says whether the local index answered; the first search of a catalog is answered by
+      Facebook while the index is built in the background.
+    """
+    if availability and availability not in product_index.AVAILABILITY:
+        return f"availability must be one of: {', '.join(product_index.AVAILABILITY)}."
+    low = None if min_price is None else int(round(min_price * 100))
+    high = None if max_price is None else int(round(max_price * 100))
+    limit = max(1, min(limit, 100))
+    log.debug("searching catalog products", catalog_id=catalog_id, query=query)
+    try:
+        # A due rebuild is started first, so a failing refresh of changed products cannot hold it back
+        job_id = product_index.ensure(catalog_id)
+        index = product_index.ready(catalog_id)
+        if index is not None:
+            result = index.search(query, availability, low, high, limit)
+            result["source"] = "local index"
+        else:
+            # No index yet: let the Graph API filter instead of reading the whole catalog
+            params = {"fields": product_index.RESULT_FIELDS, "limit": limit, "summary": "true",
+                      "access_token": fb_access_token}
+            graph_filter = product_index.graph_filter(query, availability, low, high)
+            if graph_filter:
+                params["filter"] = graph_filter
+            response = http_client.get(f"{fb_base_url}{catalog_id}/products", params=params)
+            response.raise_for_status()
+            data = response.json()
+            products = data.get("data", [])
+            result = {"total_matches": data.get("summary", {}).get("total_count", len(products)),
+                      "products": products, "source": "Facebook filter"}
+            if job_id is not None:
+                result["note"] = f"A local index of this catalog is being built (job {job_id}); later searches use it."
+    except requests.exceptions.HTTPError as http_err:
+        return f"Error searching products: {http_err} - {http_err.response.text}"
+    except requests.exceptions.RequestException as e:
+        return f"Error searching products: {str(e)}"
+    result["products"] = fit_to_budget(result["products"], "products", ["id", "name", "price", "availability"])
+    return result
+
+
+@myserver.tool()
+async def start_export_catalog_products(catalog_id: str, format: str = "ndjson", ctx: Context = None) -> str:
+    """
+    Export every product of a catalog to a compressed file for analysis, in the background.
+    Returns a job ID immediately; when `get_job_status` reports success, `get_job_result` gives the
+    file's MCP resource URIs (`exports://<name>/info` and a byte-range template to read it in parts).
+
+    Parameters:
+    - catalog_id: ID of the Facebook catalog (from 'get_facebook_catalogs')
+    - format: "ndjson" (gzip-compressed, one product per line) or "parquet"
+    """
+    try:
+        exports.check_format(format)
+    except (ValueError, RuntimeError) as e:
+        return str(e)
+    job_id = manager().submit("export_catalog_products", exports.export_catalog,
+                              {"catalog_id": catalog_id, "format": format}, ctx=ctx, result_kind="export")
+    if job_id is None:
+        return "Too many background jobs are running; try again in a minute."
+    return f"Started export job {job_id}. Check it with `get_job_status` (job_id=\"{job_id}\")."
+
+
+def _delete_products(job, product_ids: list) -> dict:
+    """Job body: delete products one by one, keeping going past individual failures."""
+    deleted, failed = [], {}
+    for index, product_id in enumerate(product_ids):
+        job.check()
+        try:
+            response = http_client.delete(f"{fb_base_url}{product_id}", params={'access_token': fb_access_token})
+            response.raise_for_status()
+            deleted.append(product_id)
+        except (deadline.DeadlineExceeded, deadline.CallCancelled):
+            raise
+        except requests.exceptions.RequestException as e:
+            failed[product_id] = str(e)
+        job.progress(index + 1, len(product_ids))
+    product_index.forget(deleted)
+    return {"deleted": len(deleted), "failed": failed}
+
+
+@myserver.tool()
+async def start_delete_catalog_products(product_ids: list[str], ctx: Context = None) -> str:
+    """
+    Delete many catalog products in the background and return a job ID immediately.
+    Always show the products and ask for confirmation before deleting.
+    Follow up with `get_job_status`; `cancel_job` stops the remaining deletions.
+
+    Parameters:
+    - product_ids: IDs of the products to delete
+    """
+    job_id = manager().submit("delete_catalog_products", _delete_products, {"product_ids": product_ids}, ctx=ctx)
+    if job_id is None:
+        return "Too many background jobs are running; try again in a minute."
+    return f"Started job {job_id} to delete {len(product_ids)} products. Check it with `get_job_status` (job_id=\"{job_id}\")."
+
+
 @myserver.tool()
 def delete_catalog_product(product_id: str) -> str:
     """
@@ -189,10 +365,11 @@ def delete_catalog_product(product_id: str) -> str:
     }
 
     try:
-        response = requests.delete(url, params=params)
+        response = http_client.delete(url, params=params)
         response.raise_for_status()
         success = response.json().get('success', False)
         if success:
+            product_index.forget([product_id])
             return f"Product {product_id} deleted successfully."
         else:
             return f"Product deletion request was received but not confirmed."
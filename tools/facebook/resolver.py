@@ -0,0 +1,36 @@
+import requests
+from config.settings import fb_access_token
+from utils.server import myserver
+from utils.name_index import index_for, resolve, ENTITY_TYPES
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+
+@myserver.tool()
+def resolve_facebook_ids(query: str, entity_type: str = None, limit: int = 5) -> dict | str:
+    """
+    Turn names the user mentions into IDs in one call, e.g. "Summer Sale campaign in the EU account",
+    "Retargeting ad set under Spring Launch campaign", "Main catalog", "Acme business".
+    Use this instead of calling listing tools ('get_facebook_ad_accounts', 'get_facebook_campaigns',
+    'fetch_ad_sets', 'get_facebook_catalogs') just to find an ID. Matching is fuzzy, so typos and partial
+    names work. Use the listing tools when the user wants to see or choose from a full list.
+
+    Parameters:
+    - query: the name as the user said it; name containers with "in"/"under" to narrow it down
+      ("<name> campaign in <name> account")
+    - entity_type: optional, one of "business", "ad_account", "campaign", "adset", "catalog"
+    - limit: maximum number of matches to return (default 5)
+
+    Returns:
+    - `matches` (type, id, name, score 0-1 and the parent IDs: ad_account_id, campaign_id, business_id),
+      `scope` (the containers the query named) and `best` when one match is clearly right.
+      Without `best`, show the matches and ask the user which one they mean.
+    """
+    if entity_type and entity_type not in ENTITY_TYPES:
+        return f"entity_type must be one of: {', '.join(ENTITY_TYPES)}."
+    log.debug("resolving names", query=query, entity_type=entity_type)
+    try:
+        return resolve(index_for(fb_access_token), query, entity_type, max(1, min(limit, 25)))
+    except requests.exceptions.RequestException as e:
+        return f"Error refreshing the name index: {str(e)}"
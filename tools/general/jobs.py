@@ -0,0 +1,83 @@
+import json
+
+from utils.server import myserver
+from utils.shaping import fit_to_budget
+from utils.jobs import manager, FINISHED, SUCCEEDED
+
+
+def _status(record: dict) -> dict:
+    status = {
+        "job_id": record["id"],
+        "kind": record["kind"],
+        "status": record["status"],
+        "progress": record["progress"],
+        "total": record["total"],
+    }
+    if record["message"]:
+        status["message"] = record["message"]
+    if record["error"]:
+        status["error"] = record["error"]
+    if record["cancel_requested"] and record["status"] not in FINISHED:
+        status["status"] = "cancelling"
+    return status
+
+
+@myserver.tool()
+def get_job_status(job_id: str) -> dict | str:
+    """
+    Get the status and progress of a background job started by a `start_*` tool.
+
+    Parameters:
+    - job_id: The job ID returned by the `start_*` tool.
+
+    Returns:
+    - A dict with `status` ("queued", "running", "succeeded", "failed", "cancelled", "interrupted"),
+      `progress` and `total`, or an error message for an unknown job.
+    """
+    record = manager().store.get(job_id)
+    if record is None:
+        return f"Unknown job '{job_id}'."
+    return _status(record)
+
+
+@myserver.tool()
+def get_job_result(job_id: str):
+    """
+    Get the result of a finished background job.
+    Check `get_job_status` first; results are only available once the job has succeeded.
+
+    Parameters:
+    - job_id: The job ID returned by the `start_*` tool.
+
+    Returns:
+    - The job result (large results come back as a compact table with a handle for `fetch_more_results`),
+      or a message explaining why there is no result.
+    """
+    record = manager().store.get(job_id)
+    if record is None:
+        return f"Unknown job '{job_id}'."
+    if record["status"] != SUCCEEDED:
+        status = _status(record)
+        return f"Job '{job_id}' has no result: it is {status['status']}" + (
+            f" ({status['error']})." if "error" in status else ".")
+    try:
+        result = json.loads(record["result"])
+        columns = json.loads(record["result_columns"] or "[]")
+    except (TypeError, ValueError):
+        return f"Job '{job_id}' succeeded but its stored result is corrupt; start the job again."
+    if isinstance(result, list):
+        return fit_to_budget(result, record["result_kind"], columns or ["0"])
+    return result
+
+
+@myserver.tool()
+def cancel_job(job_id: str) -> str:
+    """
+    Cancel a queued or running background job. Work already done (e.g. deleted items) is not undone.
+
+    Parameters:
+    - job_id: The job ID returned by the `start_*` tool.
+    """
+    if manager().cancel(job_id):
+        return f"Cancellation of job '{job_id}' requested."
+    return f"Job '{job_id}' is unknown or already finished."
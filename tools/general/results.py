@@ -0,0 +1,29 @@
+from utils.server import myserver
+from utils.shaping import continue_listing
+
+
+@myserver.tool()
+def fetch_more_results(handle: str, offset: int = 0, fields: str = ""):
+    """
+    Fetch the next slice of a large listing result.
+
+    Listing tools (campaigns, ad sets, ads, products, catalogs, ...) return a compact table with a
+    continuation handle when their full result is too large. Use this tool with that handle to page
+    through the rest, or to get full details for specific fields.
+
+    Parameters:
+    - handle: The continuation handle given by the listing tool.
+    - offset: Position of the first row to return (the listing tool tells you the next offset).
+    - fields: Optional comma separated field names (e.g. "id,name,targeting" or "id,price,description").
+      When given, full values of those fields are returned instead of the compact table.
+
+    Handles are kept for 30 minutes. Unless the server shares its cache between workers, a handle
+    only works on the worker that created it; if it is reported unknown, call the listing tool again.
+
+    Returns:
+    - A compact table of the next rows, or a dict with the selected fields and the next offset.
+    """
+    if offset < 0:
+        return f"Offset must be 0 or more, got {offset}."
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    return continue_listing(handle, offset, selected)
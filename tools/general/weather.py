@@ -1,10 +1,102 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
 import requests
-from config.settings import OPEN_WEATHER_KEY
+from config.settings import OPEN_WEATHER_KEY, OPEN_WEATHER_BASE_URL, WEATHER_CONCURRENCY
 from utils.server import myserver
+from utils import http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+# OpenWeather's group endpoint takes at most 20 city IDs per call
+GROUP_SIZE = 20
+
+
+def _normalize(city_name: str) -> str:
+    # "  London, GB" and "london,gb" are the same lookup
+    return ",".join(" ".join(part.split()) for part in city_name.lower().split(","))
+
+
+def _structured(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": data["id"],
+        "name": data["name"],
+        "country": data.get("sys", {}).get("country"),
+        "temperature_c": data["main"]["temp"],
+        "description": data["weather"][0]["description"],
+        "humidity_pct": data["main"]["humidity"],
+        "wind_speed_ms": data["wind"]["speed"],
+    }
+
+
+def _fetch_by_name(city: str) -> Dict[str, Any]:
+    response = http_client.get(f"{OPEN_WEATHER_BASE_URL}weather",
+                               params={"q": city, "appid": OPEN_WEATHER_KEY, "units": "metric"})
+    if response.status_code != 200:
+        raise LookupError(f"City not found or API error ({response.status_code})")
+    weather = _structured(response.json())
+    # Remember the resolved city ID, so the next lookup of this name can go through the group endpoint
+    cache.set("weather_city_ids", city, weather["id"])
+    cache.set("weather", str(weather["id"]), weather)
+    return weather
+
+
+def _fetch_by_ids(city_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Current weather for up to GROUP_SIZE city IDs in one call."""
+    response = http_client.get(f"{OPEN_WEATHER_BASE_URL}group",
+                               params={"id": ",".join(map(str, city_ids)), "appid": OPEN_WEATHER_KEY, "units": "metric"})
+    response.raise_for_status()
+    found = {}
+    for data in response.json().get("list", []):
+        weather = _structured(data)
+        cache.set("weather", str(weather["id"]), weather)
+        found[weather["id"]] = weather
+    return found
+
+
+def _lookup(cities: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Weather per normalized city name: cache first, then the group endpoint for known IDs, then by name."""
+    results: Dict[str, Dict[str, Any]] = {}
+    ids: Dict[str, int] = {}
+    for city in cities:
+        city_id = cache.get("weather_city_ids", city)
+        weather = cache.get("weather", str(city_id)) if city_id is not None else None
+        if weather is not None:
+            results[city] = weather
+        elif city_id is not None:
+            ids[city] = city_id
+
+    by_name = [c for c in cities if c not in results and c not in ids]
+    id_list = sorted(set(ids.values()))
+    with ThreadPoolExecutor(max_workers=WEATHER_CONCURRENCY) as pool:
+        groups = [pool.submit(contextvars.copy_context().run, _fetch_by_ids, id_list[i:i + GROUP_SIZE])
+                  for i in range(0, len(id_list), GROUP_SIZE)]
+        found: Dict[int, Dict[str, Any]] = {}
+        for future in groups:
+            try:
+                found.update(future.result())
+            except requests.exceptions.RequestException as e:
+                log.warning("weather group lookup failed, falling back to single lookups", error=str(e))
+        for city, city_id in ids.items():
+            if city_id in found:
+                results[city] = found[city_id]
+            else:
+                by_name.append(city)
+
+        singles = {c: pool.submit(contextvars.copy_context().run, _fetch_by_name, c) for c in by_name}
+        for city, future in singles.items():
+            try:
+                results[city] = future.result()
+            except (LookupError, requests.exceptions.RequestException) as e:
+                results[city] = {"error": str(e)}
+    return results
 
 
 @myserver.tool()
-async def get_weather_by_city(city_name: str) -> str:
+def get_weather_by_city(city_name: str) -> str:
     """
     Get the current weather for a given city.
     Always ask the user for a city first.
@@ -15,29 +107,36 @@ async def get_weather_by_city(city_name: str) -> str:
     Returns:
         str: Weather information like temperature, description, humidity, and wind speed etc.
     """
-    print("Used weather tool")
-
-    api_key = OPEN_WEATHER_KEY
-    base_url = "http://api.openweathermap.org/data/2.5/weather"
-
-    params = {
-        "q": city_name,
-        "appid": api_key,
-        "units": "metric"
-    }
+    log.debug("fetching weather", city_name=city_name)
 
     try:
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            return (
-                f"Weather in {data['name']}:\n"
-                f"- Temperature: {data['main']['temp']}°C\n"
-                f"- Description: {data['weather'][0]['description']}\n"
-                f"- Humidity: {data['main']['humidity']}%\n"
-                f"- Wind Speed: {data['wind']['speed']} m/s"
-            )
-        else:
-            return f"Error: City not found or API error ({response.status_code})"
+        data = _lookup([_normalize(city_name)])[_normalize(city_name)]
     except Exception as e:
         return f"Exception occurred: {str(e)}"
+    if "error" in data:
+        return f"Error: {data['error']}"
+    return (
+        f"Weather in {data['name']}:\n"
+        f"- Temperature: {data['temperature_c']}°C\n"
+        f"- Description: {data['description']}\n"
+        f"- Humidity: {data['humidity_pct']}%\n"
+        f"- Wind Speed: {data['wind_speed_ms']} m/s"
+    )
+
+
+@myserver.tool()
+def get_weather_for_cities(city_names: list[str]) -> list[dict]:
+    """
+    Get the current weather for several cities at once (e.g. all cities of a geo-targeting plan).
+
+    Args:
+        city_names (list[str]): City names, optionally with a country code (e.g. "Paris", "London,GB").
+
+    Returns:
+        list[dict]: One entry per city, in the given order, with `city`, `id`, `name`, `country`,
+        `temperature_c`, `description`, `humidity_pct` and `wind_speed_ms`, or `city` and `error`.
+    """
+    log.debug("fetching weather for cities", cities=len(city_names))
+    normalized = [_normalize(c) for c in city_names]
+    results = _lookup(list(dict.fromkeys(normalized)))
+    return [{"city": original, **results[city]} for original, city in zip(city_names, normalized)]
@@ -0,0 +1,128 @@
+"""
+Admission control for tool calls, per tool class.
+
+Every tool belongs to a class (TOOL_CLASSES, "default" when not listed) and every class has its own
+limits (ADMISSION_LIMITS): how many calls run at once, how many more may wait, and how long one may
+wait. A call that finds the wait queue full, or that waits too long, is refused right away with an
+"overloaded, retry after N s" error instead of slowing every other call down. Classes don't share
+slots, so cheap lookups never queue behind catalog crawls or uploads.
+
+Limits are per worker process; `FacebookMCP.call_tool` admits every call (see utils/server.py), and
+`snapshot()` feeds the /admission monitoring route.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict
+
+from mcp.server.fastmcp.exceptions import ToolError
+
+from config.settings import ADMISSION_ENABLED, ADMISSION_LIMITS, TOOL_CLASSES
+from utils import deadline
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+DEFAULT_CLASS = "default"
+
+
+@dataclass(frozen=True)
+class Limits:
+    concurrency: int    # calls running at once
+    queue: int          # calls allowed to wait for a slot
+    max_wait: float     # seconds a call may wait before it is refused
+
+
+class Overloaded(ToolError):
+    """The tool's class is at capacity; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, tool_class: str, retry_after: int):
+        self.tool_class = tool_class
+        self.retry_after = retry_after
+        super().__init__(f"Server overloaded: too many {tool_class} tool calls in progress. "
+                         f"Retry after {retry_after} s.")
+
+
+class Gate:
+    def __init__(self, name: str, limits: Limits):
+        self.name = name
+        self.limits = limits
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of call duration, for the retry hint
+        self.avg_seconds = 1.0
+        self._slots: asyncio.Semaphore | None = None
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_seconds * (self.waiting + 1) / self.limits.concurrency))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected += 1
+        log.warning("tool call refused", tool_class=self.name, reason=reason, running=self.running,
+                    waiting=self.waiting)
+        return Overloaded(self.name, self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.limits.concurrency)
+        if self._slots.locked() or self.waiting:
+            if self.waiting >= self.limits.queue:
+                raise self._reject("queue full")
+            left = deadline.remaining()
+            timeout = self.limits.max_wait if left is None else min(self.limits.max_wait, left)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("waited too long")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.running += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * (time.monotonic() - started)
+            self._slots.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"concurrency": self.limits.concurrency, "queue": self.limits.queue, "max_wait": self.limits.max_wait,
+                "running": self.running, "waiting": self.waiting, "admitted": self.admitted,
+                "rejected": self.rejected, "avg_seconds": round(self.avg_seconds, 3)}
+
+
+def _parse_limits(spec: str) -> Limits:
+    concurrency, queue, max_wait = spec.split(":")
+    return Limits(int(concurrency), int(queue), float(max_wait))
+
+
+_gates: Dict[str, Gate] = {name: Gate(name, _parse_limits(spec)) for name, spec in ADMISSION_LIMITS.items()}
+_gates.setdefault(DEFAULT_CLASS, Gate(DEFAULT_CLASS, Limits(32, 64, 2)))
+
+
+def class_of(tool_name: str) -> str:
+    tool_class = TOOL_CLASSES.get(tool_name, DEFAULT_CLASS)
+    return tool_class if tool_class in _gates else DEFAULT_CLASS
+
+
+@asynccontextmanager
+async def admit(tool_name: str) -> AsyncIterator[None]:
+    """Hold a slot of the tool's class for the body; raises `Overloaded` when none is available in time."""
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    async with _gates[class_of(tool_name)].admit():
+        yield
+
+
+def snapshot() -> Dict[str, Any]:
+    return {name: gate.snapshot() for name, gate in _gates.items()}
@@ -0,0 +1,156 @@
+"""
+Circuit breakers for outbound calls, one per upstream and endpoint family ("graph:campaigns",
+"graph:adimages", "openweather:weather", ...).
+
+A breaker watches a rolling window of calls and opens when too many of them fail (connection
+errors, upstream timeouts, 5xx, throttling) or are slow. Calls that end for local reasons (the tool
+call was cancelled or ran out of time) are not counted. While open, calls fail immediately with `CircuitOpenError`
+instead of waiting out the broken dependency. After a cool-down it turns half-open and lets a few
+probe calls through: if they succeed it closes again, otherwise it re-opens.
+
+Breakers are per process. `snapshot()` returns their state for monitoring (see the /breakers route).
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+import requests
+
+from config.settings import (fb_base_url, OPEN_WEATHER_BASE_URL, BREAKERS_ENABLED, BREAKER_WINDOW_SECONDS, BREAKER_MIN_CALLS,
+                             BREAKER_FAILURE_RATE, BREAKER_SLOW_CALL_SECONDS, BREAKER_SLOW_CALL_RATE,
+                             BREAKER_OPEN_SECONDS, BREAKER_HALF_OPEN_PROBES)
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+UPSTREAM_NAMES = {"api.openweathermap.org": "openweather", "graph.facebook.com": "graph",
+                  "graph-video.facebook.com": "graph", urlparse(OPEN_WEATHER_BASE_URL).netloc: "openweather"}
+if fb_base_url:
+    UPSTREAM_NAMES[urlparse(fb_base_url).netloc] = "graph"  # a proxy or mock in front of the Graph API
+# How breakers are named in tool errors
+UPSTREAM_LABELS = {"graph": "The Facebook Graph API", "openweather": "OpenWeather"}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        upstream, _, endpoint = name.partition(":")
+        self.label = UPSTREAM_LABELS.get(upstream, upstream) + (f" ({endpoint})" if endpoint else "")
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._calls: deque = deque()  # (finished_at, failed, slow)
+        self._probes = 0              # half-open probes in flight
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def before(self) -> None:
+        """Admit a call or raise `CircuitOpenError`."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS:
+                    self.stats["rejected"] += 1
+                    retry_in = BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at)
+                    raise CircuitOpenError(f"{self.label} is failing; calls are paused for the next {retry_in:.0f}s. "
+                                           f"Try again later.")
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(f"{self.label} is recovering from failures; try again in a few seconds.")
+                self._probes += 1
+
+    def after(self, failed: bool, elapsed: float) -> None:
+        slow = elapsed >= BREAKER_SLOW_CALL_SECONDS
+        now = time.monotonic()
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += failed
+            self.stats["slow"] += slow
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= BREAKER_HALF_OPEN_PROBES:
+                        self._transition(CLOSED)
+                return
+            if self.state == OPEN:
+                return  # a call admitted before the breaker opened
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - BREAKER_WINDOW_SECONDS:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total >= BREAKER_MIN_CALLS:
+                failure_rate = sum(c[1] for c in self._calls) / total
+                slow_rate = sum(c[2] for c in self._calls) / total
+                if failure_rate >= BREAKER_FAILURE_RATE or slow_rate >= BREAKER_SLOW_CALL_RATE:
+                    log.warning("circuit tripped", breaker=self.name, calls=total,
+                                failure_rate=round(failure_rate, 2), slow_rate=round(slow_rate, 2))
+                    self._transition(OPEN)
+
+    def release(self) -> None:
+        """A call admitted by `before` ended without saying anything about the upstream."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def _transition(self, state: str) -> None:
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+        log.info("circuit state changed", breaker=self.name, state=state, previous=self.state)
+        self.state = state
+        self._calls.clear()
+        self._probes = 0
+        self._probe_successes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "state": self.state, "window_calls": len(self._calls),
+                    "open_for_s": round(time.monotonic() - self.opened_at, 1) if self.state == OPEN else None,
+                    **self.stats}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def family(url: str) -> str:
+    """Breaker name for a URL: upstream plus endpoint family (the Graph edge, or "node" for object reads)."""
+    parsed = urlparse(url)
+    upstream = UPSTREAM_NAMES.get(parsed.netloc)
+    if upstream is None:
+        return parsed.netloc  # arbitrary hosts (image downloads): one breaker per host
+    segments = [s for s in parsed.path.split("/") if s]
+    if segments and re.fullmatch(r"v\d+(\.\d+)?", segments[0]):
+        segments = segments[1:]
+    if not segments:
+        return f"{upstream}:batch"
+    last = segments[-1]
+    edge = "node" if last.isdigit() or last.startswith("act_") or last == "me" else last
+    return f"{upstream}:{edge}"
+
+
+def for_url(url: str) -> CircuitBreaker | None:
+    if not BREAKERS_ENABLED:
+        return None
+    name = family(url)
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def snapshot() -> List[Dict[str, Any]]:
+    return [b.snapshot() for b in sorted(_breakers.values(), key=lambda b: b.name)]
@@ -0,0 +1,369 @@
+"""
+Cache for Graph reads, with interchangeable backends and cross-process invalidation.
+
+Backends (CACHE_BACKEND):
+- "lru":    in-process LRU. Fastest, but every worker has its own copy; pair it with
+            CACHE_INVALIDATION=sqlite|redis so create_*/delete_* in one worker reach the others.
+- "sqlite": one local SQLite file shared by all workers on a host.
+- "redis":  any Redis-protocol server (Redis, Valkey, KeyDB or a local stand-in); needs the `redis` package.
+
+Entries live in namespaces ("campaigns", "interests", ...) and each namespace has its own policy
+(TTL and maximum number of entries, evicted least-recently-used first). Values must be JSON-serialisable.
+
+    from utils.cache import cache
+    accounts = cache.get_or_set("ad_accounts", "me", load_accounts)
+    cache.invalidate("campaigns", ad_account_id)   # one key
+    cache.invalidate("campaigns")                  # whole namespace
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from config.settings import (CACHE_BACKEND, CACHE_INVALIDATION, CACHE_SQLITE_PATH, CACHE_MAX_ENTRIES,
+                             CACHE_DEFAULT_TTL_SECONDS, REDIS_URL, WEBHOOK_CACHE_TTL_SECONDS)
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float                 # seconds an entry stays valid
+    max_entries: int = 1000    # per namespace, least recently used entries are evicted beyond this
+
+
+# Per-namespace policies; namespaces not listed here use DEFAULT_POLICY
+POLICIES: Dict[str, CachePolicy] = {
+    "ad_accounts": CachePolicy(ttl=300, max_entries=50),
+    "businesses": CachePolicy(ttl=300, max_entries=50),
+    "pages": CachePolicy(ttl=300, max_entries=50),
+    "catalogs": CachePolicy(ttl=300, max_entries=200),
+    "campaigns": CachePolicy(ttl=60, max_entries=500),
+    "adsets": CachePolicy(ttl=60, max_entries=500),
+    # interest search results barely change; cache them for a day
+    "interests": CachePolicy(ttl=86400, max_entries=5000),
+    # audience estimates per canonical targeting spec; they drift slowly
+    "audience_estimates": CachePolicy(ttl=3600, max_entries=5000),
+    # OpenWeather refreshes current weather about every 10 minutes; a city name resolves to the same ID for good
+    "weather": CachePolicy(ttl=600, max_entries=2000),
+    "weather_city_ids": CachePolicy(ttl=30 * 86400, max_entries=5000),
+    # image hashes known to exist in an ad account ("act_1:<md5>"); images are immutable
+    "ad_images": CachePolicy(ttl=7 * 86400, max_entries=20000),
+    # full rows behind the continuation handles of shaped listing results
+    "continuations": CachePolicy(ttl=1800, max_entries=200),
+    # name -> ID index per access token (utils/name_index.py); refreshed by deltas, so kept long
+    "name_index": CachePolicy(ttl=7 * 86400, max_entries=20),
+    # state of launch plan executions (utils/launch.py), so a failed launch can be resumed or inspected
+    "launch_plans": CachePolicy(ttl=7 * 86400, max_entries=200),
+    # ETag + body per GET for conditional refreshes; kept long because a 304 re-validates them
+    "http_etag": CachePolicy(ttl=86400, max_entries=1000),
+}
+# Listings that webhook deliveries invalidate (see utils/webhooks.py) don't need short TTLs to stay fresh
+if WEBHOOK_CACHE_TTL_SECONDS > 0:
+    for _namespace in ("campaigns", "adsets", "catalogs"):
+        POLICIES[_namespace] = CachePolicy(ttl=WEBHOOK_CACHE_TTL_SECONDS, max_entries=POLICIES[_namespace].max_entries)
+DEFAULT_POLICY = CachePolicy(ttl=CACHE_DEFAULT_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES)
+
+
+def policy_for(namespace: str) -> CachePolicy:
+    return POLICIES.get(namespace, DEFAULT_POLICY)
+
+
+# --- backends: raw key/value storage of serialised values ---
+
+class CacheBackend:
+    shared = False  # True when every process sees the same entries
+
+    def get(self, namespace: str, key: str) -> str | None:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: str, policy: CachePolicy) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str | None = None) -> None:
+        """Delete one key, or the whole namespace when `key` is None."""
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    def __init__(self):
+        self._namespaces: Dict[str, OrderedDict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            item = entries.get(key) if entries is not None else None
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace, key, value, policy):
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = (time.time() + policy.ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > policy.max_entries:
+                entries.popitem(last=False)
+
+    def delete(self, namespace, key=None):
+        with self._lock:
+            if key is None:
+                self._namespaces.pop(namespace, None)
+            elif namespace in self._namespaces:
+                self._namespaces[namespace].pop(key, None)
+
+
+class SQLiteBackend(CacheBackend):
+    shared = True
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+            "value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (namespace, key))")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires FROM cache_entries WHERE namespace = ? AND key = ?",
+                           (namespace, key)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+            return None
+        conn.execute("UPDATE cache_entries SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return row[0]
+
+    def set(self, namespace, key, value, policy):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                     (namespace, key, value, now + policy.ttl, now))
+        # Enforce the size bound every few writes rather than on each one
+        self._sets += 1
+        if self._sets % 50 == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires < ?", (now,))
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key NOT IN (SELECT key FROM "
+                         "cache_entries WHERE namespace = ? ORDER BY accessed DESC LIMIT ?)",
+                         (namespace, namespace, policy.max_entries))
+
+    def delete(self, namespace, key=None):
+        if key is None:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        else:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+def _redis_client():
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("The redis cache backend / invalidation bus requires the 'redis' package "
+                           "(pip install redis)") from e
+    return redis.Redis.from_url(REDIS_URL)
+
+
+class RedisBackend(CacheBackend):
+    """Entries are Redis strings with native expiry; the LRU bound is left to the server's maxmemory-policy."""
+    shared = True
+
+    def __init__(self, prefix: str = "mcp:cache:"):
+        self.client = _redis_client()
+        self.prefix = prefix
+
+    def get(self, namespace, key):
+        raw = self.client.get(f"{self.prefix}{namespace}:{key}")
+        return raw.decode() if raw is not None else None
+
+    def set(self, namespace, key, value, policy):
+        self.client.set(f"{self.prefix}{namespace}:{key}", value, ex=max(1, int(policy.ttl)))
+
+    def delete(self, namespace, key=None):
+        if key is not None:
+            self.client.delete(f"{self.prefix}{namespace}:{key}")
+            return
+        batch = []
+        for name in self.client.scan_iter(match=f"{self.prefix}{namespace}:*", count=500):
+            batch.append(name)
+            if len(batch) >= 500:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+
+
+# --- invalidation buses: tell the other processes what to drop from their local backend ---
+
+class InvalidationBus:
+    def publish(self, namespace: str, key: str | None) -> None:
+        pass
+
+    def start(self, apply: Callable[[str, str | None], None]) -> None:
+        pass
+
+    def poll(self) -> None:
+        pass
+
+
+class SQLiteBus(InvalidationBus):
+    """Invalidation log in a SQLite table; each process reads the new rows at most every `interval` seconds."""
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, interval: float = 0.5):
+        self.path = path
+        self.interval = interval
+        self.origin = f"{os.getpid()}-{id(self)}"
+        self._apply: Callable[[str, str | None], None] | None = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_poll = 0.0
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_invalidations (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "namespace TEXT NOT NULL, key TEXT, origin TEXT NOT NULL, created REAL NOT NULL)")
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self, apply):
+        self._apply = apply
+
+    def publish(self, namespace, key):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("INSERT INTO cache_invalidations (namespace, key, origin, created) VALUES (?, ?, ?, ?)",
+                     (namespace, key, self.origin, now))
+        conn.execute("DELETE FROM cache_invalidations WHERE created < ?", (now - 3600,))
+
+    def poll(self):
+        now = time.monotonic()
+        if self._apply is None or now - self._last_poll < self.interval:
+            return
+        with self._lock:
+            self._last_poll = now
+            rows = self._connection().execute(
+                "SELECT id, namespace, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id",
+                (self._last_id,)).fetchall()
+            for row_id, namespace, key, origin in rows:
+                self._last_id = row_id
+                if origin != self.origin:
+                    self._apply(namespace, key)
+
+
+class RedisBus(InvalidationBus):
+    """Invalidation messages over Redis pub/sub, applied by a background listener thread."""
+
+    channel = "mcp:cache:invalidate"
+
+    def __init__(self):
+        self.client = _redis_client()
+        self.origin = f"{os.getpid()}-{id(self)}"
+
+    def start(self, apply):
+        def handle(message):
+            payload = json.loads(message["data"])
+            if payload["origin"] != self.origin:
+                apply(payload["namespace"], payload["key"])
+
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: handle})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, namespace, key):
+        self.client.publish(self.channel, json.dumps({"namespace": namespace, "key": key, "origin": self.origin}))
+
+
+# --- front end ---
+
+class Cache:
+    def __init__(self, backend: CacheBackend, bus: InvalidationBus | None = None):
+        self.backend = backend
+        self.bus = bus or InvalidationBus()
+        self.bus.start(self._apply_remote)
+        self.hits = 0
+        self.misses = 0
+
+    def _apply_remote(self, namespace: str, key: str | None) -> None:
+        self.backend.delete(namespace, key)
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        self.bus.poll()
+        raw = self.backend.get(namespace, key)
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        self.backend.set(namespace, key, json.dumps(value, default=str), policy_for(namespace))
+
+    def get_or_set(self, namespace: str, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached value or call `loader`, caching its result. Exceptions from `loader` are not cached."""
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(namespace, key, value)
+        return value
+
+    def invalidate(self, namespace: str, key: str | None = None) -> None:
+        """Drop one key (or the whole namespace) here and in every other process."""
+        self.backend.delete(namespace, key)
+        self.bus.publish(namespace, key)
+        log.debug("cache invalidated", namespace=namespace, key=key)
+
+    def invalidate_many(self, items: Iterable[Tuple[str, str | None]]) -> None:
+        for namespace, key in items:
+            self.invalidate(namespace, key)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+def create_cache(backend: str = CACHE_BACKEND, invalidation: str = CACHE_INVALIDATION) -> Cache:
+    backends: Dict[str, Callable[[], CacheBackend]] = {"lru": LRUBackend, "sqlite": SQLiteBackend,
+                                                        "redis": RedisBackend}
+    buses: Dict[str, Callable[[], InvalidationBus]] = {"none": InvalidationBus, "sqlite": SQLiteBus,
+                                                       "redis": RedisBus}
+    if backend not in backends:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend}', expected one of: {', '.join(backends)}")
+    if invalidation not in buses:
+        raise ValueError(f"Unknown CACHE_INVALIDATION '{invalidation}', expected one of: {', '.join(buses)}")
+    chosen = backends[backend]()
+    # A shared backend is already consistent across processes; only a local one needs the bus
+    bus = buses[invalidation]() if not chosen.shared else InvalidationBus()
+    return Cache(chosen, bus)
+
+
+cache = create_cache()
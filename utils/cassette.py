@@ -0,0 +1,145 @@
+"""
+Record / replay of outbound HTTP traffic ("cassettes").
+
+Recording appends one JSON line per response to a gzip file, with access tokens and API keys
+redacted from URLs, parameters, headers and bodies. Replay indexes that file by a
+host/version-independent request key and serves the recorded responses back, optionally with
+their original latency, so tools can be benchmarked and profiled offline against real payloads.
+"""
+import atexit
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config.settings import HTTP_CASSETTE_MODE, HTTP_CASSETTE_PATH, HTTP_CASSETTE_SPEED
+from utils.logger import current_tool, get_logger
+
+log = get_logger(__name__)
+
+SECRET_PARAMS = {"access_token", "appid", "app_secret", "appsecret_proof", "client_secret"}
+_SECRET_IN_TEXT = re.compile(r"((?:access_token|appid|appsecret_proof|client_secret)=)[^&\"'\s]+")
+# Response headers worth keeping: they drive paging, caching and rate limiting decisions
+KEEP_HEADERS = {"content-type", "etag", "x-app-usage", "x-business-use-case-usage", "x-ad-account-usage", "retry-after"}
+
+_lock = threading.Lock()
+_writer = None
+_replay_index: Dict[Tuple[str, str], deque] | None = None
+
+
+def recording() -> bool:
+    return HTTP_CASSETTE_MODE == "record"
+
+
+def replaying() -> bool:
+    return HTTP_CASSETTE_MODE == "replay"
+
+
+def redact(text: str) -> str:
+    return _SECRET_IN_TEXT.sub(r"\1REDACTED", text)
+
+
+def _clean_params(params: Any) -> Dict[str, str]:
+    if not params:
+        return {}
+    items = params.items() if isinstance(params, dict) else params
+    return {str(k): str(v) for k, v in items if k not in SECRET_PARAMS}
+
+
+def request_key(method: str, url: str, params: Any = None, data: Any = None) -> Tuple[str, str]:
+    """
+    Key that identifies a request independently of host, API version and credentials,
+    so a cassette recorded against graph.facebook.com replays against any FB_BASE_URL.
+    """
+    parsed = urlparse(url)
+    segments = [s for s in parsed.path.split("/") if s]
+    if segments and re.fullmatch(r"v\d+(\.\d+)?", segments[0]):
+        segments = segments[1:]
+    query = dict(parse_qsl(parsed.query))
+    query.update(_clean_params(params))
+    if isinstance(data, dict):
+        query.update({f"body.{k}": v for k, v in _clean_params(data).items()})
+    query = {k: v for k, v in query.items() if k not in SECRET_PARAMS}
+    return method.upper(), "/" + "/".join(segments) + ("?" + urlencode(sorted(query.items())) if query else "")
+
+
+def _open_writer():
+    global _writer
+    if _writer is None:
+        os.makedirs(os.path.dirname(HTTP_CASSETTE_PATH) or ".", exist_ok=True)
+        # Append mode adds a new gzip member per session; readers handle multi-member files transparently.
+        _writer = gzip.open(HTTP_CASSETTE_PATH, "at", encoding="utf-8")
+        atexit.register(_writer.close)
+    return _writer
+
+
+def record(method: str, url: str, kwargs: Dict[str, Any], response: requests.Response, elapsed: float) -> None:
+    """Append one redacted request/response pair to the cassette."""
+    entry = {
+        "key": list(request_key(method, url, kwargs.get("params"), kwargs.get("data"))),
+        "tool": current_tool.get(),
+        "recorded_at": round(time.time(), 3),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "status": response.status_code,
+        "reason": response.reason,
+        "headers": {k.lower(): v for k, v in response.headers.items() if k.lower() in KEEP_HEADERS},
+        "body": redact(response.text),
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _lock:
+        _open_writer().write(line)
+
+
+def _load_index() -> Dict[Tuple[str, str], deque]:
+    global _replay_index
+    with _lock:
+        if _replay_index is None:
+            index: Dict[Tuple[str, str], deque] = defaultdict(deque)
+            with gzip.open(HTTP_CASSETTE_PATH, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        index[tuple(entry["key"])].append(entry)
+            log.info("cassette loaded", path=HTTP_CASSETTE_PATH, requests=len(index))
+            _replay_index = index
+    return _replay_index
+
+
+def replay(method: str, url: str, kwargs: Dict[str, Any]) -> requests.Response:
+    """
+    Serve a recorded response. Repeated identical requests cycle through the recorded answers in order.
+    A request that was never recorded fails like an unreachable upstream.
+    """
+    key = request_key(method, url, kwargs.get("params"), kwargs.get("data"))
+    entries = _load_index().get(key)
+    if not entries:
+        raise requests.exceptions.ConnectionError(f"No cassette entry for {key[0]} {key[1]}")
+    with _lock:
+        entry = entries[0]
+        entries.rotate(-1)
+    if HTTP_CASSETTE_SPEED > 0:
+        time.sleep(entry["elapsed_ms"] / 1000 * HTTP_CASSETTE_SPEED)
+    return make_response(method, url, entry["status"], entry.get("reason") or "", entry.get("headers", {}),
+                         entry["body"])
+
+
+def make_response(method: str, url: str, status: int, reason: str, headers: Dict[str, str],
+                  body: str) -> requests.Response:
+    """Build a `requests.Response` from stored parts, usable like one that came off the network."""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body.encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    response.request = requests.Request(method.upper(), url).prepare()
+    return response
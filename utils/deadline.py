@@ -0,0 +1,83 @@
+"""
+Per-tool-call deadlines and cancellation for outbound work.
+
+`FacebookMCP.call_tool` opens a `scope` for every call. Inside it, `http_client` turns the remaining
+time into connect/read timeouts for each request and refuses to start new requests once the deadline
+has passed or the call was cancelled (client cancelled it or went away). Both conditions surface as
+`requests.exceptions.RequestException` subclasses, so the tools' existing error handling applies.
+Paginated loops use `has_time_for` to stop early with partial results instead of failing.
+
+The deadline and cancel token live in context variables; they follow the call into threads started
+with `asyncio.to_thread` or `contextvars.copy_context().run`.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Tuple
+
+import requests
+
+from config.settings import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, TOOL_DEADLINE_SECONDS, TOOL_DEADLINES
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+_cancelled: ContextVar[threading.Event | None] = ContextVar("cancelled", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The tool call ran out of time before (or while) making a request."""
+
+
+class CallCancelled(requests.exceptions.RequestException):
+    """The tool call was cancelled; no further requests are made for it."""
+
+
+def seconds_for(tool_name: str) -> float:
+    return TOOL_DEADLINES.get(tool_name, TOOL_DEADLINE_SECONDS)
+
+
+@contextmanager
+def scope(seconds: float, cancel: threading.Event | None = None) -> Iterator[threading.Event]:
+    """Run the body under a deadline `seconds` from now. Yields the cancel token; set it to cancel the call."""
+    cancel = cancel or threading.Event()
+    deadline_token = _deadline.set(time.monotonic() + seconds)
+    cancel_token = _cancelled.set(cancel)
+    try:
+        yield cancel
+    finally:
+        _cancelled.reset(cancel_token)
+        _deadline.reset(deadline_token)
+
+
+def remaining() -> float | None:
+    """Seconds left for the current call, or None outside a scope."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def has_time_for(seconds: float) -> bool:
+    """True when another step of roughly `seconds` fits in the remaining time (and the call is still wanted)."""
+    left = remaining()
+    cancel = _cancelled.get()
+    return not (cancel is not None and cancel.is_set()) and (left is None or left > seconds)
+
+
+def check() -> None:
+    cancel = _cancelled.get()
+    if cancel is not None and cancel.is_set():
+        raise CallCancelled("Tool call was cancelled")
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Tool call deadline exceeded")
+
+
+def timeouts(requested: float | Tuple[float, float] | None = None) -> Tuple[float, float]:
+    """(connect, read) timeouts for one request: the configured defaults (or the caller's), capped by the deadline."""
+    if isinstance(requested, tuple):
+        connect, read = requested
+    else:
+        connect, read = HTTP_CONNECT_TIMEOUT, requested or HTTP_READ_TIMEOUT
+    left = remaining()
+    if left is not None:
+        connect, read = min(connect, left), min(read, left)
+    return connect, read
@@ -0,0 +1,202 @@
+"""
+Streaming catalog exports to files in EXPORT_DIR: gzip-compressed NDJSON, or Parquet when `pyarrow`
+is installed.
+
+Graph pages come one cursor after the other, so the export overlaps fetching and writing instead: a
+fetcher thread reads up to EXPORT_PREFETCH_PAGES pages ahead of the writer through a bounded queue.
+Memory stays at a few pages (plus one Parquet row group) whatever the catalog size. The file is
+written under a temporary name and renamed when complete; a small JSON sidecar records its metadata.
+
+Finished exports are served as MCP resources (registered in utils/server.py):
+- exports://{name}/info                       metadata: format, size, product count, range template
+- exports://{name}/bytes/{offset}/{length}    a byte range of the file (at most EXPORT_RANGE_MAX_BYTES)
+"""
+import contextvars
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+from config.settings import (fb_access_token, fb_base_url, EXPORT_DIR, EXPORT_PAGE_SIZE, EXPORT_PREFETCH_PAGES,
+                             EXPORT_RANGE_MAX_BYTES, EXPORT_RETENTION_SECONDS)
+from utils import http_client
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+FORMATS = {"ndjson": ("ndjson.gz", "application/x-ndjson+gzip"), "parquet": ("parquet", "application/vnd.apache.parquet")}
+FIELDS = ["id", "retailer_id", "name", "description", "price", "availability", "condition", "brand",
+          "image_url", "url"]
+PARQUET_ROW_GROUP = 10000
+_NAME = re.compile(r"^[\w.-]+$")
+_END = object()
+
+
+def _pages(catalog_id: str, pages: "queue.Queue", stop: threading.Event) -> None:
+    """Fetcher thread: put each page's products on `pages`, then _END (or the exception that stopped it)."""
+    url = f"{fb_base_url}{catalog_id}/products"
+    params: Dict[str, Any] | None = {"fields": ",".join(FIELDS), "limit": EXPORT_PAGE_SIZE, "summary": "true",
+                                     "access_token": fb_access_token}
+    item: Any = _END
+    try:
+        while url and not stop.is_set():
+            response = http_client.get(url, params=params, revalidate=False)
+            response.raise_for_status()
+            data = response.json()
+            page = (data.get("data", []), data.get("summary", {}).get("total_count"))
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            url, params = data.get("paging", {}).get("next"), None  # the next URL carries all parameters
+    except BaseException as e:
+        item = e
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def stream_products(catalog_id: str) -> Iterator[tuple[List[Dict[str, Any]], int | None]]:
+    """(products, catalog total) per page, with the next pages already being fetched."""
+    pages: "queue.Queue" = queue.Queue(maxsize=EXPORT_PREFETCH_PAGES)
+    stop = threading.Event()
+    fetcher = threading.Thread(target=contextvars.copy_context().run, args=(_pages, catalog_id, pages, stop),
+                               name=f"export-{catalog_id}", daemon=True)
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class _NDJSONWriter:
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wb", compresslevel=6)
+
+    def write(self, products: List[Dict[str, Any]]) -> None:
+        self._file.write(b"".join(json.dumps(p, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+                                  for p in products))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet exports need the 'pyarrow' package: pip install pyarrow")
+    return pa, pq
+
+
+def check_format(format: str) -> None:
+    """Raise ValueError / RuntimeError when `format` is unknown or its writer is not installed."""
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}.")
+    if format == "parquet":
+        _pyarrow()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str):
+        pa, pq = _pyarrow()
+        self._pa = pa
+        self._schema = pa.schema([(f, pa.string()) for f in FIELDS])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        self._rows: List[Dict[str, Any]] = []
+
+    def write(self, products: List[Dict[str, Any]]) -> None:
+        self._rows.extend({f: None if p.get(f) is None else str(p[f]) for f in FIELDS} for p in products)
+        if len(self._rows) >= PARQUET_ROW_GROUP:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+def _path(name: str) -> str:
+    if not _NAME.match(name):
+        raise ValueError(f"Invalid export name '{name}'")
+    return os.path.join(EXPORT_DIR, name)
+
+
+def _remove_expired() -> None:
+    cutoff = time.time() - EXPORT_RETENTION_SECONDS
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+
+def export_catalog(job, catalog_id: str, format: str) -> Dict[str, Any]:
+    """Job body: stream every product of the catalog into a new export file."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _remove_expired()
+    extension, mime_type = FORMATS[format]
+    name = f"catalog-{catalog_id}-{time.strftime('%Y%m%dT%H%M%S')}-{job.id}.{extension}"
+    path = _path(name)
+    writer = _ParquetWriter(path + ".part") if format == "parquet" else _NDJSONWriter(path + ".part")
+    count = 0
+    try:
+        for products, total in stream_products(catalog_id):
+            writer.write(products)
+            count += len(products)
+            job.progress(count, total, f"{count} products exported")
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(path + ".part")
+        raise
+    os.replace(path + ".part", path)
+    meta = {"name": name, "catalog_id": catalog_id, "format": format, "mime_type": mime_type, "products": count,
+            "bytes": os.path.getsize(path), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    log.info("catalog exported", catalog_id=catalog_id, format=format, products=count, bytes=meta["bytes"])
+    return describe(meta)
+
+
+def describe(meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {**meta, "resource": f"exports://{meta['name']}/info",
+            "range_template": f"exports://{meta['name']}/bytes/{{offset}}/{{length}}",
+            "max_range_bytes": EXPORT_RANGE_MAX_BYTES}
+
+
+def info(name: str) -> Dict[str, Any]:
+    path = _path(name)
+    if not os.path.exists(path + ".json"):
+        raise ValueError(f"Unknown export '{name}'")
+    with open(path + ".json", encoding="utf-8") as f:
+        return describe(json.load(f))
+
+
+def read_range(name: str, offset: int, length: int) -> bytes:
+    path = _path(name)
+    if not os.path.exists(path + ".json"):
+        raise ValueError(f"Unknown export '{name}'")
+    if offset < 0 or length <= 0:
+        raise ValueError("offset must be >= 0 and length > 0")
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(min(length, EXPORT_RANGE_MAX_BYTES))
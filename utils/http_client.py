@@ -0,0 +1,130 @@
+"""
+Shared outbound HTTP path for every tool (Graph API, OpenWeather).
+
+Tools call `http_client.get/post/delete` exactly like `requests.get/post/delete`; going through one
+module gives us connection pooling and a single place for cross-cutting behaviour (record/replay,
+conditional GETs, timeouts from the tool call's deadline, circuit breakers, rate-limit usage tracking,
+profiling). Error handling stays in the tools: the usual `requests.exceptions.*` are raised.
+"""
+import time
+from typing import Any, Dict
+
+import requests
+
+from config.settings import HTTP_CONDITIONAL_GET
+from utils import breakers, cassette, deadline, profiling, rate_limits
+from utils.cache import cache
+
+# ETag + body of the last 200 for each GET, so a refresh can be a conditional request
+ETAG_NAMESPACE = "http_etag"
+
+# One pooled session per process: keep-alive instead of a new TCP/TLS handshake per call
+session = requests.Session()
+
+stats: Dict[str, int] = {"requests": 0, "not_modified": 0}
+
+
+def _is_text(response: requests.Response) -> bool:
+    # Only API payloads are worth revalidating; binary downloads (ad images) are not kept
+    content_type = response.headers.get("Content-Type", "")
+    return "json" in content_type or content_type.startswith("text/")
+
+
+def _upstream_failed(error: BaseException) -> bool:
+    """
+    Whether a failed request counts against its breaker: connection errors and timeouts the upstream
+    used up. Not when the call was cancelled or its deadline cut the timeout short (the timeout then
+    fires once the deadline has passed), nor for anything else raised while waiting.
+    """
+    if not isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError)):
+        return False
+    return deadline.has_time_for(0)
+
+
+def _throttled(response: requests.Response) -> bool:
+    """
+    App-level throttling, which counts against the breaker like a failure. Per-ad-account limits are
+    left to utils/rate_limits, so one busy account does not open the breaker for all of them.
+    """
+    if response.status_code == 429:
+        return True
+    if response.status_code not in (400, 403):
+        return False
+    try:
+        error = response.json().get("error") or {}
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(error, dict) and error.get("code") in rate_limits.APP_THROTTLE_CODES
+
+
+def _kept_headers(response: requests.Response) -> Dict[str, str]:
+    return {k.lower(): v for k, v in response.headers.items() if k.lower() in cassette.KEEP_HEADERS}
+
+
+def request(method: str, url: str, revalidate: bool = True, **kwargs: Any) -> requests.Response:
+    """
+    `revalidate=False` skips the stored-ETag handling for this GET: one-pass crawls (exports, index
+    builds) would otherwise keep every page's body in the ETag store, growing with the crawl's size.
+    """
+    deadline.check()
+    kwargs["timeout"] = deadline.timeouts(kwargs.get("timeout"))
+    if cassette.replaying():
+        return cassette.replay(method, url, kwargs)
+
+    # Conditional GET: send the stored ETag; a 304 answer is served from the stored body
+    etag_key = stored = None
+    if HTTP_CONDITIONAL_GET and revalidate and method.upper() == "GET":
+        etag_key = " ".join(cassette.request_key(method, url, kwargs.get("params")))
+        stored = cache.get(ETAG_NAMESPACE, etag_key)
+        if stored is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "If-None-Match": stored["etag"]}
+
+    breaker = breakers.for_url(url)
+    if breaker is not None:
+        breaker.before()
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, **kwargs)
+    except BaseException as e:
+        if breaker is not None:
+            if _upstream_failed(e):
+                breaker.after(failed=True, elapsed=time.perf_counter() - started)
+            else:
+                breaker.release()
+        raise
+    elapsed = time.perf_counter() - started
+    if breaker is not None:
+        breaker.after(failed=response.status_code >= 500 or _throttled(response), elapsed=elapsed)
+    stats["requests"] += 1
+    rate_limits.observe(url, response.headers)
+
+    if etag_key is not None:
+        if response.status_code == 304 and stored is not None:
+            stats["not_modified"] += 1
+            # Fresh headers from the 304 (rate-limit usage) over the stored ones
+            headers = {**stored["headers"], **_kept_headers(response)}
+            response = cassette.make_response(method, url, 200, "OK", headers, stored["body"])
+        elif response.status_code == 200 and response.headers.get("ETag") and _is_text(response):
+            cache.set(ETAG_NAMESPACE, etag_key, {
+                "etag": response.headers["ETag"],
+                "headers": _kept_headers(response),
+                "body": response.text,
+            })
+    # After the 304 swap, so a replay serves the body the caller got instead of an empty 304
+    if cassette.recording():
+        cassette.record(method, url, kwargs, response, elapsed)
+    profiling.observe_response(response, elapsed)
+    return response
+
+
+def get(url: str, params: Any = None, **kwargs: Any) -> requests.Response:
+    return request("GET", url, params=params, **kwargs)
+
+
+def post(url: str, data: Any = None, **kwargs: Any) -> requests.Response:
+    return request("POST", url, data=data, **kwargs)
+
+
+def delete(url: str, **kwargs: Any) -> requests.Response:
+    return request("DELETE", url, **kwargs)
@@ -0,0 +1,261 @@
+"""
+Background jobs for long-running tools.
+
+A `start_*` tool hands its work to `submit()` and returns a job ID right away. The work runs on a
+bounded thread pool (JOB_WORKERS) behind a bounded queue (JOB_MAX_QUEUED); job state, progress and
+results are kept in a SQLite registry that every worker on the host can read, so `get_job_status`,
+`get_job_result` and `cancel_job` work whichever worker the client reaches.
+
+A job body receives a `Job` handle to report progress and notice cancellation. It runs under its
+own deadline (JOB_DEADLINE_SECONDS) with the job's cancel token, so outbound calls made through
+`http_client` stop as soon as the job is cancelled. Progress is also pushed to the client that
+started the job as `notifications/message` log messages (logger "jobs").
+"""
+import asyncio
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Sequence
+
+from config.settings import JOB_STORE_PATH, JOB_WORKERS, JOB_MAX_QUEUED, JOB_DEADLINE_SECONDS, JOB_RETENTION_SECONDS
+from utils import deadline
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, INTERRUPTED = \
+    "queued", "running", "succeeded", "failed", "cancelled", "interrupted"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, INTERRUPTED)
+# Minimum seconds between two progress writes / notifications of one job
+PROGRESS_INTERVAL = 1.0
+# Minimum seconds between two deletions of expired job records
+PRUNE_INTERVAL = 300.0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """Job records in a local SQLite file, shared by all workers on one host."""
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._pruned_at = 0.0
+        self._prune_lock = threading.Lock()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                     "id TEXT PRIMARY KEY, kind TEXT NOT NULL, arguments TEXT NOT NULL, status TEXT NOT NULL, "
+                     "progress REAL NOT NULL DEFAULT 0, total REAL, message TEXT, result TEXT, error TEXT, "
+                     "result_kind TEXT, result_columns TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                     "owner TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+        self.prune()
+
+    def prune(self) -> None:
+        """Delete jobs finished more than JOB_RETENTION_SECONDS ago; at most once per PRUNE_INTERVAL."""
+        with self._prune_lock:
+            now = time.time()
+            if now - self._pruned_at < PRUNE_INTERVAL:
+                return
+            self._pruned_at = now
+        deleted = self._connection().execute("DELETE FROM jobs WHERE finished_at < ?",
+                                              (now - JOB_RETENTION_SECONDS,)).rowcount
+        if deleted:
+            log.debug("expired jobs deleted", jobs=deleted)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, kind: str, arguments: Dict[str, Any], result_kind: str,
+               result_columns: Sequence[str], owner: str) -> None:
+        self._connection().execute(
+            "INSERT INTO jobs (id, kind, arguments, status, result_kind, result_columns, owner, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(arguments), QUEUED, result_kind, json.dumps(list(result_columns)), owner,
+             time.time()))
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], default=str)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._connection().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._connection().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def orphaned(self, host: str) -> list:
+        """Unfinished jobs owned by processes on this host that no longer exist."""
+        rows = self._connection().execute(
+            "SELECT id, owner FROM jobs WHERE status IN (?, ?) AND owner LIKE ?", (QUEUED, RUNNING, f"{host}:%"))
+        return [r["id"] for r in rows if not _alive(int(r["owner"].rsplit(":", 1)[1]))]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Job:
+    """Handle passed to a job body."""
+
+    def __init__(self, job_id: str, manager: "JobManager", notify: Callable[[Dict[str, Any]], None] | None):
+        self.id = job_id
+        self.cancel_event = threading.Event()
+        self._manager = manager
+        self._notify = notify
+        self._last_report = 0.0
+        self.latest: Dict[str, Any] = {}
+
+    def progress(self, done: float, total: float | None = None, message: str | None = None) -> None:
+        """Record progress (rate-limited) and pick up cancellation requested through the registry."""
+        self.latest = {"progress": done, "total": total, "message": message}
+        now = time.monotonic()
+        if now - self._last_report < PROGRESS_INTERVAL:
+            self.check()
+            return
+        self._last_report = now
+        self._manager.store.update(self.id, **self.latest)
+        if self._manager.store.cancel_requested(self.id):
+            self.cancel_event.set()
+        if self._notify is not None:
+            self._notify({"job_id": self.id, "status": RUNNING, "progress": done, "total": total, "message": message})
+        self.check()
+
+    def check(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+class JobManager:
+    def __init__(self, store: JobStore | None = None, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED):
+        self.store = store or JobStore()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._running: Dict[str, Job] = {}
+        for job_id in self.store.orphaned(socket.gethostname()):
+            self.store.update(job_id, status=INTERRUPTED, error="The worker running this job stopped.",
+                              finished_at=time.time())
+
+    def submit(self, kind: str, fn: Callable[..., Any], arguments: Dict[str, Any], *, ctx: Any = None,
+               result_kind: str = "items", result_columns: Sequence[str] = ()) -> str | None:
+        """
+        Queue `fn(job, **arguments)`. Returns the job ID, or None when the queue is full.
+        Pass the tool's MCP `Context` as `ctx` to push progress notifications to its client.
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+        job_id = uuid.uuid4().hex[:12]
+        try:
+            self.store.prune()
+        except sqlite3.Error as e:
+            log.warning("could not delete expired jobs", error=str(e))
+        try:
+            self.store.create(job_id, kind, arguments, result_kind, result_columns, self.owner)
+            job = Job(job_id, self, _notifier(ctx))
+            self._running[job_id] = job
+            # The job keeps the caller's correlation ID in its logs, but gets its own deadline and cancel token
+            self._pool.submit(contextvars.copy_context().run, self._run, job, kind, fn, arguments)
+        except BaseException:
+            # Nothing will run to give the slot back
+            self._running.pop(job_id, None)
+            self._slots.release()
+            raise
+        log.info("job queued", job_id=job_id, kind=kind)
+        return job_id
+
+    def _run(self, job: Job, kind: str, fn: Callable[..., Any], arguments: Dict[str, Any]) -> None:
+        try:
+            if job.cancelled or self.store.cancel_requested(job.id):
+                raise JobCancelled()
+            self.store.update(job.id, status=RUNNING, started_at=time.time())
+            with deadline.scope(JOB_DEADLINE_SECONDS, cancel=job.cancel_event):
+                result = fn(job, **arguments)
+            job.check()
+            self.store.update(job.id, status=SUCCEEDED, result=result, finished_at=time.time(), **job.latest)
+            status = SUCCEEDED
+        except (JobCancelled, deadline.CallCancelled):
+            self.store.update(job.id, status=CANCELLED, finished_at=time.time(), **job.latest)
+            status = CANCELLED
+        except Exception as e:
+            log.warning("job failed", job_id=job.id, kind=kind, error=str(e))
+            self.store.update(job.id, status=FAILED, error=str(e), finished_at=time.time())
+            status = FAILED
+        finally:
+            self._running.pop(job.id, None)
+            self._slots.release()
+        try:
+            self.store.prune()
+        except sqlite3.Error as e:
+            log.warning("could not delete expired jobs", error=str(e))
+        log.info("job finished", job_id=job.id, kind=kind, status=status)
+        if job._notify is not None:
+            job._notify({"job_id": job.id, "status": status})
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation. Returns False for unknown or already finished jobs."""
+        record = self.store.get(job_id)
+        if record is None or record["status"] in FINISHED:
+            return False
+        self.store.update(job_id, cancel_requested=1)
+        job = self._running.get(job_id)
+        if job is not None:  # running here: stop right away, otherwise its worker notices on its next progress
+            job.cancel_event.set()
+        return True
+
+
+def _notifier(ctx: Any) -> Callable[[Dict[str, Any]], None] | None:
+    """Thread-safe sender of job updates to the session of the tool call that started the job."""
+    if ctx is None:
+        return None
+    try:
+        session = ctx.session
+        loop = asyncio.get_running_loop()
+    except (ValueError, RuntimeError):
+        return None
+
+    def notify(data: Dict[str, Any]) -> None:
+        # Fire and forget: a client that went away must not break the job
+        asyncio.run_coroutine_threadsafe(session.send_log_message(level="info", data=data, logger="jobs"), loop)
+
+    return notify
+
+
+_manager: JobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def manager() -> JobManager:
+    """The process-wide job manager, created on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+    return _manager
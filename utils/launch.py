@@ -0,0 +1,468 @@
+"""
+Launch plans: a whole launch (campaigns, ad sets, catalog creatives, ads) described declaratively and
+created in one tool call.
+
+A plan is validated locally first (enums, budget minimum, age range, country codes, references),
+so a typo costs no Graph calls and creates nothing. Its objects form a dependency DAG: ad sets need
+their campaign, ads need their ad set and creative, campaigns and creatives need nothing. Each level
+of the DAG is created at once through the Graph batch API (LAUNCH_BATCH_SIZE sub-requests per call,
+LAUNCH_CONCURRENCY calls in flight), so a 100-object launch takes three levels of one or two round
+trips each.
+
+Objects reference each other by plan key; a reference that is not a key is taken as the ID of an
+existing object. Progress is saved after every level under a launch ID (cache namespace
+"launch_plans"). When a level fails, the launch stops and either deletes what it created (rollback)
+or keeps it, so `resume` can finish the launch later without creating anything twice. A batch call
+that got no answer (read timeout, dropped connection) may still have created its objects: they are
+looked up by name under their parent before anything is retried or rolled back.
+"""
+import contextvars
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlencode
+
+import requests
+from config.settings import (fb_access_token, fb_base_url, LAUNCH_BATCH_SIZE, LAUNCH_CONCURRENCY,
+                             LAUNCH_MAX_OBJECTS, LAUNCH_ROLLBACK_SECONDS)
+from tools.facebook.adsets import build_targeting_spec
+from utils import breakers, deadline, http_client
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+OBJECTIVES = ("OUTCOME_AWARENESS", "OUTCOME_TRAFFIC", "OUTCOME_ENGAGEMENT", "OUTCOME_LEADS",
+              "OUTCOME_APP_PROMOTION", "OUTCOME_SALES", "OUTCOME_LOCAL_AWARENESS", "OUTCOME_VIDEO_VIEWS")
+BILLING_EVENTS = ("IMPRESSIONS", "LINK_CLICKS", "THRUPLAY")
+OPTIMIZATION_GOALS = ("LINK_CLICKS", "REACH", "IMPRESSIONS", "LANDING_PAGE_VIEWS", "OFFSITE_CONVERSIONS",
+                      "POST_ENGAGEMENT", "THRUPLAY", "LEAD_GENERATION", "VALUE", "APP_INSTALLS")
+BID_STRATEGIES = ("LOWEST_COST_WITHOUT_CAP", "COST_CAP", "BID_CAP", "LOWEST_COST_WITH_MIN_ROAS")
+STATUSES = ("PAUSED", "ACTIVE")
+MIN_DAILY_BUDGET = 1000   # in cents, as create_ad_set enforces
+AGE_MIN, AGE_MAX = 13, 65
+COUNTRY_CODES = frozenset("""
+    AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR BS BT BV BW BY BZ
+    CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO
+    FR GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE
+    JM JO JP KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO
+    MP MQ MR MS MT MU MV MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW
+    PY QA RE RO RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF TG TH TJ TK TL TM
+    TN TO TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF WS XK YE YT ZA ZM ZW
+""".split())
+
+# plan section -> object kind, Graph edge under the ad account
+SECTIONS = {"campaigns": ("campaign", "campaigns"), "ad_sets": ("ad_set", "adsets"),
+            "creatives": ("creative", "adcreatives"), "ads": ("ad", "ads")}
+# kind -> reference field in the plan -> (kind it points to, Graph field it fills)
+REFERENCES = {"ad_set": {"campaign": ("campaign", "campaign_id")},
+              "ad": {"ad_set": ("ad_set", "adset_id"), "creative": ("creative", "creative_id")}}
+
+RUNNING, SUCCEEDED, FAILED, ROLLED_BACK = "running", "succeeded", "failed", "rolled_back"
+# Error prefix of requests whose batch call was sent but not answered: they may have run
+OUTCOME_UNKNOWN = "outcome unknown"
+# An object found by name counts as created by a call of unknown outcome if Facebook stamped it no
+# earlier than this before the call (clock skew)
+LOOKUP_SKEW_SECONDS = 300
+
+
+class PlanError(ValueError):
+    """The plan is invalid; `errors` lists every problem found."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid launch plan:\n- " + "\n- ".join(errors))
+
+
+@dataclass
+class Node:
+    key: str
+    kind: str
+    edge: str
+    spec: Dict[str, Any]
+    needs: Dict[str, str]      # Graph field -> key of the plan object whose ID fills it
+    given: Dict[str, str]      # Graph field -> ID of an existing object
+
+
+# --- validation ---
+
+def _check_choice(errors: List[str], where: str, spec: Dict[str, Any], name: str, choices: Tuple[str, ...],
+                  default: str | None = None) -> None:
+    value = spec.get(name, default)
+    if value is None:
+        errors.append(f"{where}.{name}: required, one of {', '.join(choices)}")
+    elif str(value).upper() not in choices:
+        errors.append(f"{where}.{name}: '{value}' is not one of {', '.join(choices)}")
+    else:
+        spec[name] = str(value).upper()
+
+
+def _check_required(errors: List[str], where: str, spec: Dict[str, Any], *names: str) -> None:
+    for name in names:
+        if spec.get(name) in (None, ""):
+            errors.append(f"{where}.{name}: required")
+
+
+def _check_ad_set(errors: List[str], where: str, spec: Dict[str, Any]) -> None:
+    _check_required(errors, where, spec, "name")
+    for name, choices in (("billing_event", BILLING_EVENTS), ("optimization_goal", OPTIMIZATION_GOALS),
+                          ("bid_strategy", BID_STRATEGIES)):
+        _check_choice(errors, where, spec, name, choices)
+    _check_choice(errors, where, spec, "status", STATUSES, "PAUSED")
+    budget = spec.get("daily_budget")
+    if not isinstance(budget, int) or isinstance(budget, bool) or budget < MIN_DAILY_BUDGET:
+        errors.append(f"{where}.daily_budget: must be a whole number of cents, at least {MIN_DAILY_BUDGET}")
+    ages = [spec.get("age_min", 18), spec.get("age_max", AGE_MAX)]
+    if not all(isinstance(a, int) and AGE_MIN <= a <= AGE_MAX for a in ages):
+        errors.append(f"{where}.age_min/age_max: must be whole numbers between {AGE_MIN} and {AGE_MAX}")
+    elif ages[0] > ages[1]:
+        errors.append(f"{where}.age_min: {ages[0]} is above age_max {ages[1]}")
+    countries = spec.get("countries")
+    if not countries or not isinstance(countries, list):
+        errors.append(f"{where}.countries: required, a list of ISO country codes like [\"US\", \"GB\"]")
+    else:
+        unknown = [c for c in countries if str(c).upper() not in COUNTRY_CODES and str(c).upper() != "UK"]
+        if unknown:
+            errors.append(f"{where}.countries: unknown country codes {', '.join(map(str, unknown))}")
+    for name in ("interests", "behaviors"):
+        items = spec.get(name) or []
+        if not isinstance(items, list) or not all(isinstance(i, (str, int)) or (isinstance(i, dict) and i.get("id"))
+                                                  for i in items):
+            errors.append(f"{where}.{name}: must be a list of objects with an `id` (or of IDs)")
+
+
+def parse(plan: Dict[str, Any]) -> Tuple[str, List[Node]]:
+    """Validate a plan without any network call. Returns (ad account ID, nodes); raises PlanError."""
+    errors: List[str] = []
+    if not isinstance(plan, dict):
+        raise PlanError(["the plan must be an object with ad_account_id, campaigns, ad_sets, creatives and ads"])
+    account = str(plan.get("ad_account_id") or "")
+    if not account.removeprefix("act_").isdigit():
+        errors.append("ad_account_id: required, like \"act_1234567890\"")
+    account = account if account.startswith("act_") else f"act_{account}"
+    unknown_sections = set(plan) - set(SECTIONS) - {"ad_account_id"}
+    if unknown_sections:
+        errors.append(f"unknown plan sections: {', '.join(sorted(unknown_sections))} "
+                      f"(expected {', '.join(SECTIONS)})")
+
+    entries = []
+    kinds: Dict[str, str] = {}
+    for section, (kind, edge) in SECTIONS.items():
+        items = plan.get(section) or []
+        if not isinstance(items, list):
+            errors.append(f"{section}: must be a list")
+            continue
+        for i, item in enumerate(items):
+            where = f"{section}[{i}]"
+            if not isinstance(item, dict):
+                errors.append(f"{where}: must be an object")
+                continue
+            spec = dict(item)
+            key = str(spec.pop("key", "") or "")
+            if not key:
+                errors.append(f"{where}.key: required, a name other objects of the plan can refer to")
+            elif key in kinds:
+                errors.append(f"{where}.key: '{key}' is used twice")
+            else:
+                kinds[key] = kind
+            entries.append((where, key, kind, edge, spec))
+    if len(entries) > LAUNCH_MAX_OBJECTS:
+        errors.append(f"the plan has {len(entries)} objects; at most {LAUNCH_MAX_OBJECTS} per launch")
+    if not entries:
+        errors.append("the plan creates nothing")
+
+    nodes = []
+    for where, key, kind, edge, spec in entries:
+        if kind == "campaign":
+            _check_required(errors, where, spec, "name")
+            _check_choice(errors, where, spec, "objective", OBJECTIVES)
+            _check_choice(errors, where, spec, "status", STATUSES, "PAUSED")
+        elif kind == "ad_set":
+            _check_ad_set(errors, where, spec)
+        elif kind == "creative":
+            _check_required(errors, where, spec, "name", "catalog_id", "template_url")
+        else:
+            _check_choice(errors, where, spec, "status", STATUSES, "PAUSED")
+        needs, given = {}, {}
+        for ref, (target, field) in REFERENCES.get(kind, {}).items():
+            value = str(spec.pop(ref, "") or "")
+            if not value:
+                errors.append(f"{where}.{ref}: required, the key of a plan {target} or the ID of an existing one")
+            elif value in kinds:
+                if kinds[value] != target:
+                    errors.append(f"{where}.{ref}: '{value}' is a {kinds[value]}, not a {target}")
+                needs[field] = value
+            elif value.isdigit():
+                given[field] = value
+            else:
+                errors.append(f"{where}.{ref}: '{value}' is neither a key of this plan nor an object ID")
+        nodes.append(Node(key, kind, edge, spec, needs, given))
+    if errors:
+        raise PlanError(errors)
+    return account, nodes
+
+
+def levels(nodes: List[Node]) -> List[List[Node]]:
+    """The DAG in levels: every node comes after the nodes it needs; a level's nodes are independent."""
+    remaining = {n.key: n for n in nodes}
+    done: set = set()
+    result = []
+    while remaining:
+        level = [n for n in remaining.values() if set(n.needs.values()) <= done]
+        if not level:
+            raise PlanError([f"circular references between {', '.join(sorted(remaining))}"])
+        result.append(level)
+        for n in level:
+            done.add(n.key)
+            del remaining[n.key]
+    return result
+
+
+def batch_calls(plan_levels: List[List[Node]]) -> int:
+    return sum(-(-len(level) // LAUNCH_BATCH_SIZE) for level in plan_levels)
+
+
+# --- execution ---
+
+def _refs(node: Node, ids: Dict[str, str]) -> Dict[str, str]:
+    return {**node.given, **{field: ids[key] for field, key in node.needs.items()}}
+
+
+def _name(node: Node) -> str:
+    return node.spec.get("name") or f"Ad {node.key}"
+
+
+def _parent(account: str, node: Node, ids: Dict[str, str]) -> str:
+    """The object whose edge lists `node` once created: its ad set, its campaign, or the ad account."""
+    refs = _refs(node, ids)
+    return {"ad_set": refs.get("campaign_id"), "ad": refs.get("adset_id")}.get(node.kind) or account
+
+
+def _request(account: str, node: Node, ids: Dict[str, str]) -> Dict[str, Any]:
+    refs = _refs(node, ids)
+    spec = node.spec
+    if node.kind == "campaign":
+        body = {"name": spec["name"], "objective": spec["objective"], "status": spec["status"],
+                "special_ad_categories": json.dumps(spec.get("special_ad_categories") or [])}
+    elif node.kind == "ad_set":
+        targeting = build_targeting_spec(spec["countries"], spec.get("age_min", 18), spec.get("age_max", AGE_MAX),
+                                         spec.get("interests"), spec.get("behaviors"))
+        body = {"name": spec["name"], "daily_budget": spec["daily_budget"], "billing_event": spec["billing_event"],
+                "optimization_goal": spec["optimization_goal"], "bid_strategy": spec["bid_strategy"],
+                "status": spec["status"], "campaign_id": refs["campaign_id"], "targeting": json.dumps(targeting)}
+    elif node.kind == "creative":
+        body = {"name": spec["name"], "catalog_id": spec["catalog_id"],
+                "product_set_id": spec.get("product_set_id") or "default", "template_url": spec["template_url"]}
+    else:
+        creative = {"creative_id": refs["creative_id"]}
+        if spec.get("is_catalog_ad"):
+            creative["template_url"] = spec.get("template_url") or "https://www.example.com"
+        body = {"name": _name(node), "adset_id": refs["adset_id"],
+                "creative": json.dumps(creative), "status": spec["status"]}
+    return {"method": "POST", "relative_url": f"{account}/{node.edge}", "body": urlencode(body)}
+
+
+def _send_batch(requests_: List[Dict[str, Any]]) -> List[Tuple[str | None, str | None]]:
+    """One Graph batch call; (ID, error) per sub-request."""
+    response = http_client.post(fb_base_url, data={"batch": json.dumps(requests_), "include_headers": "false",
+                                                   "access_token": fb_access_token})
+    response.raise_for_status()
+    results = []
+    for answer in response.json():
+        if answer is None:
+            results.append((None, "no answer (the batch timed out before this request ran)"))
+            continue
+        try:
+            body = json.loads(answer.get("body") or "{}")
+        except ValueError:
+            body = {}
+        if answer.get("code") == 200:
+            results.append((body.get("id") or "", None))
+        else:
+            results.append((None, body.get("error", {}).get("message") or f"HTTP {answer.get('code')}"))
+    return results
+
+
+def _run_batches(requests_: List[Dict[str, Any]]) -> List[Tuple[str | None, str | None]]:
+    """Send the requests in batches of LAUNCH_BATCH_SIZE, LAUNCH_CONCURRENCY batches at once."""
+    chunks = [requests_[i:i + LAUNCH_BATCH_SIZE] for i in range(0, len(requests_), LAUNCH_BATCH_SIZE)]
+    results: List[Tuple[str | None, str | None]] = []
+    with ThreadPoolExecutor(max_workers=max(1, min(LAUNCH_CONCURRENCY, len(chunks)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, _send_batch, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                results.extend(future.result())
+            except (requests.exceptions.HTTPError, requests.exceptions.ConnectTimeout, breakers.CircuitOpenError,
+                    deadline.DeadlineExceeded, deadline.CallCancelled) as e:
+                # Refused by Graph, or never sent: none of its requests ran
+                results.extend((None, f"batch call failed: {e}") for _ in chunk)
+            except Exception as e:
+                # Sent without an answer (read timeout, dropped connection, bad response): they may have run
+                results.extend((None, f"{OUTCOME_UNKNOWN}: {e}") for _ in chunk)
+    return results
+
+
+def _timestamp(value: str | None) -> float | None:
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _find_created(state: Dict[str, Any], nodes: List[Node]) -> None:
+    """
+    Look for the objects of `nodes` (all in `state["unknown"]`) by name under their parent. Found ones are
+    recorded as created, the others as never created; raises RequestException if Facebook can't be asked.
+    """
+    account, ids = state["ad_account_id"], state["created"]
+    taken = set(ids.values())
+    groups: Dict[Tuple[str, str], List[Node]] = {}
+    for node in nodes:
+        groups.setdefault((_parent(account, node, ids), node.edge), []).append(node)
+    for (parent, edge), group in groups.items():
+        since = min(state["unknown"][n.key] for n in group) - LOOKUP_SKEW_SECONDS
+        params = {"fields": "id,name" if edge == "adcreatives" else "id,name,created_time",  # creatives have none
+                  "filtering": json.dumps([{"field": "name", "operator": "IN",
+                                            "value": sorted({_name(n) for n in group})}]),
+                  "limit": 500, "access_token": fb_access_token}
+        response = http_client.get(f"{fb_base_url}{parent}/{edge}", params=params, revalidate=False)
+        response.raise_for_status()
+        found: Dict[str, List[str]] = {}
+        for item in response.json().get("data", []):
+            created_at = _timestamp(item.get("created_time"))
+            if item["id"] not in taken and (created_at is None or created_at >= since):
+                found.setdefault(item.get("name"), []).append(item["id"])
+        for node in group:
+            matches = found.get(_name(node))
+            if matches:
+                ids[node.key] = matches.pop(0)
+                taken.add(ids[node.key])
+            del state["unknown"][node.key]
+
+
+def _resolve(state: Dict[str, Any], nodes: List[Node]) -> bool:
+    """Settle the nodes of unknown outcome; False when it could not be checked (they stay unknown)."""
+    try:
+        _find_created(state, nodes)
+    except requests.exceptions.RequestException as e:
+        for node in nodes:
+            if node.key in state["unknown"]:
+                state["errors"][node.key] = (f"{OUTCOME_UNKNOWN}: it may have been created, and checking failed "
+                                             f"({e}); resuming or rolling back checks again")
+        return False
+    for node in nodes:
+        if node.key in state["created"]:
+            state["errors"].pop(node.key, None)
+            log.info("launch object found after an unanswered batch call", launch_id=state["id"], key=node.key)
+        elif node.key in state["errors"]:
+            state["errors"][node.key] += "; it was not created"
+    return True
+
+
+def _save(state: Dict[str, Any]) -> None:
+    cache.set("launch_plans", state["id"], state)
+
+
+def load(launch_id: str) -> Dict[str, Any] | None:
+    return cache.get("launch_plans", launch_id)
+
+
+def new_state(plan: Dict[str, Any], account: str) -> Dict[str, Any]:
+    # unknown: plan key -> time of the unanswered batch call that may have created it
+    return {"id": uuid.uuid4().hex[:12], "ad_account_id": account, "plan": plan, "status": RUNNING,
+            "created": {}, "unknown": {}, "errors": {}, "deleted": [], "batch_calls": 0}
+
+
+def run(state: Dict[str, Any], nodes: List[Node], rollback_on_failure: bool) -> Dict[str, Any]:
+    """Create the plan's objects level by level, skipping those `state` already records as created."""
+    started = time.monotonic()
+    account = state["ad_account_id"]
+    plan_levels = levels(nodes)
+    state["status"], state["errors"] = RUNNING, {}
+    state.setdefault("unknown", {})
+    for depth, level in enumerate(plan_levels):
+        # Left unsettled by an earlier run: look before creating them again
+        unsure = [n for n in level if n.key in state["unknown"]]
+        if unsure and not _resolve(state, unsure):
+            break
+        todo = [n for n in level if n.key not in state["created"]]
+        if not todo:
+            continue
+        sent = time.time()
+        results = _run_batches([_request(account, n, state["created"]) for n in todo])
+        state["batch_calls"] += -(-len(todo) // LAUNCH_BATCH_SIZE)
+        for node, (object_id, error) in zip(todo, results):
+            if error is None:
+                state["created"][node.key] = object_id
+            else:
+                state["errors"][node.key] = error
+                if error.startswith(OUTCOME_UNKNOWN):
+                    state["unknown"][node.key] = sent
+        unsure = [n for n in todo if n.key in state["unknown"]]
+        if unsure:
+            _resolve(state, unsure)
+        _save(state)
+        log.info("launch level done", launch_id=state["id"], depth=depth, created=len(todo) - len(state["errors"]),
+                 failed=len(state["errors"]))
+        if state["errors"]:
+            break
+    if state["created"]:
+        cache.invalidate("campaigns", account)
+        cache.invalidate("adsets")
+
+    if not state["errors"]:
+        state["status"] = SUCCEEDED
+    elif rollback_on_failure:
+        rollback(state, nodes)
+    else:
+        state["status"] = FAILED
+    _save(state)
+    return summary(state, nodes, time.monotonic() - started)
+
+
+def rollback(state: Dict[str, Any], nodes: List[Node]) -> None:
+    """Delete what the launch created, dependents first."""
+    # The launch may have used up the call's deadline; cleaning up gets its own
+    with deadline.scope(LAUNCH_ROLLBACK_SECONDS):
+        unsure = [n for n in nodes if n.key in state.get("unknown", {})]
+        if unsure:
+            _resolve(state, unsure)
+        for level in reversed(levels(nodes)):
+            keys = [n.key for n in level if n.key in state["created"]]
+            if not keys:
+                continue
+            results = _run_batches([{"method": "DELETE", "relative_url": state["created"][k]} for k in keys])
+            state["batch_calls"] += -(-len(keys) // LAUNCH_BATCH_SIZE)
+            for key, (_, error) in zip(keys, results):
+                if error is None:
+                    state["deleted"].append(state["created"].pop(key))
+                else:
+                    state["errors"][key] = f"{state['errors'].get(key, 'created')}; rollback failed: {error}"
+    state["status"] = ROLLED_BACK if not state["created"] and not state.get("unknown") else FAILED
+    log.info("launch rolled back", launch_id=state["id"], deleted=len(state["deleted"]),
+             left=len(state["created"]))
+
+
+def summary(state: Dict[str, Any], nodes: List[Node], seconds: float | None = None) -> Dict[str, Any]:
+    kind_of = {n.key: n.kind for n in nodes}
+    created: Dict[str, int] = {}
+    for key in state["created"]:
+        created[kind_of.get(key, "object")] = created.get(kind_of.get(key, "object"), 0) + 1
+    result = {
+        "launch_id": state["id"],
+        "status": state["status"],
+        "created": created,
+        "ids": state["created"],
+        "errors": [{"key": k, "kind": kind_of.get(k), "error": e} for k, e in state["errors"].items()],
+        "pending": [n.key for n in nodes if n.key not in state["created"] and n.key not in state["errors"]],
+        "batch_calls": state["batch_calls"],
+    }
+    if state["deleted"]:
+        result["rolled_back"] = len(state["deleted"])
+    if seconds is not None:
+        result["seconds"] = round(seconds, 2)
+    return result
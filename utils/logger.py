@@ -0,0 +1,162 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from config.settings import LOG_LEVEL, LOG_SAMPLE_RATE, LOG_MAX_PAYLOAD_CHARS, LOG_QUEUE_SIZE
+
+# Correlation ID and sampling decision of the tool call currently being served.
+# Both are context variables so concurrent calls (and the threads they spawn) keep their own values.
+correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("correlation_id", default=None)
+current_tool: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_tool", default=None)
+_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("log_sampled", default=True)
+
+# Argument / field names whose values must never reach the logs
+SECRET_KEYS = {"access_token", "appid", "app_secret", "fb_access_token", "password", "token"}
+
+dropped_records = 0
+
+
+def _redact(value: Any, limit: int = LOG_MAX_PAYLOAD_CHARS) -> Any:
+    """Make a logged value safe and small: hide secrets, summarise big payloads."""
+    if isinstance(value, dict):
+        if len(value) > 20:
+            return f"<dict with {len(value)} keys>"
+        return {k: "***" if k in SECRET_KEYS else _redact(v, limit) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        if len(value) > 20:
+            return f"<{type(value).__name__} with {len(value)} items>"
+        return [_redact(v, limit) for v in value]
+    if isinstance(value, (str, bytes)):
+        if len(value) > limit:
+            return f"{value[:limit]!s}... <{len(value)} chars>"
+        return value if isinstance(value, str) else f"<{len(value)} bytes>"
+    if value is None or isinstance(value, (int, float, bool)):
+        return value
+    text = repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}... <{len(text)} chars>"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line. Runs on the listener thread, never on the request path."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(_redact(fields))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener without formatting them and drops them when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting (and payload redaction) is deferred to the listener thread.
+        record.correlation_id = correlation_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger that takes structured fields as keyword arguments: `log.info("msg", campaign_id=...)`."""
+
+    def log(self, level: int, msg: str, *args: Any, exc_info: Any = None, **fields: Any) -> None:
+        if self.isEnabledFor(level):
+            self.logger.log(level, msg, *args, exc_info=exc_info, extra={"fields": fields}, stacklevel=3)
+
+    def debug(self, msg: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg: str, *args: Any, **fields: Any) -> None:
+        self.log(logging.ERROR, msg, *args, exc_info=True, **fields)
+
+
+# --- queue + listener wiring ---
+# Output goes to stderr: stdout is the protocol channel for the stdio transport.
+_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_stream_handler = logging.StreamHandler(sys.stderr)
+_stream_handler.setFormatter(JsonFormatter())
+_listener = logging.handlers.QueueListener(_queue, _stream_handler, respect_handler_level=False)
+
+_root = logging.getLogger("fbmcp")
+_root.setLevel(LOG_LEVEL)
+_root.propagate = False
+_queue_handler = _NonBlockingQueueHandler(_queue)
+_queue_handler.addFilter(_SamplingFilter())
+_root.addHandler(_queue_handler)
+
+_listener.start()
+atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Return a structured logger under the shared `fbmcp` hierarchy."""
+    return StructuredLogger(_root.getChild(name), {})
+
+
+_call_log = get_logger("tool_call")
+
+
+@contextmanager
+def tool_call(name: str, arguments: Dict[str, Any] | None = None):
+    """
+    Scope one tool call: assign a correlation ID, make the sampling decision and log start/finish.
+    Yields the correlation ID.
+    """
+    cid = uuid.uuid4().hex[:16]
+    cid_token = correlation_id.set(cid)
+    tool_token = current_tool.set(name)
+    sampled_token = _sampled.set(LOG_SAMPLE_RATE >= 1.0 or random.random() < LOG_SAMPLE_RATE)
+    started = time.perf_counter()
+    _call_log.info("tool call started", tool=name, arguments=arguments or {})
+    try:
+        yield cid
+    except BaseException as e:
+        _call_log.error("tool call failed", tool=name, error=str(e),
+                        elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+        raise
+    else:
+        _call_log.info("tool call finished", tool=name,
+                       elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+    finally:
+        _sampled.reset(sampled_token)
+        current_tool.reset(tool_token)
+        correlation_id.reset(cid_token)
@@ -0,0 +1,111 @@
+"""
+Tool registration, eager or manifest-driven (lazy).
+
+Eager mode imports every tool module so the `@myserver.tool()` decorators run at startup.
+Lazy mode registers tools from a prebuilt manifest (name, description, JSON schema, module) so
+`list_tools` is answered without importing the implementations or their dependencies; a module is
+imported on the first call of one of its tools. A manifest entry whose module source changed since
+the manifest was built is ignored and that module is imported eagerly instead, so a stale manifest
+can never advertise the wrong schema.
+
+Rebuild the manifest after changing any tool signature or docstring:
+    python -m utils.manifest
+"""
+import hashlib
+import importlib
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from config.settings import TOOL_LOADING
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MANIFEST_PATH = REPO_ROOT / "tools" / "manifest.json"
+
+# Every module that registers tools. New tool modules must be added here.
+TOOL_MODULES: List[str] = [
+    "tools.general.weather",
+    "tools.general.results",
+    "tools.general.jobs",
+    "tools.facebook.accounts",
+    "tools.facebook.resolver",
+    "tools.facebook.fanout",
+    "tools.facebook.campaigns",
+    "tools.facebook.catalogs",
+    "tools.facebook.products",
+    "tools.facebook.adsets",
+    "tools.facebook.copies",
+    "tools.facebook.ad_images",
+    "tools.facebook.ad_videos",
+    "tools.facebook.ad_creative",
+    "tools.facebook.catalog_creative",
+    "tools.facebook.pages",
+    "tools.facebook.helpers",
+    "tools.facebook.facebook_ads",
+    "tools.facebook.launch",
+]
+
+
+def _source_hash(module: str) -> str:
+    path = REPO_ROOT / (module.replace(".", "/") + ".py")
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def import_all() -> None:
+    for module in TOOL_MODULES:
+        importlib.import_module(module)
+
+
+def build_manifest(server, path: Path = MANIFEST_PATH) -> Dict:
+    """Import every tool module and write the registered tool schemas to `path`."""
+    import_all()
+    tools = []
+    for tool in server._tool_manager.list_tools():
+        tools.append({
+            "name": tool.name,
+            "description": tool.description,
+            "parameters": tool.parameters,
+            "annotations": tool.annotations.model_dump(exclude_none=True) if tool.annotations else None,
+            "module": tool.fn.__module__,
+        })
+    manifest = {
+        "modules": {module: _source_hash(module) for module in TOOL_MODULES},
+        "tools": tools,
+    }
+    path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    return manifest
+
+
+def register_tools(server) -> None:
+    """Register all tools on `server`, lazily from the manifest when TOOL_LOADING=lazy and one exists."""
+    if TOOL_LOADING != "lazy" or not MANIFEST_PATH.exists():
+        import_all()
+        return
+
+    from mcp.types import ToolAnnotations
+
+    manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    recorded = manifest.get("modules", {})
+    fresh = {module for module in TOOL_MODULES if recorded.get(module) == _source_hash(module)}
+    for entry in manifest["tools"]:
+        if entry["module"] in fresh:
+            annotations = ToolAnnotations(**entry["annotations"]) if entry.get("annotations") else None
+            server.add_lazy_tool(entry["name"], entry["description"], entry["parameters"],
+                                 entry["module"], annotations)
+    stale = [module for module in TOOL_MODULES if module not in fresh]
+    if stale:
+        log.warning("tool manifest is stale, importing modules eagerly", modules=stale)
+        for module in stale:
+            importlib.import_module(module)
+
+
+if __name__ == "__main__":
+    from utils.server import myserver
+
+    result = build_manifest(myserver)
+    print(f"Wrote {len(result['tools'])} tools from {len(result['modules'])} modules to {MANIFEST_PATH}",
+          file=sys.stderr)
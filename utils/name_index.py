@@ -0,0 +1,353 @@
+"""
+Local name → ID index of the objects users refer to by name: businesses, ad accounts, campaigns,
+ad sets and catalogs, one index per access token.
+
+The index is built from the Graph listing endpoints (all pages) and kept fresh incrementally:
+- businesses, ad accounts and catalogs are small and are re-listed when older than NAME_INDEX_REFRESH_SECONDS;
+- campaigns and ad sets of an ad account are listed once, then only objects with a newer
+  `updated_time` are fetched (deleted ones are dropped);
+- webhook deliveries (utils/webhooks.py) mark the affected part as stale right away.
+Only the parts a lookup needs are refreshed: with an ad account in the query, only that account's
+campaigns and ad sets. The index is saved in the cache ("name_index"), so other workers and
+restarts start from it and continue with deltas.
+
+Matching is fuzzy and token based: "summer sale" finds "Summer Sale 2024 - EU", "sumer sale" still
+matches. `resolve("Summer Sale campaign in the EU account")` splits the query into a target and
+scopes, resolves the scopes first and matches the target inside them. "in"/"from" only start a scope
+when what follows names a type that can hold the target or an existing entity, so "Made in Italy
+campaign" stays one name. Campaigns and ad sets are inside a business through its ad accounts.
+"""
+import contextvars
+import difflib
+import hashlib
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+from config.settings import fb_base_url, NAME_INDEX_REFRESH_SECONDS, NAME_INDEX_CONCURRENCY
+from utils import http_client, webhooks
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+ENTITY_TYPES = ("business", "ad_account", "campaign", "adset", "catalog")
+# Words naming an entity type in a query, longest first
+TYPE_WORDS = [("business accounts", "business"), ("business account", "business"), ("businesses", "business"),
+              ("business", "business"), ("ad accounts", "ad_account"), ("ad account", "ad_account"),
+              ("accounts", "ad_account"), ("account", "ad_account"), ("campaigns", "campaign"),
+              ("campaign", "campaign"), ("ad sets", "adset"), ("ad set", "adset"), ("adsets", "adset"),
+              ("adset", "adset"), ("catalogues", "catalog"), ("catalogue", "catalog"), ("catalogs", "catalog"),
+              ("catalog", "catalog")]
+SCOPE_SPLIT = re.compile(r"\s+(?:in|under|within|from|inside)\s+(?:the\s+)?", re.IGNORECASE)
+STOPWORDS = {"the", "a", "an", "my", "our", "called", "named"}
+# Graph stamps vs. our clock: re-fetch a little overlap on every delta
+DELTA_OVERLAP_SECONDS = 120
+MIN_SCORE = 0.5
+# An untyped clause after "in"/"from" is only taken as a scope when it matches an entity this well
+SCOPE_MIN_SCORE = 0.8
+
+
+def normalize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+def _token_score(query: List[str], name: List[str]) -> float:
+    """How well the query tokens are covered by the name tokens (typos and prefixes count partially)."""
+    if not query or not name:
+        return 0.0
+    total = 0.0
+    for q in query:
+        best = 0.0
+        for n in name:
+            if q == n:
+                best = 1.0
+                break
+            if len(q) >= 2 and n.startswith(q):
+                best = max(best, 0.9)
+            elif len(q) >= 4:
+                ratio = difflib.SequenceMatcher(None, q, n).ratio()
+                if ratio >= 0.75:
+                    best = max(best, ratio * 0.9)
+        total += best
+    recall = total / len(query)
+    precision = min(1.0, total / len(name))
+    return 0.8 * recall + 0.2 * precision
+
+
+def score(query: str, name: str) -> float:
+    query_tokens, name_tokens = normalize(query), normalize(name)
+    whole = difflib.SequenceMatcher(None, " ".join(query_tokens), " ".join(name_tokens)).ratio()
+    return round(max(_token_score(query_tokens, name_tokens), whole), 3)
+
+
+class NameIndex:
+    def __init__(self, token: str, token_key: str):
+        self.token = token
+        self.key = token_key
+        # (type, id) -> {"type", "id", "name", "status", "ad_account_id", "campaign_id", "business_id"}
+        self.entities: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # part of the index ("top" for businesses/ad accounts/catalogs, "account:act_1") -> last sync (epoch seconds)
+        self.synced: Dict[str, float] = {}
+        self.dirty: set = set()
+        self._lock = threading.RLock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        saved = cache.get("name_index", token_key)
+        if saved:
+            self.entities = {(e["type"], e["id"]): e for e in saved["entities"]}
+            self.synced = saved["synced"]
+
+    # --- Graph listings ---
+
+    def _list(self, path: str, fields: str, filtering: List[Dict[str, Any]] | None = None) -> List[Dict[str, Any]]:
+        """Every item of a listing edge, following `paging.next`."""
+        params: Dict[str, Any] | None = {"fields": fields, "limit": 500, "access_token": self.token}
+        if filtering:
+            params["filtering"] = json.dumps(filtering)
+        url, items = f"{fb_base_url}{path}", []
+        while url:
+            response = http_client.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            items.extend(data.get("data", []))
+            url, params = data.get("paging", {}).get("next"), None  # the next URL carries all parameters
+        return items
+
+    def _replace(self, types: Iterable[str], match: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+        """Swap the entities of `types` whose fields equal `match` for `rows`."""
+        types = set(types)
+        with self._lock:
+            for key in [k for k, e in self.entities.items()
+                        if k[0] in types and all(e.get(f) == v for f, v in match.items())]:
+                del self.entities[key]
+            for row in rows:
+                self.entities[(row["type"], row["id"])] = row
+
+    def _refresh_top(self) -> None:
+        businesses = [{"type": "business", "id": b["id"], "name": b.get("name", "")}
+                      for b in self._list("me/businesses", "id,name")]
+        self._replace(["business"], {}, businesses)
+        accounts = [{"type": "ad_account", "id": a["id"], "name": a.get("name", ""),
+                     "business_id": (a.get("business") or {}).get("id")}
+                    for a in self._list("me/adaccounts", "id,name,business")]
+        self._replace(["ad_account"], {}, accounts)
+        catalogs = []
+        for business in businesses:
+            catalogs += [{"type": "catalog", "id": c["id"], "name": c.get("name", ""), "business_id": business["id"]}
+                         for c in self._list(f"{business['id']}/owned_product_catalogs", "id,name")]
+        self._replace(["catalog"], {}, catalogs)
+
+    def _refresh_account(self, ad_account_id: str, since: float | None) -> None:
+        """Campaigns and ad sets of one account: all of them, or only those updated after `since`."""
+        filtering = None
+        if since is not None:
+            filtering = [{"field": "updated_time", "operator": "GREATER_THAN", "value": int(since - DELTA_OVERLAP_SECONDS)},
+                         {"field": "effective_status", "operator": "IN",
+                          "value": ["ACTIVE", "PAUSED", "DELETED", "ARCHIVED", "IN_PROCESS", "WITH_ISSUES",
+                                    "CAMPAIGN_PAUSED", "ADSET_PAUSED"]}]
+        campaigns = self._list(f"{ad_account_id}/campaigns", "id,name,status,effective_status", filtering)
+        adsets = self._list(f"{ad_account_id}/adsets", "id,name,status,effective_status,campaign_id", filtering)
+        rows = [{"type": "campaign", "id": c["id"], "name": c.get("name", ""), "status": c.get("status"),
+                 "ad_account_id": ad_account_id} for c in campaigns]
+        rows += [{"type": "adset", "id": s["id"], "name": s.get("name", ""), "status": s.get("status"),
+                  "ad_account_id": ad_account_id, "campaign_id": s.get("campaign_id")} for s in adsets]
+        if since is None:
+            self._replace(["campaign", "adset"], {"ad_account_id": ad_account_id}, rows)
+            return
+        with self._lock:
+            for row in rows:
+                if row["status"] == "DELETED":
+                    self.entities.pop((row["type"], row["id"]), None)
+                else:
+                    self.entities[(row["type"], row["id"])] = row
+
+    def _refresh(self, part: str) -> bool:
+        """Bring one part of the index up to date if it is stale. Returns True when it changed."""
+        lock = self._refresh_locks.setdefault(part, threading.Lock())
+        with lock:  # concurrent lookups wait for one refresh instead of repeating it
+            last = self.synced.get(part)
+            if last is not None and part not in self.dirty and time.time() - last < NAME_INDEX_REFRESH_SECONDS:
+                return False
+            started = time.time()
+            self.dirty.discard(part)
+            if part == "top":
+                self._refresh_top()
+            else:
+                self._refresh_account(part.split(":", 1)[1], last)
+            self.synced[part] = started
+            log.debug("name index refreshed", part=part, delta=last is not None, seconds=round(time.time() - started, 3))
+            return True
+
+    def ensure_fresh(self, ad_account_ids: List[str] | None = None, with_ad_objects: bool = True) -> None:
+        """Refresh the top-level part, then campaigns/ad sets of the given accounts (all accounts by default)."""
+        changed = self._refresh("top")
+        if with_ad_objects:
+            if ad_account_ids is None:
+                ad_account_ids = [e["id"] for e in self.entities.values() if e["type"] == "ad_account"]
+            parts = [f"account:{a}" for a in ad_account_ids]
+            with ThreadPoolExecutor(max_workers=NAME_INDEX_CONCURRENCY) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, self._refresh, p) for p in parts]
+                changed = any([f.result() for f in futures]) or changed
+        if changed:
+            with self._lock:
+                snapshot = {"entities": list(self.entities.values()), "synced": dict(self.synced)}
+            cache.set("name_index", self.key, snapshot)
+
+    def mark_stale(self, part: str) -> None:
+        self.dirty.add(part)
+
+    def accounts_of(self, business_id: str) -> List[str]:
+        with self._lock:
+            return [e["id"] for e in self.entities.values()
+                    if e["type"] == "ad_account" and e.get("business_id") == business_id]
+
+    # --- lookups ---
+
+    def search(self, text: str, types: Iterable[str], within: Dict[str, Any] | None = None,
+               limit: int = 5) -> List[Dict[str, Any]]:
+        """Best matches for `text` among entities of `types`, optionally restricted to a scope entity."""
+        types = set(types)
+        accounts = set(self.accounts_of(within["id"])) if within and within["type"] == "business" else set()
+        with self._lock:
+            candidates = [e for e in self.entities.values() if e["type"] in types and _inside(e, within, accounts)]
+        scored = []
+        for entity in candidates:
+            s = score(text, entity["name"])
+            if entity["id"] == text.strip():
+                s = 1.0
+            if s >= MIN_SCORE:
+                scored.append({**entity, "score": s})
+        scored.sort(key=lambda e: (-e["score"], e["name"]))
+        return scored[:limit]
+
+
+def _inside(entity: Dict[str, Any], scope: Dict[str, Any] | None, business_accounts: set) -> bool:
+    if scope is None:
+        return True
+    if scope["type"] == "business" and entity["type"] in ("campaign", "adset"):
+        # Campaign and ad set rows carry no business: they belong to it through its ad accounts
+        return entity.get("ad_account_id") in business_accounts
+    field = {"business": "business_id", "ad_account": "ad_account_id", "campaign": "campaign_id"}.get(scope["type"])
+    return field is not None and entity.get(field) == scope["id"]
+
+
+def _clause(clause: str) -> Tuple[str, str | None]:
+    """A clause's name and the entity type it names, if any: "the EU account" -> ("the EU", "ad_account")."""
+    text, kind = clause.strip(), None
+    lowered = text.lower()
+    for word, entity_type in TYPE_WORDS:
+        if lowered.endswith(" " + word) or lowered.startswith(word + " ") or lowered == word:
+            kind = entity_type
+            text = (text[:-len(word)] if lowered.endswith(word) else text[len(word):]).strip(" ,:'\"")
+            break
+    return text or clause.strip(), kind
+
+
+def parse_query(query: str, is_scope: Any = None) -> List[Tuple[str, str | None]]:
+    """
+    Split "Summer Sale campaign in the EU account" into [("Summer Sale", "campaign"), ("EU", "ad_account")].
+    A clause after "in"/"from"/... is a scope when `is_scope(left clause, clause)` says so (by default when
+    it names a type); otherwise it stays part of the name before it.
+    """
+    query = query.strip()
+    parts, separators = SCOPE_SPLIT.split(query), SCOPE_SPLIT.findall(query)
+    is_scope = is_scope or (lambda left, right: right[1] is not None)
+    for i in range(len(parts) - 1, 0, -1):
+        if not is_scope(_clause(parts[i - 1]), _clause(parts[i])):
+            parts[i - 1] += separators[i - 1] + parts.pop(i)
+    return [_clause(part) for part in parts]
+
+
+# Types a scope of each type may contain
+CHILD_TYPES = {"business": ["ad_account", "catalog"], "ad_account": ["campaign", "adset"], "campaign": ["adset"]}
+# ... directly or further down
+CONTAINED_TYPES = {"business": {"ad_account", "catalog", "campaign", "adset"}, "ad_account": {"campaign", "adset"},
+                   "campaign": {"adset"}}
+
+
+def _accounts_in(index: NameIndex, scope: Dict[str, Any] | None) -> List[str] | None:
+    """Ad accounts whose campaigns and ad sets a lookup inside `scope` needs; None for all of them."""
+    if scope is None:
+        return None
+    if scope["type"] == "ad_account":
+        return [scope["id"]]
+    if scope["type"] == "business":
+        return index.accounts_of(scope["id"])
+    return [scope["ad_account_id"]] if scope.get("ad_account_id") else None
+
+
+def resolve(index: NameIndex, query: str, entity_type: str | None = None, limit: int = 5) -> Dict[str, Any]:
+    index.ensure_fresh(with_ad_objects=False)
+
+    def is_scope(left: Tuple[str, str | None], right: Tuple[str, str | None]) -> bool:
+        if left[1] and right[1]:
+            return left[1] in CONTAINED_TYPES.get(right[1], ())
+        # Otherwise only when the clause names an existing container, and the words don't rather make up
+        # one whole name: "Made in Italy campaign" is a campaign, not "Made" inside an "Italy" campaign
+        kinds = [right[1]] if right[1] else ["ad_account", "business"]
+        if not set(kinds) & set(CONTAINED_TYPES):
+            return False
+        if set(kinds) & {"campaign", "adset"}:
+            index.ensure_fresh()
+        found = index.search(right[0], kinds, limit=1)
+        if not found or found[0]["score"] < SCOPE_MIN_SCORE:
+            return False
+        whole = index.search(f"{left[0]} {right[0]}", [left[1]] if left[1] else kinds, limit=1)
+        return not whole or whole[0]["score"] < found[0]["score"]
+
+    clauses = parse_query(query, is_scope)
+    target_text, target_type = clauses[0]
+    target_type = entity_type or target_type
+
+    # Scopes from the outermost in: "X in Y in Z" resolves Z, then Y inside Z
+    scope, scopes = None, []
+    for text, kind in reversed(clauses[1:]):
+        kinds = [kind] if kind else (CHILD_TYPES.get(scope["type"], []) if scope else ["ad_account", "business"])
+        if kinds and set(kinds) & {"campaign", "adset"}:
+            index.ensure_fresh(_accounts_in(index, scope))
+        found = index.search(text, kinds, scope, limit=1)
+        if not found:
+            return {"query": query, "matches": [], "note": f"No {kind or 'account or business'} matches '{text}'."}
+        scope = found[0]
+        scopes.append({k: scope[k] for k in ("type", "id", "name", "score")})
+
+    types = [target_type] if target_type else list(ENTITY_TYPES)
+    if scope is not None and not target_type:
+        types = CHILD_TYPES.get(scope["type"], types)
+    if set(types) & {"campaign", "adset"}:
+        index.ensure_fresh(_accounts_in(index, scope))
+    matches = index.search(target_text, types, scope, limit)
+    result: Dict[str, Any] = {"query": query, "matches": matches}
+    if scopes:
+        result["scope"] = scopes
+    if matches and (len(matches) == 1 or matches[0]["score"] - matches[1]["score"] >= 0.1) and matches[0]["score"] >= 0.8:
+        result["best"] = matches[0]
+    return result
+
+
+_indexes: Dict[str, NameIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(token: str) -> NameIndex:
+    token_key = hashlib.sha1((token or "").encode()).hexdigest()[:16]
+    with _indexes_lock:
+        if token_key not in _indexes:
+            _indexes[token_key] = NameIndex(token, token_key)
+        return _indexes[token_key]
+
+
+def _on_change(event: webhooks.ChangeEvent) -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        if event.ad_account_id and event.level in ("campaign", "adset"):
+            index.mark_stale(f"account:{event.ad_account_id}")
+        elif event.level == "catalog":
+            index.mark_stale("top")
+
+
+webhooks.subscribe(_on_change)
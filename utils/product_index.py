@@ -0,0 +1,354 @@
+"""
+Local search index over catalog products: an inverted index over name and description plus
+columnar attributes (price in minor units, availability) for range and equality filters.
+
+One index per catalog and worker. It is built page by page by a background job (see utils/jobs.py);
+an interrupted build resumes from the last page it read. Until the index is ready, and for catalogs
+never searched before, `search_catalog_products` pushes its filters down to the Graph `filter`
+parameter instead. A ready index is rebuilt in the background once it is older than
+PRODUCT_INDEX_REFRESH_SECONDS (the old one keeps serving meanwhile); in between, product change
+webhooks refresh just the changed products. At most PRODUCT_INDEX_MAX_CATALOGS indexes are kept per
+worker; the least recently searched one is dropped first.
+
+Rows are append-only: an updated product gets a new row and its old row is tombstoned, so posting
+lists stay sorted and never need rewriting.
+"""
+import heapq
+import json
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+import requests
+from config.settings import (fb_access_token, fb_base_url, PRODUCT_INDEX_MAX_CATALOGS, PRODUCT_INDEX_REFRESH_SECONDS,
+                             PRODUCT_INDEX_PAGE_SIZE)
+from utils import http_client, webhooks
+from utils.jobs import manager
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+FIELDS = "id,name,description,price,availability,retailer_id,image_url,url"
+# What searches return per product (descriptions are only indexed)
+RESULT_FIELDS = "id,name,price,availability,retailer_id,image_url,url"
+AVAILABILITY = ("in stock", "out of stock", "preorder", "available for order", "discontinued", "pending",
+                "mark_as_sold")
+UNKNOWN_PRICE = -1
+# Graph `?ids=` lookups take at most this many IDs
+IDS_PER_LOOKUP = 50
+
+
+def tokens(text: str | None) -> List[str]:
+    # "Shirts" finds "shirt": a light plural fold is enough for product titles
+    return [t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+            for t in re.findall(r"[a-z0-9]+", (text or "").lower())]
+
+
+def parse_price(price: Any) -> int:
+    """Graph prices come formatted ("$1,234.50", "12.99 EUR"); returns minor units."""
+    if isinstance(price, (int, float)):
+        return int(round(price * 100))
+    number = re.search(r"\d[\d,]*(?:\.\d+)?", str(price or ""))
+    if number is None:
+        return UNKNOWN_PRICE
+    return int(round(float(number.group().replace(",", "")) * 100))
+
+
+class ProductIndex:
+    def __init__(self, catalog_id: str):
+        self.catalog_id = catalog_id
+        self.built_at = 0.0
+        # columns, one entry per row
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.extra: List[Tuple[str | None, ...]] = []   # price as shown, retailer_id, image_url, url
+        self.price = array("q")                          # minor units, for filters and sorting
+        self.availability = bytearray()
+        self.alive = bytearray()
+        # product ID -> current row; term -> rows; a term is a word, "n:" + word for names, "a:" + availability
+        self.row_of: Dict[str, int] = {}
+        self.postings: Dict[str, array] = {}
+        self._by_price: Tuple[array, array] | None = None   # (rows sorted by price, their prices)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.row_of)
+
+    def add(self, products: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            for product in products:
+                old = self.row_of.get(product["id"])
+                if old is not None:
+                    self.alive[old] = 0
+                row = len(self.ids)
+                self.ids.append(product["id"])
+                self.names.append(product.get("name") or "")
+                self.extra.append((product.get("price"), product.get("retailer_id"), product.get("image_url"),
+                                   product.get("url")))
+                self.price.append(parse_price(product.get("price")))
+                availability = product.get("availability") or ""
+                self.availability.append(AVAILABILITY.index(availability) if availability in AVAILABILITY else 255)
+                self.alive.append(1)
+                self.row_of[product["id"]] = row
+                name_terms = set(tokens(product.get("name")))
+                terms = name_terms | set(tokens(product.get("description")))
+                for term in [*terms, *(f"n:{t}" for t in name_terms), f"a:{availability}"]:
+                    self.postings.setdefault(term, array("i")).append(row)
+            self._by_price = None
+
+    def remove(self, product_ids: Iterable[str]) -> None:
+        with self._lock:
+            for product_id in product_ids:
+                row = self.row_of.pop(product_id, None)
+                if row is not None:
+                    self.alive[row] = 0
+
+    def _price_order(self) -> Tuple[array, array]:
+        if self._by_price is None:
+            rows = sorted((r for r in range(len(self.ids)) if self.alive[r] and self.price[r] != UNKNOWN_PRICE),
+                          key=self.price.__getitem__)
+            self._by_price = (array("i", rows), array("q", (self.price[r] for r in rows)))
+        return self._by_price
+
+    def search(self, query: str = "", availability: str | None = None, min_price: int | None = None,
+               max_price: int | None = None, limit: int = 20) -> Dict[str, Any]:
+        """Products matching every word of `query` (any of them if a word is not in the catalog) and the filters, best first."""
+        with self._lock:
+            words = list(dict.fromkeys(tokens(query)))
+            candidate_sets = []
+            if availability:
+                candidate_sets.append(self.postings.get(f"a:{availability}", array("i")))
+            if min_price is not None or max_price is not None:
+                rows, prices = self._price_order()
+                low = bisect_left(prices, min_price) if min_price is not None else 0
+                high = bisect_right(prices, max_price) if max_price is not None else len(prices)
+                candidate_sets.append(rows[low:high])
+            matched_all = True
+            if words:
+                postings = [self.postings.get(w, array("i")) for w in words]
+                if any(len(p) == 0 for p in postings):
+                    matched_all = False
+                    merged = set()
+                    for p in postings:
+                        merged.update(p)
+                    candidate_sets.append(merged)
+                else:
+                    candidate_sets.extend(postings)
+
+            if not candidate_sets:
+                # Nothing to narrow down: the cheapest products, straight from the price order
+                order, _ = self._price_order()
+                best = list(order[:limit])
+                if len(best) < limit:
+                    best += [r for r in range(len(self.ids)) if self.alive[r] and self.price[r] == UNKNOWN_PRICE
+                             ][:limit - len(best)]
+                return {"total_matches": len(self.row_of), "matched_all_words": True,
+                        "products": [self.row(r) for r in best]}
+            candidate_sets.sort(key=len)
+            rows = set(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                if not rows:
+                    break
+                rows.intersection_update(other)
+            rows = [r for r in rows if self.alive[r]]
+
+            if words:
+                # Words in the name count double; rarer words count more
+                weights = {w: math.log(1 + len(self.row_of) / (1 + len(self.postings.get(w, ())))) for w in words}
+                name_rows = {w: set(self.postings.get(f"n:{w}", ())) for w in words}
+                word_rows = {w: set(self.postings.get(w, ())) for w in words} if not matched_all else None
+
+                def relevance(row: int) -> float:
+                    return sum(weights[w] * (2 if row in name_rows[w] else
+                                             1 if word_rows is None or row in word_rows[w] else 0) for w in words)
+                best = heapq.nlargest(limit, rows, key=relevance)
+            else:
+                best = heapq.nsmallest(limit, rows, key=lambda r: (self.price[r] == UNKNOWN_PRICE, self.price[r]))
+            return {"total_matches": len(rows), "matched_all_words": matched_all,
+                    "products": [self.row(r) for r in best]}
+
+    def row(self, row: int) -> Dict[str, Any]:
+        price, retailer_id, image_url, url = self.extra[row]
+        code = self.availability[row]
+        return {
+            "id": self.ids[row],
+            "name": self.names[row],
+            "price": price,
+            "availability": AVAILABILITY[code] if code < len(AVAILABILITY) else None,
+            "retailer_id": retailer_id,
+            "image_url": image_url,
+            "url": url,
+        }
+
+
+# --- registry and maintenance ---
+
+_ready: "OrderedDict[str, ProductIndex]" = OrderedDict()   # least recently searched first
+# catalog -> (partial index, URL of the next page) of a build that has not finished
+_partial: Dict[str, Tuple[ProductIndex, str | None]] = {}
+_building: Dict[str, str] = {}            # catalog -> job ID
+_changed: Dict[str, set] = {}             # catalog -> product IDs reported changed by webhooks
+_registry_lock = threading.Lock()
+
+
+def _build(job, catalog_id: str) -> Dict[str, Any]:
+    """Job body: read the catalog page by page into a fresh index, then swap it in."""
+    try:
+        with _registry_lock:
+            index, url = _partial.pop(catalog_id, (None, None))
+        params = None
+        if index is None or url is None:
+            index, url = ProductIndex(catalog_id), f"{fb_base_url}{catalog_id}/products"
+            params = {"fields": FIELDS, "limit": PRODUCT_INDEX_PAGE_SIZE, "summary": "true",
+                      "access_token": fb_access_token}
+        started, total = time.time(), None
+        try:
+            while url:
+                response = http_client.get(url, params=params, revalidate=False)
+                response.raise_for_status()
+                data = response.json()
+                index.add(data.get("data", []))
+                total = data.get("summary", {}).get("total_count", total)
+                job.progress(len(index), total, f"{len(index)} products indexed")
+                url, params = data.get("paging", {}).get("next"), None  # the next URL carries all parameters
+        except BaseException:
+            with _registry_lock:  # the next build continues from this page (re-reading a page is harmless)
+                _partial[catalog_id] = (index, url if params is None else None)
+            raise
+        index.built_at = started
+        with _registry_lock:
+            _ready[catalog_id] = index
+            _ready.move_to_end(catalog_id)
+            _changed.pop(catalog_id, None)
+            while len(_ready) > PRODUCT_INDEX_MAX_CATALOGS:
+                evicted, _ = _ready.popitem(last=False)
+                _changed.pop(evicted, None)
+                log.info("product index dropped", catalog_id=evicted)
+        log.info("product index built", catalog_id=catalog_id, products=len(index),
+                 seconds=round(time.time() - started, 2))
+        return {"catalog_id": catalog_id, "products": len(index)}
+    finally:
+        with _registry_lock:
+            _building.pop(catalog_id, None)
+
+
+def ensure(catalog_id: str) -> str | None:
+    """Start a (re)build when the catalog has no index or an old one. Returns the ID of the running build job."""
+    with _registry_lock:
+        if catalog_id in _building:
+            return _building[catalog_id]
+        index = _ready.get(catalog_id)
+        if index is not None and time.time() - index.built_at < PRODUCT_INDEX_REFRESH_SECONDS:
+            return None
+        job_id = manager().submit("index_catalog_products", _build, {"catalog_id": catalog_id},
+                                  result_kind="summary")
+        if job_id is not None:
+            _building[catalog_id] = job_id
+        return job_id
+
+
+def ready(catalog_id: str) -> ProductIndex | None:
+    """
+    The catalog's index, with products changed since the last search re-read first. When that re-read
+    fails, the index is served as it is and the changes wait for the next search.
+    """
+    with _registry_lock:
+        index = _ready.get(catalog_id)
+        if index is not None:
+            _ready.move_to_end(catalog_id)
+        changed = _changed.pop(catalog_id, None)
+    if index is not None and changed:
+        try:
+            refresh_products(index, sorted(changed))
+        except BaseException as e:
+            # Keep them for the next search (with any reported meanwhile); re-reading a product is harmless
+            with _registry_lock:
+                if catalog_id in _ready:
+                    _changed.setdefault(catalog_id, set()).update(changed)
+            if not isinstance(e, requests.exceptions.RequestException):
+                raise
+            log.warning("product index refresh failed, serving the index as it is", catalog_id=catalog_id,
+                        products=len(changed), error=str(e))
+    return index
+
+
+def forget(product_ids: Iterable[str]) -> None:
+    """Drop deleted products from every index of this worker."""
+    product_ids = list(product_ids)
+    with _registry_lock:
+        indexes = list(_ready.values())
+    for index in indexes:
+        index.remove(product_ids)
+
+
+def _missing(response: requests.Response) -> bool:
+    """Graph's answer when a requested ID does not exist: #803 for `ids=` lists, 404 or #100/33 otherwise."""
+    if response.status_code == 404:
+        return True
+    try:
+        error = response.json().get("error") or {}
+    except (ValueError, AttributeError):
+        return False
+    return error.get("code") == 803 or (error.get("code") == 100 and error.get("error_subcode") == 33)
+
+
+def _lookup(product_ids: List[str]) -> Dict[str, Any] | None:
+    """The products by ID, or None when Graph refuses the lookup because one of them no longer exists."""
+    response = http_client.get(fb_base_url, params={"ids": ",".join(product_ids), "fields": FIELDS,
+                                                    "access_token": fb_access_token})
+    if response.status_code >= 400 and _missing(response):
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def refresh_products(index: ProductIndex, product_ids: List[str]) -> None:
+    """Re-read the given products and update (or drop) their rows; products that no longer exist are dropped."""
+    for i in range(0, len(product_ids), IDS_PER_LOOKUP):
+        chunk = product_ids[i:i + IDS_PER_LOOKUP]
+        found = _lookup(chunk)
+        if found is None:
+            # A deleted product fails the whole lookup: ask one by one to tell which
+            found = {}
+            for product_id in chunk:
+                found.update(_lookup([product_id]) or {})
+        index.add(found.values())
+        index.remove(p for p in chunk if p not in found)
+    log.debug("product index refreshed", catalog_id=index.catalog_id, products=len(product_ids))
+
+
+def graph_filter(query: str = "", availability: str | None = None, min_price: int | None = None,
+                 max_price: int | None = None) -> str | None:
+    """The same search as a Graph product `filter` (prices in minor units), or None without any condition."""
+    rules = []
+    if query.strip():
+        rules.append({"name": {"i_contains": query.strip()}})
+    if availability:
+        rules.append({"availability": {"eq": availability}})
+    if min_price is not None:
+        rules.append({"price": {"gte": min_price}})
+    if max_price is not None:
+        rules.append({"price": {"lte": max_price}})
+    if not rules:
+        return None
+    return json.dumps(rules[0] if len(rules) == 1 else {"and": rules})
+
+
+def _on_change(event: webhooks.ChangeEvent) -> None:
+    if event.catalog_id is None:
+        return
+    with _registry_lock:
+        if event.catalog_id not in _ready:
+            return
+        if event.level == "product" and event.object_id:
+            _changed.setdefault(event.catalog_id, set()).add(event.object_id)
+        elif event.level == "catalog":
+            _ready[event.catalog_id].built_at = 0.0   # rebuild on the next search
+
+
+webhooks.subscribe(_on_change)
@@ -0,0 +1,304 @@
+"""
+On-demand profiling of tool calls, switched on at runtime through the /admin/profile routes
+(see utils/server.py); nothing is measured while no profiling session is active.
+
+A session covers selected tools (or all of them) for a time window and records:
+- a per-call breakdown: time waiting on upstream responses (`http_client`), decoding their JSON,
+  serializing the tool result for MCP, and the rest ("own": our loops and reshaping). Upstream time
+  is summed over requests, so for tools that fan out it can exceed the call's total;
+- stack samples of the threads running profiled sync tools, taken every PROFILE_SAMPLE_INTERVAL_MS
+  by a background thread and folded per stack ("tool;file:function;... count"), ready for
+  flamegraph.pl or speedscope;
+- optionally tracemalloc allocation snapshots, compared against the start of the session.
+
+Sessions are per worker process.
+"""
+import contextvars
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List
+
+from config.settings import (PROFILE_MAX_SECONDS, PROFILE_RECENT_CALLS, PROFILE_SAMPLE_INTERVAL_MS,
+                             PROFILE_TRACEMALLOC_FRAMES)
+from utils.logger import correlation_id, get_logger
+
+log = get_logger(__name__)
+
+PHASES = ("upstream", "decode", "serialize")
+MAX_STACK_DEPTH = 64
+
+
+@dataclass
+class CallProfile:
+    tool: str
+    correlation_id: str | None
+    started: float = field(default_factory=time.perf_counter)
+    seconds: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    requests: int = 0
+    response_bytes: int = 0
+    samples: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, phase: str, seconds: float) -> None:
+        # Fan-out tools report from several threads at once
+        with self._lock:
+            self.seconds[phase] += seconds
+
+
+@dataclass
+class Session:
+    tools: set | None                 # None: every tool
+    ends_at: float
+    interval: float
+    memory: bool
+    started_at: float = field(default_factory=time.time)
+    stacks: Counter = field(default_factory=Counter)
+    samples: int = 0
+    calls: deque = field(default_factory=lambda: deque(maxlen=PROFILE_RECENT_CALLS))
+    totals: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    baseline: tracemalloc.Snapshot | None = None
+    stop: threading.Event = field(default_factory=threading.Event)
+
+    def active(self) -> bool:
+        return not self.stop.is_set() and time.time() < self.ends_at
+
+
+_current: contextvars.ContextVar[CallProfile | None] = contextvars.ContextVar("profile", default=None)
+_lock = threading.Lock()
+_session: Session | None = None
+# thread ident -> profile of the tool call the thread is running
+_threads: Dict[int, CallProfile] = {}
+_started_tracemalloc = False
+
+
+def _is_profiled(tool: str) -> bool:
+    session = _session
+    return session is not None and session.active() and (session.tools is None or tool in session.tools)
+
+
+@contextmanager
+def call(tool: str) -> Iterator[CallProfile | None]:
+    """Scope one tool call; yields its profile, or None when the tool is not being profiled."""
+    if not _is_profiled(tool):
+        yield None
+        return
+    profile = CallProfile(tool, correlation_id.get())
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        _record(profile, time.perf_counter() - profile.started)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Count the body's time towards `name` of the current call (no-op outside a profiled call)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+
+def observe_response(response: Any, elapsed: float) -> None:
+    """Called by `http_client` for every response: upstream time, size, and timing of its `.json()`."""
+    profile = _current.get()
+    if profile is None:
+        return
+    profile.add("upstream", elapsed)
+    with profile._lock:
+        profile.requests += 1
+        profile.response_bytes += len(response.content or b"")
+    decode = response.json
+
+    def timed_json(**kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return decode(**kwargs)
+        finally:
+            profile.add("decode", time.perf_counter() - started)
+
+    response.json = timed_json
+
+
+def run(fn: Any, *args: Any, **kwargs: Any) -> Any:
+    """Run a sync tool in the current (worker) thread, which gets stack-sampled if its call is profiled."""
+    profile = _current.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    with _lock:
+        _threads[ident] = profile
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        with _lock:
+            _threads.pop(ident, None)
+
+
+def _record(profile: CallProfile, total: float) -> None:
+    session = _session
+    if session is None:
+        return
+    own = max(0.0, total - sum(profile.seconds.values()))
+    entry = {"tool": profile.tool, "correlation_id": profile.correlation_id, "total_ms": round(total * 1000, 2),
+             **{f"{p}_ms": round(s * 1000, 2) for p, s in profile.seconds.items()}, "own_ms": round(own * 1000, 2),
+             "requests": profile.requests, "response_bytes": profile.response_bytes, "samples": profile.samples}
+    with _lock:
+        session.calls.append(entry)
+        totals = session.totals.setdefault(profile.tool, {"calls": 0, "total": 0.0, "own": 0.0, "requests": 0,
+                                                          **dict.fromkeys(PHASES, 0.0)})
+        totals["calls"] += 1
+        totals["total"] += total
+        totals["own"] += own
+        totals["requests"] += profile.requests
+        for p, s in profile.seconds.items():
+            totals[p] += s
+
+
+# --- stack sampling ---
+
+def _frame_name(code: Any) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _sample(session: Session) -> None:
+    with _lock:
+        threads = dict(_threads)
+    if not threads:
+        return
+    frames = sys._current_frames()
+    for ident, profile in threads.items():
+        frame = frames.get(ident)
+        stack: List[str] = []
+        # Leaf to root, up to the `run` frame that started the tool
+        while frame is not None and frame.f_code is not run.__code__ and len(stack) < MAX_STACK_DEPTH:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.append(profile.tool)
+        session.stacks[";".join(reversed(stack))] += 1
+        session.samples += 1
+        profile.samples += 1
+
+
+def _sampler(session: Session) -> None:
+    while not session.stop.wait(session.interval):
+        if time.time() >= session.ends_at:
+            break
+        _sample(session)
+    log.info("profiling session ended", samples=session.samples, calls=len(session.calls))
+    if _session is session:  # a replacing session may have started tracemalloc itself
+        _stop_tracemalloc()
+
+
+def _stop_tracemalloc() -> None:
+    global _started_tracemalloc
+    if _started_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracemalloc = False
+
+
+# --- control (admin routes) ---
+
+def start(tools: List[str] | None = None, seconds: float = 60, interval_ms: float | None = None,
+          memory: bool = False) -> Dict[str, Any]:
+    """Start a profiling session (replacing a running one) for `tools` (all when empty) during `seconds`."""
+    global _session, _started_tracemalloc
+    stop()
+    seconds = min(max(float(seconds), 1.0), PROFILE_MAX_SECONDS)
+    interval = max(float(interval_ms or PROFILE_SAMPLE_INTERVAL_MS), 1.0) / 1000
+    session = Session(tools=set(tools) if tools else None, ends_at=time.time() + seconds, interval=interval,
+                      memory=memory)
+    if memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            _started_tracemalloc = True
+        session.baseline = tracemalloc.take_snapshot()
+    _session = session
+    threading.Thread(target=_sampler, args=(session,), name="profiler", daemon=True).start()
+    log.info("profiling session started", tools=sorted(tools) if tools else "all", seconds=seconds,
+             interval_ms=interval * 1000, memory=memory)
+    return status()
+
+
+def stop() -> Dict[str, Any]:
+    """Stop the running session; its results stay available until the next start."""
+    session = _session
+    if session is not None and not session.stop.is_set():
+        session.stop.set()
+        _stop_tracemalloc()
+    return status()
+
+
+def status(recent: int = 20) -> Dict[str, Any]:
+    session = _session
+    if session is None:
+        return {"active": False}
+    with _lock:
+        calls = list(session.calls)[-recent:]
+        totals = {tool: dict(t) for tool, t in session.totals.items()}
+    per_tool = {}
+    for tool, t in totals.items():
+        n = t["calls"]
+        per_tool[tool] = {"calls": n, "requests": int(t["requests"]),
+                          **{f"avg_{k}_ms": round(t[k] / n * 1000, 2) for k in ("total", *PHASES, "own")}}
+    return {
+        "active": session.active(),
+        "tools": sorted(session.tools) if session.tools else "all",
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(session.started_at)),
+        "seconds_left": max(0, round(session.ends_at - time.time())) if session.active() else 0,
+        "interval_ms": session.interval * 1000,
+        "samples": session.samples,
+        "memory": session.memory,
+        "per_tool": per_tool,
+        "recent_calls": calls,
+    }
+
+
+def folded(tool: str | None = None) -> str:
+    """Collected stack samples in folded format, one "frame;frame;... count" line per stack."""
+    session = _session
+    if session is None:
+        return ""
+    with _lock:
+        stacks = list(session.stacks.items())
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks)
+                   if tool is None or stack.split(";", 1)[0] == tool)
+
+
+def memory(top: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+    """Biggest allocation growth since the session started, grouped by line, file or traceback."""
+    session = _session
+    if session is None or session.baseline is None:
+        raise ValueError("No memory profiling: start a session with memory=true")
+    if not tracemalloc.is_tracing():
+        raise ValueError("The memory profiling session has ended; start a new one")
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise ValueError("group_by must be one of: lineno, filename, traceback")
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    stats = []
+    for stat in snapshot.compare_to(session.baseline, group_by)[:top]:
+        frame = stat.traceback[0]
+        entry = {"location": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1),
+                 "size_diff_kb": round(stat.size_diff / 1024, 1), "count": stat.count,
+                 "count_diff": stat.count_diff, "line": linecache.getline(frame.filename, frame.lineno).strip()}
+        if group_by == "traceback":
+            entry["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+        stats.append(entry)
+    return {"traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1), "top": stats}
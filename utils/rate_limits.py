@@ -0,0 +1,81 @@
+"""
+Graph API rate-limit usage, as reported in the usage headers of every response.
+
+`http_client` feeds every response through `observe()`. Usage is tracked for the app
+(`x-app-usage`) and per ad account (`x-ad-account-usage` and `x-business-use-case-usage` of requests
+to an `act_` path), as the highest of call count, CPU time and total time in percent of the quota,
+plus the time until access is regained once Facebook throttles. Readings older than
+RATE_USAGE_TTL_SECONDS are treated as unknown (usage windows roll over).
+"""
+import json
+import re
+import threading
+import time
+from typing import Dict, Mapping, Tuple
+
+from config.settings import RATE_USAGE_TTL_SECONDS
+
+_ACCOUNT = re.compile(r"/(act_\d+)(?:/|$)")
+
+# Graph error codes that mean "throttled" (app, user, account and business use case limits)
+THROTTLE_CODES = {4, 17, 32, 613, 80000, 80001, 80002, 80003, 80004, 80005, 80006, 80008, 80009, 80014}
+# ... of those, the app-wide ones; the rest are per user, ad account or business
+APP_THROTTLE_CODES = {4, 613}
+
+_lock = threading.Lock()
+# ad account (or "app") -> (usage percent, monotonic time access is regained, monotonic time observed)
+_usage: Dict[str, Tuple[float, float, float]] = {}
+
+
+def _json(value: str | None) -> dict:
+    try:
+        parsed = json.loads(value) if value else {}
+    except ValueError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def observe(url: str, headers: Mapping[str, str]) -> None:
+    now = time.monotonic()
+    app = _json(headers.get("x-app-usage"))
+    readings = {}
+    if app:
+        readings["app"] = (max(float(app.get(k, 0) or 0) for k in ("call_count", "total_cputime", "total_time")), 0.0)
+
+    match = _ACCOUNT.search(url.split("?", 1)[0])
+    if match:
+        pct, regain = 0.0, 0.0
+        account = _json(headers.get("x-ad-account-usage"))
+        if account:
+            pct = float(account.get("acc_id_util_pct", 0) or 0)
+            regain = float(account.get("reset_time_duration", 0) or 0)
+        for entries in _json(headers.get("x-business-use-case-usage")).values():
+            for entry in entries if isinstance(entries, list) else []:
+                pct = max(pct, *(float(entry.get(k, 0) or 0) for k in ("call_count", "total_cputime", "total_time")))
+                regain = max(regain, 60 * float(entry.get("estimated_time_to_regain_access", 0) or 0))
+        if account or headers.get("x-business-use-case-usage"):
+            readings[match.group(1)] = (pct, regain)
+
+    with _lock:
+        for key, (pct, regain) in readings.items():
+            _usage[key] = (pct, now + regain, now)
+
+
+def throttled(ad_account_id: str, seconds: float) -> None:
+    """Record that Facebook refused a call for the account; treat it as fully used for `seconds`."""
+    now = time.monotonic()
+    with _lock:
+        _usage[ad_account_id] = (100.0, now + seconds, now)
+
+
+def usage(key: str) -> Tuple[float, float]:
+    """(percent of quota used, seconds until access is regained) for an ad account or "app"; (0, 0) if unknown."""
+    with _lock:
+        reading = _usage.get(key)
+    if reading is None:
+        return 0.0, 0.0
+    pct, regain_at, observed = reading
+    now = time.monotonic()
+    if now - observed > RATE_USAGE_TTL_SECONDS and regain_at <= now:
+        return 0.0, 0.0
+    return pct, max(0.0, regain_at - now)
@@ -1,6 +1,98 @@
+import asyncio
+import functools
+import hmac
+import importlib
+import inspect
+import json
 import os
+from typing import Any, Sequence
+
+import anyio
 from mcp.server.fastmcp import FastMCP
-from config.settings import SERVER_NAME
+from mcp.server.fastmcp.server import _convert_to_content
+from mcp.server.fastmcp.tools import Tool
+from mcp.types import TextContent, ImageContent, EmbeddedResource, ToolAnnotations
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from config.settings import ADMIN_TOKEN, SERVER_NAME, MCP_SESSION_MODE, WEBHOOK_PATH
+from utils import admission, breakers, deadline, exports, profiling, webhooks
+from utils.logger import tool_call
+
+
+class FacebookMCP(FastMCP):
+    """
+    FastMCP with a per-call scope (correlation ID, structured start/finish logging, deadline and cancel
+    token) around every tool, and support for manifest placeholders whose module is only imported on
+    first use (see utils/manifest.py). Sync tools run in worker threads so a slow one can't stall the
+    event loop, and cancelling the call stops their outbound requests. Calls are admitted per tool
+    class (utils/admission.py); over capacity they fail fast with a retry hint. Calls of tools being
+    profiled (utils/profiling.py) get a timing breakdown and stack samples.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # tool name -> module that still has to be imported before the tool can run
+        self._lazy_modules: dict[str, str] = {}
+
+    def add_lazy_tool(self, name: str, description: str, parameters: dict[str, Any], module: str,
+                      annotations: ToolAnnotations | None = None) -> None:
+        """Advertise a tool from its prebuilt schema without importing its implementation."""
+        placeholder = Tool.model_construct(
+            fn=None, name=name, description=description, parameters=parameters,
+            fn_metadata=None, is_async=False, context_kwarg=None, annotations=annotations,
+        )
+        self._tool_manager._tools[name] = placeholder
+        self._lazy_modules[name] = module
+
+    def add_tool(self, fn: Any, name: str | None = None, description: str | None = None,
+                 annotations: ToolAnnotations | None = None) -> None:
+        # The real implementation replaces its manifest placeholder when the module gets imported
+        if self._lazy_modules.pop(name or fn.__name__, None) is not None:
+            self._tool_manager._tools.pop(name or fn.__name__, None)
+        if not inspect.iscoroutinefunction(fn):
+            fn = _in_thread(fn)
+        super().add_tool(fn, name=name, description=description, annotations=annotations)
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        with tool_call(name, arguments), deadline.scope(deadline.seconds_for(name)) as cancel:
+            module = self._lazy_modules.get(name)
+            if module is not None:
+                importlib.import_module(module)
+            try:
+                async with admission.admit(name):
+                    with profiling.call(name):
+                        result = await self._tool_manager.call_tool(name, arguments, context=self.get_context())
+                        with profiling.phase("serialize"):
+                            return _convert_to_content(result)
+            except anyio.get_cancelled_exc_class():
+                # The thread running a sync tool can't be interrupted; it stops at its next request
+                cancel.set()
+                raise
+
+    def streamable_http_app(self) -> Starlette:
+        # In "shared" mode sessions are registered in a store that all workers can see
+        if MCP_SESSION_MODE == "shared" and self._session_manager is None:
+            from utils.sessions import SharedSessionManager, create_session_store
+
+            self._session_manager = SharedSessionManager(
+                app=self._mcp_server,
+                event_store=self._event_store,
+                json_response=self.settings.json_response,
+                store=create_session_store(),
+            )
+        return super().streamable_http_app()
+
+
+def _in_thread(fn: Any) -> Any:
+    """Async wrapper (same name, docstring and signature) that runs a sync tool in a worker thread."""
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # asyncio.to_thread carries the context over: correlation ID, deadline, cancel token and profile
+        return await asyncio.to_thread(profiling.run, fn, *args, **kwargs)
+
+    return wrapper
+
 
 # myserver = FastMCP(SERVER_NAME)
 
@@ -14,9 +106,113 @@ path = "/mcp"
 
 # Pass host, port, and path directly to the FastMCP constructor
 # FastMCP is designed to accept these as part of its initial configuration
-myserver = FastMCP(
+myserver = FacebookMCP(
     SERVER_NAME,
     host=host,
     port=port,
-    path=path
+    path=path,
+    stateless_http=MCP_SESSION_MODE == "stateless"
 )
+
+
+@myserver.custom_route("/breakers", methods=["GET"])
+async def breaker_states(request: Request) -> JSONResponse:
+    """Circuit breaker state of this worker, for monitoring."""
+    return JSONResponse({"breakers": breakers.snapshot()})
+
+
+@myserver.custom_route("/admission", methods=["GET"])
+async def admission_states(request: Request) -> JSONResponse:
+    """Running, waiting and refused tool calls per tool class of this worker, for monitoring."""
+    return JSONResponse({"classes": admission.snapshot()})
+
+
+def _is_admin(request: Request) -> bool:
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+
+def _forbidden() -> JSONResponse:
+    return JSONResponse({"error": "admin token required"}, status_code=403)
+
+
+@myserver.custom_route("/admin/profile", methods=["GET"])
+async def profile_status(request: Request) -> JSONResponse:
+    """Profiling session of this worker: state, average breakdown per tool and the latest calls."""
+    if not _is_admin(request):
+        return _forbidden()
+    return JSONResponse(profiling.status(int(request.query_params.get("recent", 20))))
+
+
+@myserver.custom_route("/admin/profile/start", methods=["POST"])
+async def profile_start(request: Request) -> JSONResponse:
+    """Start profiling: ?tools=a,b (default all) &seconds=60 &interval_ms=10 &memory=true"""
+    if not _is_admin(request):
+        return _forbidden()
+    q = request.query_params
+    try:
+        state = profiling.start(tools=[t.strip() for t in q.get("tools", "").split(",") if t.strip()],
+                                seconds=float(q.get("seconds", 60)),
+                                interval_ms=float(q["interval_ms"]) if "interval_ms" in q else None,
+                                memory=q.get("memory", "false").lower() in ("1", "true", "yes"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(state)
+
+
+@myserver.custom_route("/admin/profile/stop", methods=["POST"])
+async def profile_stop(request: Request) -> JSONResponse:
+    if not _is_admin(request):
+        return _forbidden()
+    return JSONResponse(profiling.stop())
+
+
+@myserver.custom_route("/admin/profile/folded", methods=["GET"])
+async def profile_folded(request: Request) -> Response:
+    """Stack samples in folded format (?tool= for one tool), for flamegraph.pl or speedscope."""
+    if not _is_admin(request):
+        return _forbidden()
+    return PlainTextResponse(profiling.folded(request.query_params.get("tool")),
+                             headers={"Content-Disposition": 'attachment; filename="profile.folded"'})
+
+
+@myserver.custom_route("/admin/profile/memory", methods=["GET"])
+async def profile_memory(request: Request) -> JSONResponse:
+    """tracemalloc growth since the session started: ?top=25 &group_by=lineno|filename|traceback"""
+    if not _is_admin(request):
+        return _forbidden()
+    q = request.query_params
+    try:
+        # Snapshots walk every traced block; keep that off the event loop
+        report = await anyio.to_thread.run_sync(profiling.memory, int(q.get("top", 25)), q.get("group_by", "lineno"))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(report)
+
+
+@myserver.custom_route(WEBHOOK_PATH, methods=["GET", "POST"])
+async def facebook_webhook(request: Request) -> PlainTextResponse:
+    """Facebook webhook endpoint: subscription handshake (GET) and signed change deliveries (POST)."""
+    if request.method == "GET":
+        answer = webhooks.challenge(dict(request.query_params))
+        return PlainTextResponse(answer, status_code=200) if answer is not None else \
+            PlainTextResponse("verification failed", status_code=403)
+    body = await request.body()
+    # Cache invalidation may hit SQLite or Redis; keep it off the event loop
+    status, message = await anyio.to_thread.run_sync(
+        webhooks.receive, body, request.headers.get(webhooks.SIGNATURE_HEADER))
+    return PlainTextResponse(message, status_code=status)
+
+
+# Catalog exports written by `start_export_catalog_products`; registered here so they exist with lazy tool loading
+@myserver.resource("exports://{name}/info", name="catalog_export_info", mime_type="application/json",
+                   description="Metadata of a catalog export: format, size in bytes, product count, range template.")
+def catalog_export_info(name: str) -> str:
+    return json.dumps(exports.info(name))
+
+
+@myserver.resource("exports://{name}/bytes/{offset}/{length}", name="catalog_export_bytes",
+                   mime_type="application/octet-stream",
+                   description="A byte range of a catalog export file (gzip NDJSON or Parquet).")
+def catalog_export_bytes(name: str, offset: str, length: str) -> bytes:
+    return exports.read_range(name, int(offset), int(length))
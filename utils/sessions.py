@@ -0,0 +1,283 @@
+"""
+Shared MCP session store for running the streamable-http app on several workers / replicas.
+
+FastMCP keeps streamable-http sessions in a per-process dict, so a request that a load balancer
+sends to another worker fails with an unknown session ID. In "shared" session mode the session IDs
+live in a pluggable store (memory, SQLite file, Redis-protocol server) and any worker that receives a
+request for a session it does not hold re-attaches a transport under the same ID, already initialized.
+The worker that created the session counts it as initialized once it answered `initialize`, because
+the client's `notifications/initialized` may well reach another worker. Local transports of sessions
+idle for longer than SESSION_TTL_SECONDS (expired in the store too) are dropped.
+
+Everything a tool needs arrives with each request, so re-attaching is transparent for tool calls.
+Server-initiated messages (standalone GET streams, notifications between requests) are still
+delivered by the worker that holds the stream; use sticky routing if you rely on them, or the
+"stateless" mode if you don't need sessions at all.
+"""
+import json
+import sqlite3
+import threading
+import time
+from http import HTTPStatus
+from typing import Any, Dict
+from uuid import uuid4
+
+import anyio
+from anyio.abc import TaskStatus
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from mcp.server.streamable_http import MCP_SESSION_ID_HEADER, StreamableHTTPServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.shared.message import SessionMessage
+from mcp.types import JSONRPCMessage, JSONRPCNotification, JSONRPCRequest
+
+from config.settings import SESSION_STORE, SESSION_STORE_PATH, SESSION_TTL_SECONDS, REDIS_URL
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+
+class SessionStore:
+    """Session ID -> small metadata record, with idle expiry."""
+
+    def put(self, session_id: str, record: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Dict[str, Any] | None:
+        raise NotImplementedError
+
+    def touch(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; only useful with a single worker (and for local testing)."""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._records: Dict[str, tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, session_id, record):
+        with self._lock:
+            self._records[session_id] = (time.time(), record)
+
+    def get(self, session_id):
+        with self._lock:
+            item = self._records.get(session_id)
+            if item is None or time.time() - item[0] > self.ttl:
+                self._records.pop(session_id, None)
+                return None
+            return item[1]
+
+    def touch(self, session_id):
+        with self._lock:
+            if session_id in self._records:
+                self._records[session_id] = (time.time(), self._records[session_id][1])
+
+    def delete(self, session_id):
+        with self._lock:
+            self._records.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Store in a local SQLite file, shared by all workers on one host."""
+
+    def __init__(self, path: str = SESSION_STORE_PATH, ttl: int = SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS mcp_sessions ("
+                         "session_id TEXT PRIMARY KEY, record TEXT NOT NULL, last_seen REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, session_id, record):
+        self._connection().execute("INSERT OR REPLACE INTO mcp_sessions VALUES (?, ?, ?)",
+                                   (session_id, json.dumps(record), time.time()))
+
+    def get(self, session_id):
+        row = self._connection().execute("SELECT record, last_seen FROM mcp_sessions WHERE session_id = ?",
+                                         (session_id,)).fetchone()
+        if row is None:
+            return None
+        if time.time() - row[1] > self.ttl:
+            self.delete(session_id)
+            return None
+        return json.loads(row[0])
+
+    def touch(self, session_id):
+        conn = self._connection()
+        conn.execute("UPDATE mcp_sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id))
+        # Opportunistic cleanup instead of a background sweeper
+        conn.execute("DELETE FROM mcp_sessions WHERE last_seen < ?", (time.time() - self.ttl,))
+
+    def delete(self, session_id):
+        self._connection().execute("DELETE FROM mcp_sessions WHERE session_id = ?", (session_id,))
+
+
+class RedisSessionStore(SessionStore):
+    """Store in any Redis-protocol server (Redis, Valkey, KeyDB or a local stand-in); needs the `redis` package."""
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = SESSION_TTL_SECONDS, prefix: str = "mcp:session:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_STORE=redis requires the 'redis' package (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def put(self, session_id, record):
+        self.client.set(self.prefix + session_id, json.dumps(record), ex=self.ttl)
+
+    def get(self, session_id):
+        raw = self.client.get(self.prefix + session_id)
+        return json.loads(raw) if raw is not None else None
+
+    def touch(self, session_id):
+        self.client.expire(self.prefix + session_id, self.ttl)
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    stores = {"memory": MemorySessionStore, "sqlite": SQLiteSessionStore, "redis": RedisSessionStore}
+    if kind not in stores:
+        raise ValueError(f"Unknown SESSION_STORE '{kind}', expected one of: {', '.join(stores)}")
+    return stores[kind]()
+
+
+class SharedSessionManager(StreamableHTTPSessionManager):
+    """StreamableHTTPSessionManager that registers sessions in a shared store and re-attaches foreign ones."""
+
+    def __init__(self, *args: Any, store: SessionStore, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.store = store
+        # Avoid a store write on every request: refresh a session's expiry at most this often
+        self._touch_interval = max(1.0, SESSION_TTL_SECONDS / 10)
+        self._last_touch: Dict[str, float] = {}
+        self._swept_at = time.monotonic()
+
+    @staticmethod
+    async def _complete_initialization(read_stream: Any, forward: Any) -> None:
+        """Pass the client's messages on, following `initialize` with a local `notifications/initialized`."""
+        async with forward:
+            async for message in read_stream:
+                await forward.send(message)
+                if (isinstance(message, SessionMessage) and isinstance(message.message.root, JSONRPCRequest)
+                        and message.message.root.method == "initialize"):
+                    # The session handles `initialize` completely before reading on, so this marks it initialized
+                    await forward.send(SessionMessage(JSONRPCMessage(
+                        JSONRPCNotification(jsonrpc="2.0", method="notifications/initialized"))))
+
+    async def _start_transport(self, session_id: str, initialized: bool) -> StreamableHTTPServerTransport:
+        transport = StreamableHTTPServerTransport(
+            mcp_session_id=session_id,
+            is_json_response_enabled=self.json_response,
+            event_store=self.event_store,
+        )
+        self._server_instances[session_id] = transport
+
+        async def run_server(*, task_status: TaskStatus[None] = anyio.TASK_STATUS_IGNORED) -> None:
+            async with transport.connect() as streams:
+                read_stream, write_stream = streams
+                task_status.started()
+                if initialized:
+                    # `stateless=True` starts the session already initialized: the client did the
+                    # initialize handshake with whichever worker created the session.
+                    await self.app.run(read_stream, write_stream, self.app.create_initialization_options(),
+                                       stateless=True)
+                else:
+                    forward, session_stream = anyio.create_memory_object_stream[SessionMessage | Exception](0)
+                    async with anyio.create_task_group() as tg:
+                        tg.start_soon(self._complete_initialization, read_stream, forward)
+                        await self.app.run(session_stream, write_stream, self.app.create_initialization_options())
+                        tg.cancel_scope.cancel()
+            self._server_instances.pop(session_id, None)
+            self._last_touch.pop(session_id, None)
+
+        assert self._task_group is not None
+        await self._task_group.start(run_server)
+        return transport
+
+    async def _refresh(self, session_id: str) -> bool:
+        """
+        Extend the session's expiry, at most once per touch interval. Returns False when the store no longer
+        knows the session (terminated on another worker or expired), so the local transport must be dropped.
+        """
+        now = time.monotonic()
+        if now - self._last_touch.get(session_id, 0.0) < self._touch_interval:
+            return True
+        self._last_touch[session_id] = now
+        if await anyio.to_thread.run_sync(self.store.get, session_id) is None:
+            return False
+        await anyio.to_thread.run_sync(self.store.touch, session_id)
+        return True
+
+    async def _sweep(self) -> None:
+        """Drop local transports of sessions not seen for SESSION_TTL_SECONDS (never DELETEd by their client)."""
+        now = time.monotonic()
+        if now - self._swept_at < self._touch_interval:
+            return
+        self._swept_at = now
+        for session_id in [s for s, seen in self._last_touch.items() if now - seen > SESSION_TTL_SECONDS]:
+            self._last_touch.pop(session_id, None)
+            transport = self._server_instances.pop(session_id, None)
+            if transport is not None:
+                await transport._terminate_session()
+            log.info("idle session dropped", session_id=session_id)
+
+    async def _handle_stateful_request(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self._sweep()
+        request = Request(scope, receive)
+        session_id = request.headers.get(MCP_SESSION_ID_HEADER)
+
+        if session_id is None:
+            async with self._session_creation_lock:
+                session_id = uuid4().hex
+                await anyio.to_thread.run_sync(self.store.put, session_id, {"created_at": time.time()})
+                transport = await self._start_transport(session_id, initialized=False)
+                self._last_touch[session_id] = time.monotonic()
+            log.info("session created", session_id=session_id)
+        else:
+            transport = self._server_instances.get(session_id)
+            if transport is None:
+                async with self._session_creation_lock:
+                    transport = self._server_instances.get(session_id)
+                    if transport is None:
+                        record = await anyio.to_thread.run_sync(self.store.get, session_id)
+                        if record is None:
+                            response = Response("Not Found: unknown or expired session",
+                                                status_code=HTTPStatus.NOT_FOUND)
+                            await response(scope, receive, send)
+                            return
+                        transport = await self._start_transport(session_id, initialized=True)
+                        self._last_touch[session_id] = time.monotonic()
+                        log.info("session re-attached on this worker", session_id=session_id)
+            elif not await self._refresh(session_id):
+                self._server_instances.pop(session_id, None)
+                self._last_touch.pop(session_id, None)
+                await transport._terminate_session()
+                response = Response("Not Found: unknown or expired session", status_code=HTTPStatus.NOT_FOUND)
+                await response(scope, receive, send)
+                return
+
+        await transport.handle_request(scope, receive, send)
+
+        if request.method == "DELETE":
+            self._server_instances.pop(session_id, None)
+            self._last_touch.pop(session_id, None)
+            await anyio.to_thread.run_sync(self.store.delete, session_id)
@@ -0,0 +1,128 @@
+"""
+Output shaping for listing tools.
+
+A listing that fits the result budget is returned unchanged. A bigger one is replaced by a compact
+markdown table (a few key columns, truncated cells) covering as many rows as fit, plus a continuation
+handle; the full rows are parked in the cache and `fetch_more_results` serves later slices from it.
+Handles are parked in a store every worker reads: the cache backend when it is shared, else the
+SQLite file / Redis server of CACHE_INVALIDATION. With the default in-process cache and no
+invalidation bus they are worker-local.
+"""
+import json
+import uuid
+from typing import Any, Dict, List, Sequence
+
+from config.settings import CACHE_INVALIDATION, RESULT_BUDGET_BYTES
+from utils.cache import cache, create_cache
+
+CONTINUATION_NAMESPACE = "continuations"
+MAX_CELL_CHARS = 48
+# A handle is usually continued on another worker than the one that parked it
+_parked = cache if cache.backend.shared or CACHE_INVALIDATION == "none" else create_cache(CACHE_INVALIDATION, "none")
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, default=str))
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, default=str)
+    text = "" if value is None else str(value)
+    text = text.replace("|", "\\|").replace("\n", " ")
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def _value(row: Any, column: str) -> Any:
+    if isinstance(row, dict):
+        value = row
+        for part in column.split("."):  # "creative.id" style paths
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+    if isinstance(row, (list, tuple)):
+        return row[int(column)] if column.isdigit() and int(column) < len(row) else None
+    return row
+
+
+def compact_table(rows: Sequence[Any], columns: Sequence[str], budget: int, start: int = 0) -> tuple[str, int]:
+    """
+    Render as many rows as fit in `budget` characters, numbered from `start` + 1.
+    Returns the table and the number of rows in it.
+    """
+    lines = ["| # | " + " | ".join(columns) + " |", "|---|" + "---|" * len(columns)]
+    used = sum(len(line) + 1 for line in lines)
+    count = 0
+    for index, row in enumerate(rows):
+        line = f"| {start + index + 1} | " + " | ".join(_cell(_value(row, c)) for c in columns) + " |"
+        if count and used + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+        count += 1
+    return "\n".join(lines), count
+
+
+def _summary(kind: str, handle: str, table: str, start: int, shown: int, total: int, columns: Sequence[str]) -> str:
+    end = start + shown
+    text = (f"{total} {kind} found; the full details are too large for one response. "
+            f"Showing {kind} {start + 1}-{end} as a compact table ({', '.join(columns)}).\n\n{table}\n")
+    if end < total:
+        text += f"\nTo see more rows, call `fetch_more_results` with handle=\"{handle}\" and offset={end}."
+    text += (f"\nFor the full values of specific fields, call `fetch_more_results` with handle=\"{handle}\", "
+             f"the offset of the first row you need and `fields` (comma separated).")
+    return text
+
+
+def fit_to_budget(rows: List[Any], kind: str, columns: Sequence[str],
+                  budget: int = RESULT_BUDGET_BYTES) -> List[Any] | str:
+    """
+    Return `rows` unchanged when they fit the budget, otherwise a compact summary with a continuation handle.
+
+    Parameters:
+    - rows: the full listing (dicts or tuples)
+    - kind: what the rows are, used in the summary text ("campaigns", "products", ...)
+    - columns: key columns for the compact table; dotted paths reach into nested dicts, indexes into tuples
+    """
+    if _size(rows) <= budget:
+        return rows
+    handle = uuid.uuid4().hex[:12]
+    _parked.set(CONTINUATION_NAMESPACE, handle, {"kind": kind, "columns": list(columns), "rows": rows})
+    table, shown = compact_table(rows, columns, budget - 600)
+    return _summary(kind, handle, table, 0, shown, len(rows), columns)
+
+
+def continue_listing(handle: str, offset: int = 0, fields: Sequence[str] = (),
+                     budget: int = RESULT_BUDGET_BYTES) -> Dict[str, Any] | str:
+    """Serve the slice of a parked listing that starts at `offset`, as a table or as selected full fields."""
+    parked = _parked.get(CONTINUATION_NAMESPACE, handle)
+    if parked is None:
+        return f"Continuation handle '{handle}' is unknown or expired; call the listing tool again."
+    rows, kind, columns = parked["rows"], parked["kind"], parked["columns"]
+    if offset >= len(rows):
+        return f"Offset {offset} is past the end: the listing has {len(rows)} {kind}."
+    remaining = rows[offset:]
+
+    if not fields:
+        table, shown = compact_table(remaining, columns, budget - 600, start=offset)
+        return _summary(kind, handle, table, offset, shown, len(rows), columns)
+
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    for row in remaining:
+        item = {f: _value(row, f) for f in fields}
+        size = _size(item)
+        if selected and used + size > budget:
+            break
+        selected.append(item)
+        used += size
+    end = offset + len(selected)
+    return {
+        "kind": kind,
+        "offset": offset,
+        "count": len(selected),
+        "total": len(rows),
+        "next_offset": end if end < len(rows) else None,
+        "handle": handle,
+        "items": selected,
+    }
+
@@ -0,0 +1,220 @@
+"""
+Receiver for Facebook webhook deliveries (ad accounts and product catalogs), served next to /mcp at
+WEBHOOK_PATH (see utils/server.py).
+
+- GET answers the subscription handshake: `hub.challenge` is echoed back when `hub.verify_token`
+  matches FB_WEBHOOK_VERIFY_TOKEN.
+- POST deliveries must carry a valid `X-Hub-Signature-256` (HMAC-SHA256 of the raw body with
+  FB_APP_SECRET). Each change is turned into a `ChangeEvent`, the cache keys it makes stale are
+  invalidated (in every worker, through the cache's invalidation bus), and the event is passed to
+  the callbacks registered with `subscribe()` so local indexes can refresh just the changed objects.
+
+Cache keys invalidated per change:
+- campaign:           campaigns[act_X], adsets[act_X:] and adsets[act_X:<campaign_id>]
+- ad set:             adsets[act_X:] and adsets[act_X:<campaign_id>] (the whole namespace without a campaign ID)
+- catalog or product: catalogs (listings carry product counts; product pages are re-validated by ETag)
+
+Replay recorded or sample deliveries against a running server:
+
+    python -m utils.webhooks replay events.jsonl --url http://127.0.0.1:8000/webhooks/facebook
+    python -m utils.webhooks replay                 # built-in sample events
+    python -m utils.webhooks verify                 # subscription handshake
+"""
+import hashlib
+import hmac
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from config.settings import FB_APP_SECRET, FB_WEBHOOK_VERIFY_TOKEN, WEBHOOK_PATH
+from utils.cache import cache
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+CATALOG_OBJECTS = ("product_catalog", "catalog")
+# Graph `level` values of ad object changes, and the level we name them by
+LEVELS = {"CAMPAIGN": "campaign", "AD_SET": "adset", "ADSET": "adset", "AD": "ad"}
+
+
+@dataclass
+class ChangeEvent:
+    object: str                     # "ad_account" or "product_catalog"
+    field: str                      # subscribed field that changed, e.g. "in_process_ad_objects"
+    level: str | None               # "campaign", "adset", "ad", "catalog" or "product"
+    object_id: str | None           # ID of the changed object
+    ad_account_id: str | None = None
+    catalog_id: str | None = None
+    campaign_id: str | None = None
+    value: Dict[str, Any] = field(default_factory=dict)
+
+
+_listeners: List[Callable[[ChangeEvent], None]] = []
+_listeners_lock = threading.Lock()
+stats = {"deliveries": 0, "changes": 0, "rejected": 0, "invalidations": 0}
+
+
+def subscribe(callback: Callable[[ChangeEvent], None]) -> None:
+    """Call `callback(event)` for every change received. Callbacks run in a worker thread and must be quick."""
+    with _listeners_lock:
+        _listeners.append(callback)
+
+
+def sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: str | None, secret: str | None = FB_APP_SECRET) -> bool:
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+def challenge(params: Dict[str, str]) -> str | None:
+    """The challenge to echo for a valid subscription handshake, otherwise None."""
+    if params.get("hub.mode") != "subscribe" or not FB_WEBHOOK_VERIFY_TOKEN:
+        return None
+    if not hmac.compare_digest(params.get("hub.verify_token", ""), FB_WEBHOOK_VERIFY_TOKEN):
+        return None
+    return params.get("hub.challenge", "")
+
+
+def parse(payload: Dict[str, Any]) -> List[ChangeEvent]:
+    """Change events of one delivery; unknown objects and fields are skipped."""
+    events = []
+    obj = payload.get("object")
+    for entry in payload.get("entry", []):
+        entry_id = str(entry.get("id", ""))
+        for change in entry.get("changes", []):
+            value = change.get("value") if isinstance(change.get("value"), dict) else {}
+            name = change.get("field", "")
+            if obj == "ad_account":
+                events.append(ChangeEvent(
+                    obj, name, LEVELS.get(str(value.get("level", "")).upper()), _str(value.get("id")),
+                    ad_account_id=entry_id if entry_id.startswith("act_") else f"act_{entry_id}",
+                    campaign_id=_str(value.get("campaign_id")), value=value))
+            elif obj in CATALOG_OBJECTS:
+                level = "product" if "product" in name else "catalog"
+                events.append(ChangeEvent("product_catalog", name, level, _str(value.get("id")) or entry_id,
+                                          catalog_id=entry_id, value=value))
+            else:
+                log.debug("ignoring webhook change", object=obj, field=name)
+    return events
+
+
+def _str(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+def stale_keys(event: ChangeEvent) -> List[Tuple[str, str | None]]:
+    """Cache keys (namespace, key) that `event` makes stale; key None drops the whole namespace."""
+    account = event.ad_account_id
+    if event.level == "campaign":
+        return [("campaigns", account), ("adsets", f"{account}:"), ("adsets", f"{account}:{event.object_id}")]
+    if event.level == "adset":
+        if event.campaign_id:
+            return [("adsets", f"{account}:"), ("adsets", f"{account}:{event.campaign_id}")]
+        return [("adsets", None)]
+    if event.level in ("catalog", "product"):
+        return [("catalogs", None)]
+    return []
+
+
+def handle(payload: Dict[str, Any]) -> int:
+    """Apply one verified delivery: invalidate what it made stale, then notify listeners. Returns the change count."""
+    events = parse(payload)
+    keys = list(dict.fromkeys(k for event in events for k in stale_keys(event)))
+    cache.invalidate_many(keys)
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for event in events:
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                log.warning("webhook listener failed", listener=getattr(callback, "__qualname__", repr(callback)),
+                            error=str(e))
+    stats["deliveries"] += 1
+    stats["changes"] += len(events)
+    stats["invalidations"] += len(keys)
+    log.info("webhook delivery applied", object=payload.get("object"), changes=len(events), invalidated=len(keys))
+    return len(events)
+
+
+def receive(body: bytes, signature: str | None) -> Tuple[int, str]:
+    """(HTTP status, message) for a POSTed delivery."""
+    if not FB_APP_SECRET:
+        stats["rejected"] += 1
+        log.warning("webhook delivery refused: FB_APP_SECRET is not set")
+        return 403, "webhooks are not configured"
+    if not verify_signature(body, signature):
+        stats["rejected"] += 1
+        log.warning("webhook delivery with a bad signature", signature=signature)
+        return 403, "invalid signature"
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return 400, "invalid JSON"
+    handle(payload)
+    return 200, "ok"
+
+
+# --- local replayer ---
+
+SAMPLE_EVENTS = [
+    {"object": "ad_account", "entry": [{"id": "1234567890", "time": 1700000000, "changes": [
+        {"field": "in_process_ad_objects", "value": {"id": "120200000000000001", "level": "CAMPAIGN"}}]}]},
+    {"object": "ad_account", "entry": [{"id": "1234567890", "time": 1700000000, "changes": [
+        {"field": "with_issues_ad_objects", "value": {"id": "120200000000000002", "level": "AD_SET",
+                                                      "campaign_id": "120200000000000001"}}]}]},
+    {"object": "product_catalog", "entry": [{"id": "987654321", "time": 1700000000, "changes": [
+        {"field": "products", "value": {"id": "555000111", "retailer_id": "SKU-1"}}]}]},
+]
+
+
+def _load_events(path: str | None) -> Iterable[Dict[str, Any]]:
+    if path is None:
+        return SAMPLE_EVENTS
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main(argv: List[str] | None = None) -> None:
+    import argparse
+    import os
+    import requests
+
+    default_url = f"http://127.0.0.1:{os.environ.get('PORT', 8000)}{WEBHOOK_PATH}"
+    parser = argparse.ArgumentParser(prog="python -m utils.webhooks", description="Replay webhook deliveries locally")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="sign and POST deliveries (a JSON array or JSON lines file)")
+    replay.add_argument("events", nargs="?", help="file of recorded deliveries; built-in samples when omitted")
+    replay.add_argument("--url", default=default_url)
+    replay.add_argument("--secret", default=FB_APP_SECRET, help="app secret to sign with (default: FB_APP_SECRET)")
+    verify = commands.add_parser("verify", help="run the subscription handshake")
+    verify.add_argument("--url", default=default_url)
+    verify.add_argument("--token", default=FB_WEBHOOK_VERIFY_TOKEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        response = requests.get(args.url, params={"hub.mode": "subscribe", "hub.verify_token": args.token or "",
+                                                  "hub.challenge": "replay-check"}, timeout=10)
+        print(f"{response.status_code} {response.text}")
+        return
+    if not args.secret:
+        parser.error("set FB_APP_SECRET or pass --secret to sign deliveries")
+    for payload in _load_events(args.events):
+        body = json.dumps(payload).encode()
+        response = requests.post(args.url, data=body, timeout=10, headers={
+            "Content-Type": "application/json", SIGNATURE_HEADER: sign(body, args.secret)})
+        print(f"{response.status_code} {payload.get('object')} "
+              f"{sum(len(e.get('changes', [])) for e in payload.get('entry', []))} change(s): {response.text}")
+
+
+if __name__ == "__main__":
+    main()